@@ -9,6 +9,7 @@ import torch
 import numpy as np
 import soundfile as sf
 from datetime import datetime
+from functools import wraps
 import re
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
@@ -24,14 +25,26 @@ from backend.config import Config
 from backend.services.websocket_service import WebSocketService
 from backend.services.audio_service import AudioService
 from backend.services.ai_service import AIService
+from backend.services.document_store import DocumentStore
 from backend.services.gpu_monitor import GPUMonitor
+from backend.services.job_queue import IndexingJobQueue
+from backend.services.memory_index import ConversationMemory
+from backend.services.model_manager import EMBEDDER, ModelManager
+from backend.services.vector_store import vector_store_from_config
+from backend.services.scheduler import Scheduler
+from backend.services.session_archiver import SessionArchiver
+from backend.services.session_config_store import SessionConfigStore
+from backend.database import db
 from backend.db.init_db import create_tables
+from backend.tasks.indexing_task import IndexingTask
 
 # Import route blueprints
 from backend.routes.config import bp as config_bp
 from backend.routes.messages import bp as messages_bp
 from backend.routes.sessions import bp as sessions_bp
 from backend.routes.embeddings import bp as embeddings_bp
+from backend.routes.search import bp as search_bp
+from backend.routes.transfer import bp as transfer_bp
 
 # Configure logging
 def setup_logger():
@@ -112,9 +125,39 @@ def create_app(config_class=Config):
 
     # Initialize services
     websocket_service = WebSocketService(app)  # This will set up the WebSocket routes
-    ai_service = AIService(conversation_store)
+    model_manager = ModelManager(
+        embedding_worker_address=app.config['EMBEDDING_WORKER_ADDRESS'],
+        embedding_worker_authkey=app.config['EMBEDDING_WORKER_AUTHKEY'],
+        memory_budget_bytes=app.config['MODEL_MEMORY_BUDGET_MB'] * 2**20
+    )
+    # Every query embeds with the light model, so it is never evicted
+    model_manager.pin(EMBEDDER, app.config['EMBED_LIGHT'])
+    app.model_manager = model_manager
+
+    # Finished turns are embedded in the background so prompts can recall them later
+    conversation_memory = ConversationMemory(
+        model_manager,
+        vector_store_from_config(app.config, collection_name=app.config['MEMORY_COLLECTION']),
+        embedder_name=app.config['EMBED_LIGHT'],
+        batch_size=app.config['EMBED_BATCH_SIZE']
+    )
+    conversation_memory.start()
+    app.conversation_memory = conversation_memory
+
+    ai_service = AIService(
+        conversation_store,
+        memory=conversation_memory,
+        recent_turns=app.config['MEMORY_RECENT_TURNS'],
+        recall_k=app.config['MEMORY_RECALL_K']
+    )
     audio_service = AudioService(whisper_model, kokoro_pipeline)
 
+    # Session configs are read on every message, so serve them from a cache
+    app.session_config_store = SessionConfigStore(
+        app.config['DATABASE_PATH'],
+        websocket_service=websocket_service
+    )
+
     # Initialize GPU monitor with WebSocket service
     gpu_monitor = GPUMonitor(websocket_service=websocket_service, poll_interval=1.0)
     gpu_monitor.start()
@@ -122,12 +165,54 @@ def create_app(config_class=Config):
     # Store GPU monitor in app context for access in routes
     app.gpu_monitor = gpu_monitor
 
+    # Idle-time indexing: queued jobs are checkpointed in SQLite and resume after a pause or restart
+    document_store = DocumentStore(app.config['DATABASE_PATH'])
+    indexing_task = IndexingTask(
+        model_manager,
+        vector_store_from_config(app.config),
+        chunk_size=app.config['CHUNK_SIZE'],
+        batch_size=app.config['EMBED_BATCH_SIZE'],
+        document_store=document_store,
+        chunk_overlap=app.config['CHUNK_OVERLAP'],
+        deep_store=vector_store_from_config(app.config, collection_name=app.config['DEEP_COLLECTION'])
+    )
+    scheduler = Scheduler(
+        gpu_monitor,
+        model_manager,
+        gpu_threshold=app.config['GPU_IDLE_THRESHOLD'],
+        config_store=app.session_config_store,
+        job_queue=IndexingJobQueue(app.config['DATABASE_PATH']),
+        indexing_task=indexing_task,
+        document_store=document_store,
+        websocket_service=websocket_service,
+        resume_delay_s=app.config['INDEXING_RESUME_DELAY_S'],
+        max_pause_s=app.config['INDEXING_MAX_PAUSE_S'],
+        on_resume=ai_service.warm_up_async,
+        warm_after_s=app.config['INDEXING_WARM_AFTER_S']
+    )
+    # Newly registered documents wake the scheduler instead of waiting for a poll
+    document_store.add_document_listener(scheduler.notify_documents_changed)
+    scheduler.start()
+    app.scheduler = scheduler
+
+    # Move long-idle sessions into the compressed archive tier in the background
+    session_archiver = SessionArchiver(
+        db,
+        conversation_store=conversation_store,
+        idle_threshold_s=app.config['ARCHIVE_IDLE_S'],
+        poll_interval=app.config['ARCHIVE_INTERVAL_S']
+    )
+    session_archiver.start()
+    app.session_archiver = session_archiver
+
     # Register blueprints
     logger.info("Registering blueprints...")
     app.register_blueprint(config_bp)
     app.register_blueprint(messages_bp)
     app.register_blueprint(sessions_bp)
     app.register_blueprint(embeddings_bp)
+    app.register_blueprint(search_bp)
+    app.register_blueprint(transfer_bp)
     logger.info("Blueprints registered successfully!")
     
     # Log registered routes
@@ -350,6 +435,7 @@ def create_app(config_class=Config):
         """Delete a chat"""
         try:
             conversation_store.clear_chat(chat_id)
+            conversation_memory.forget(chat_id)
             return jsonify({"success": True})
         except Exception as e:
             logger.error(f"Error deleting chat: {str(e)}")
@@ -416,7 +502,16 @@ def create_app(config_class=Config):
         except Exception as e:
             logger.error(f"Error updating chat title: {str(e)}")
 
+    def interactive_route(view):
+        """Run a view that uses the models as interactive work; background indexing yields to it."""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            with scheduler.interactive():
+                return view(*args, **kwargs)
+        return wrapper
+
     @app.route('/api/transcribe', methods=['POST'])
+    @interactive_route
     def transcribe_audio():
         """Transcribe audio file."""
         try:
@@ -446,21 +541,24 @@ def create_app(config_class=Config):
                 # Transcribe the audio
                 transcription, info = audio_service.transcribe_audio(temp_path)
                 
-                # Store user message in conversation history
-                conversation_store.add_message(chat_id, {
-                    'type': 'user',
-                    'text': transcription
-                })
+                # Turns on the same chat run one at a time so each sees a consistent history
+                with conversation_store.turn(chat_id):
+                    # Store user message in conversation history
+                    conversation_store.add_message(chat_id, {
+                        'type': 'user',
+                        'text': transcription
+                    })
                 
-                # Get AI response with conversation history
-                max_history_tokens = int(num_ctx * 0.75)  # Use 75% of context window for history
-                ai_response = ai_service.get_response(transcription, chat_id, max_history_tokens)
+                    # Get AI response with conversation history
+                    max_history_tokens = int(num_ctx * 0.75)  # Use 75% of context window for history
+                    ai_response = ai_service.get_response(transcription, chat_id, max_history_tokens)
                 
-                # Store AI response in conversation history
-                conversation_store.add_message(chat_id, {
-                    'type': 'ai',
-                    'text': ai_response
-                })
+                    # Store AI response in conversation history
+                    conversation_store.add_message(chat_id, {
+                        'type': 'ai',
+                        'text': ai_response
+                    })
+                    conversation_memory.record_turn(chat_id, transcription, ai_response)
                 
                 # Process text to speech
                 audio_segments = audio_service.process_text_to_speech(ai_response)
@@ -497,6 +595,7 @@ def create_app(config_class=Config):
             }), 500
 
     @app.route('/api/generate_title', methods=['POST'])
+    @interactive_route
     def generate_title():
         """Generate title for a chat."""
         try:
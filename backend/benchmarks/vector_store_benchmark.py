@@ -0,0 +1,102 @@
+"""Compare vector store backends on synthetic embeddings.
+
+    python -m backend.benchmarks.vector_store_benchmark --count 50000 --dim 384
+
+Reports ingest rate, query latency, resident memory growth and cold-start
+time (reopening the persisted index and answering a first query). Each
+backend runs in its own process so memory figures do not mix.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+BACKENDS = ('mmap-float16', 'mmap-int8', 'mmap-ivf', 'chroma')
+
+def _rss_mb() -> float:
+    """Current resident set size in MB (Linux), falling back to peak RSS."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _open(backend: str, directory: str):
+    from backend.services.vector_store import create_vector_store
+    if backend == 'chroma':
+        return create_vector_store('chroma', directory)
+    dtype = 'int8' if backend == 'mmap-int8' else 'float16'
+    return create_vector_store('mmap', directory, dtype=dtype)
+
+def _run(backend: str, count: int, dim: int, queries: int, top_k: int, batch: int) -> dict:
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((count, dim)).astype(np.float32)
+    probes = vectors[rng.choice(count, queries)] + 0.05 * rng.standard_normal((queries, dim)).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as directory:
+        baseline = _rss_mb()
+        started = time.perf_counter()
+        store = _open(backend, directory)
+        for start in range(0, count, batch):
+            store.upsert_chunks([{
+                'chroma_id': f'c{i}',
+                'text': f'chunk {i}',
+                'embedding': vectors[i],
+                'metadata': {'doc_id': f'd{i % 100}'}
+            } for i in range(start, min(start + batch, count))])
+        if backend == 'mmap-ivf':
+            store.build_ivf()
+        ingest_s = time.perf_counter() - started
+
+        latencies = []
+        for probe in probes:
+            started = time.perf_counter()
+            store.query(probe, top_k=top_k)
+            latencies.append((time.perf_counter() - started) * 1000)
+        memory_mb = _rss_mb() - baseline
+
+        if hasattr(store, 'close'):
+            store.close()
+        del store
+        started = time.perf_counter()
+        _open(backend, directory).query(probes[0], top_k=top_k)
+        cold_start_s = time.perf_counter() - started
+
+    return {
+        'backend': backend,
+        'ingest_per_s': round(count / ingest_s, 1),
+        'query_p50_ms': round(float(np.percentile(latencies, 50)), 3),
+        'query_p95_ms': round(float(np.percentile(latencies, 95)), 3),
+        'memory_mb': round(memory_mb, 1),
+        'cold_start_s': round(cold_start_s, 3)
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark vector store backends")
+    parser.add_argument('--count', type=int, default=20000, help="Vectors to ingest")
+    parser.add_argument('--dim', type=int, default=384, help="Embedding dimension")
+    parser.add_argument('--queries', type=int, default=200, help="Queries to time")
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--batch', type=int, default=256, help="Chunks per upsert")
+    parser.add_argument('--backend', action='append', choices=BACKENDS, dest='backends',
+                        help="Backend to run (repeatable, default all)")
+    args = parser.parse_args(argv)
+
+    context = multiprocessing.get_context('spawn')
+    for backend in args.backends or BACKENDS:
+        with context.Pool(1) as pool:
+            try:
+                result = pool.apply(_run, (backend, args.count, args.dim, args.queries,
+                                           args.top_k, args.batch))
+            except ImportError as e:
+                result = {'backend': backend, 'skipped': str(e)}
+        print(json.dumps(result))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
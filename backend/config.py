@@ -9,12 +9,30 @@ class Config:
     # Database
     DATABASE_PATH = os.getenv('DATABASE_PATH', 'database.db')
     
+    # Session archive: sessions idle this long are compressed into the cold tier
+    ARCHIVE_IDLE_S = int(os.getenv('ARCHIVE_IDLE_S', str(30 * 24 * 3600)))  # seconds
+    ARCHIVE_INTERVAL_S = float(os.getenv('ARCHIVE_INTERVAL_S', '3600'))  # seconds between sweeps
+    
     # Chroma
     CHROMA_PERSIST_DIR = os.getenv('CHROMA_PERSIST_DIR', './chroma_db')
+    CHROMA_MODE = os.getenv('CHROMA_MODE', 'embedded')  # 'embedded' or 'http' (shared server)
+    CHROMA_HOST = os.getenv('CHROMA_HOST', 'localhost')
+    CHROMA_PORT = int(os.getenv('CHROMA_PORT', '8000'))
+    CHROMA_UPSERT_BATCH = int(os.getenv('CHROMA_UPSERT_BATCH', '1000'))  # chunks per upsert request
+    CHROMA_UPSERT_CONCURRENCY = int(os.getenv('CHROMA_UPSERT_CONCURRENCY', '4'))  # requests in flight
+    
+    # Vector store backend: 'chroma' or 'mmap' (in-process memory-mapped index)
+    VECTOR_STORE = os.getenv('VECTOR_STORE', 'chroma')
+    VECTOR_INDEX_DIR = os.getenv('VECTOR_INDEX_DIR', './vector_index')
+    VECTOR_INDEX_DTYPE = os.getenv('VECTOR_INDEX_DTYPE', 'float16')  # float16 or int8
+    VECTOR_INDEX_NPROBE = int(os.getenv('VECTOR_INDEX_NPROBE', '8'))  # IVF lists scanned per query
     
     # GPU Settings
     GPU_IDLE_THRESHOLD = float(os.getenv('GPU_IDLE_THRESHOLD', '10.0'))  # % utilization
     IDLE_THRESHOLD_S = int(os.getenv('IDLE_THRESHOLD_S', '600'))  # seconds
+    INDEXING_RESUME_DELAY_S = float(os.getenv('INDEXING_RESUME_DELAY_S', '2'))  # quiet time before parked indexing resumes
+    INDEXING_MAX_PAUSE_S = float(os.getenv('INDEXING_MAX_PAUSE_S', '120'))  # parked longer waits for the next idle window
+    INDEXING_WARM_AFTER_S = float(os.getenv('INDEXING_WARM_AFTER_S', '5'))  # shorter runs do not re-warm the chat model
     
     # Model Settings
     EMBED_LIGHT = os.getenv('EMBED_LIGHT', 'all-MiniLM-L6-v2')
@@ -22,6 +40,26 @@ class Config:
     DEFAULT_MODEL = os.getenv('DEFAULT_MODEL', 'llama2')
     DEFAULT_THINKING_MODE = os.getenv('DEFAULT_THINKING_MODE', 'hybrid')
     DEFAULT_TOP_K = int(os.getenv('DEFAULT_TOP_K', '5'))
+    EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', '32'))  # chunks per encode() call
+    # Shared embedding worker (python -m backend.services.embedding_worker); unset loads embedders in-process
+    EMBEDDING_WORKER_ADDRESS = os.getenv('EMBEDDING_WORKER_ADDRESS')  # host:port or Unix socket path
+    EMBEDDING_WORKER_AUTHKEY = os.getenv('EMBEDDING_WORKER_AUTHKEY', '').encode()  # required with the address; no default
+    # Estimated weight memory loaded models may hold before least recently used ones are unloaded
+    MODEL_MEMORY_BUDGET_MB = int(os.getenv('MODEL_MEMORY_BUDGET_MB', '4096'))
+    CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', '500'))  # embedder tokens per chunk
+    CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', '50'))  # tokens shared by consecutive chunks
+    RETRIEVAL_CANDIDATES = int(os.getenv('RETRIEVAL_CANDIDATES', '4'))  # first-stage candidates per top_k
+    RESPONSE_DEADLINE_S = float(os.getenv('RESPONSE_DEADLINE_S', '30'))  # thinking stops past this
+    COT_SCRATCHPAD_TOKENS = int(os.getenv('COT_SCRATCHPAD_TOKENS', '512'))  # earlier thoughts kept per step
+    COT_THOUGHT_TOKENS = int(os.getenv('COT_THOUGHT_TOKENS', '256'))  # cap on each streamed thought
+    CONTEXT_WINDOW = int(os.getenv('CONTEXT_WINDOW', '2048'))  # chat model num_ctx the prompt must fit
+    ANSWER_TOKENS = int(os.getenv('ANSWER_TOKENS', '512'))  # context window kept free for the answer
+    DEEP_COLLECTION = os.getenv('DEEP_COLLECTION', 'document_chunks_deep')  # deep-embedder vectors for re-ranking
+    
+    # Long-term conversation memory
+    MEMORY_COLLECTION = os.getenv('MEMORY_COLLECTION', 'conversation_memory')
+    MEMORY_RECENT_TURNS = int(os.getenv('MEMORY_RECENT_TURNS', '4'))  # turns always sent verbatim
+    MEMORY_RECALL_K = int(os.getenv('MEMORY_RECALL_K', '3'))  # earlier turns recalled per prompt
 
 class DevelopmentConfig(Config):
     """Development configuration."""
@@ -42,6 +80,7 @@ class ProductionConfig(Config):
     SECRET_KEY = os.getenv('SECRET_KEY')
     DATABASE_PATH = os.getenv('DATABASE_PATH', '/data/database.db')
     CHROMA_PERSIST_DIR = os.getenv('CHROMA_PERSIST_DIR', '/data/chroma_db')
+    VECTOR_INDEX_DIR = os.getenv('VECTOR_INDEX_DIR', '/data/vector_index')
 
 # Map environment names to config classes
 config_by_name = {
@@ -1,20 +1,72 @@
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 import logging
+from contextlib import contextmanager
 from datetime import datetime
+from threading import Condition, RLock
 import os
 from backend.database import db
 
 logger = logging.getLogger('kokoro')
 
-class ConversationStore:
+class _TurnQueue:
+    """FIFO ticket queue that lets one turn at a time run for a session"""
+
     def __init__(self):
+        self._cond = Condition()
+        self._next_ticket = 0
+        self._serving = 0
+
+    def enter(self) -> None:
+        with self._cond:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            while self._serving != ticket:
+                self._cond.wait()
+
+    def leave(self) -> None:
+        with self._cond:
+            self._serving += 1
+            self._cond.notify_all()
+
+    @property
+    def idle(self) -> bool:
+        with self._cond:
+            return self._serving == self._next_ticket
+
+class ConversationStore:
+    def __init__(self, num_stripes: int = 64):
         # In-memory cache of conversations
         self._conversations: Dict[str, List[dict]] = {}
+        # Each session maps onto one stripe lock, so sessions on different
+        # stripes never contend while the lock count stays fixed.
+        self._stripes = [RLock() for _ in range(num_stripes)]
+        self._turn_queues: Dict[str, _TurnQueue] = {}
+
+    def _lock_for(self, chat_id: str) -> RLock:
+        return self._stripes[hash(chat_id) % len(self._stripes)]
+
+    @contextmanager
+    def turn(self, chat_id: str) -> Iterator[None]:
+        """Serialize conversation turns for one chat in arrival order; other chats run in parallel"""
+        with self._lock_for(chat_id):
+            queue = self._turn_queues.get(chat_id)
+            if queue is None:
+                queue = self._turn_queues[chat_id] = _TurnQueue()
+
+        queue.enter()
+        try:
+            yield
+        finally:
+            queue.leave()
+            with self._lock_for(chat_id):
+                if queue.idle and self._turn_queues.get(chat_id) is queue:
+                    del self._turn_queues[chat_id]
 
     def create_chat(self, chat_id: str, title: str = "New Chat") -> str:
         """Create a new chat session with the given ID and title"""
-        db.create_session(chat_id, title)
-        self._conversations[chat_id] = []
+        with self._lock_for(chat_id):
+            db.create_session(chat_id, title)
+            self._conversations[chat_id] = []
         return chat_id
 
     def update_chat_title(self, chat_id: str, title: str) -> None:
@@ -26,52 +78,72 @@ class ConversationStore:
         if not isinstance(message, dict) or 'type' not in message or 'text' not in message:
             raise ValueError("Message must be a dict with 'type' and 'text' keys")
 
-        db.add_message(chat_id, message['type'], message['text'])
-        
-        # Update in-memory cache
-        if chat_id not in self._conversations:
-            self._conversations[chat_id] = []
-        self._conversations[chat_id].append(message)
-        
+        # Write and cache update happen under the stripe lock so a concurrent
+        # cache load can neither miss nor duplicate this message.
+        with self._lock_for(chat_id):
+            db.add_message(chat_id, message['type'], message['text'])
+
+            # Only extend a cached history; an uncached one is loaded whole on next read
+            cached = self._conversations.get(chat_id)
+            if cached is not None:
+                cached.append(message)
+
         logger.info(f"Added message to chat {chat_id}: {message}")
 
     def get_history(self, chat_id: str, max_tokens: Optional[int] = None) -> List[dict]:
         """Get conversation history for a chat, optionally limited by token count"""
-        # Check cache first
-        if chat_id not in self._conversations:
-            self._conversations[chat_id] = db.get_messages(chat_id)
-            
-        messages = self._conversations[chat_id]
-        
+        with self._lock_for(chat_id):
+            # Check cache first
+            if chat_id not in self._conversations:
+                self._conversations[chat_id] = db.get_messages(chat_id)
+
+            # Snapshot so callers never observe a concurrent append
+            messages = list(self._conversations[chat_id])
+
         if max_tokens is None:
             return messages
-            
+
         # If max_tokens specified, get most recent messages that fit
         total_tokens = 0
-        result = []
-        
+        start = len(messages)
+
         # Start from most recent messages
         for message in reversed(messages):
             # Rough token estimation (4 chars per token)
             tokens = len(message['text']) // 4
             if total_tokens + tokens > max_tokens:
                 break
-                
-            result.insert(0, message)  # Insert at start to maintain order
+
+            start -= 1
             total_tokens += tokens
-            
-        return result
+
+        return messages[start:]
 
     def get_all_chats(self) -> List[dict]:
         """Get all active chats"""
         return db.get_sessions()
 
+    def invalidate(self, chat_id: Optional[str] = None) -> None:
+        """Drop cached history for one chat, or for all chats, so it is reloaded from the database"""
+        if chat_id is not None:
+            with self._lock_for(chat_id):
+                self._conversations.pop(chat_id, None)
+            return
+
+        for lock in self._stripes:
+            lock.acquire()
+        try:
+            self._conversations.clear()
+        finally:
+            for lock in reversed(self._stripes):
+                lock.release()
+
     def clear_chat(self, chat_id: str) -> None:
         """Clear the conversation history for a chat"""
-        db.delete_session(chat_id)
-        if chat_id in self._conversations:
-            del self._conversations[chat_id]
+        with self._lock_for(chat_id):
+            db.delete_session(chat_id)
+            self._conversations.pop(chat_id, None)
         logger.info(f"Cleared conversation history for chat {chat_id}")
 
 # Global instance
-conversation_store = ConversationStore() 
\ No newline at end of file
+conversation_store = ConversationStore()
@@ -1,7 +1,10 @@
+import json
 import sqlite3
-from datetime import datetime
+import zlib
+from datetime import datetime, timedelta
 import logging
-from typing import List, Dict, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from backend.utils.fts import highlight_snippet, match_all_terms
 
 logger = logging.getLogger('kokoro')
 
@@ -31,9 +34,66 @@ class Database:
                     FOREIGN KEY (session_id) REFERENCES sessions (id)
                 )
             ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS session_archive (
+                    session_id TEXT PRIMARY KEY,
+                    message_count INTEGER,
+                    payload BLOB,
+                    archived_at TIMESTAMP,
+                    FOREIGN KEY (session_id) REFERENCES sessions (id)
+                )
+            ''')
+            # Archived messages keep their FTS rows; this maps those rows back to a session
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS archived_messages (
+                    id INTEGER PRIMARY KEY,
+                    session_id TEXT,
+                    type TEXT,
+                    created_at TIMESTAMP
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_archived_messages_session ON archived_messages (session_id)')
+            self._init_search_index(conn)
             conn.commit()
             logger.info(f"Database initialized at {self.db_path}")
 
+    def _init_search_index(self, conn: sqlite3.Connection) -> None:
+        """Create the FTS5 index over message text and the triggers that maintain it"""
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+        ).fetchone()
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                text,
+                content='messages',
+                content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        ''')
+        # External-content table: the triggers keep the index in step with
+        # every insert, delete and update on messages, one row at a time.
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+                INSERT INTO messages_fts (rowid, text) VALUES (new.id, new.text);
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF text ON messages BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+                INSERT INTO messages_fts (rowid, text) VALUES (new.id, new.text);
+            END
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id)')
+        if not exists:
+            # One-off backfill for databases that predate the index
+            conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+            logger.info("Built full-text search index over existing messages")
+
     def create_session(self, session_id: str, title: str) -> None:
         """Create a new chat session"""
         with sqlite3.connect(self.db_path) as conn:
@@ -57,6 +117,8 @@ class Database:
     def add_message(self, session_id: str, message_type: str, text: str) -> None:
         """Add a message to a chat session"""
         with sqlite3.connect(self.db_path) as conn:
+            # New messages must follow the archived ones, so fault the session in first
+            self._restore_session(conn, session_id)
             conn.execute(
                 'INSERT INTO messages (session_id, type, text, created_at) VALUES (?, ?, ?, ?)',
                 (session_id, message_type, text, datetime.now())
@@ -71,12 +133,83 @@ class Database:
     def get_messages(self, session_id: str) -> List[Dict[str, str]]:
         """Get all messages for a chat session"""
         with sqlite3.connect(self.db_path) as conn:
+            self._restore_session(conn, session_id)
             cursor = conn.execute(
                 'SELECT type, text FROM messages WHERE session_id = ? ORDER BY created_at',
                 (session_id,)
             )
             return [{'type': row[0], 'text': row[1]} for row in cursor.fetchall()]
 
+    def search_messages(self, query: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """Full-text search over message text, ranked by BM25 with highlighted snippets"""
+        match = match_all_terms(query)
+        if not match:
+            return {'total': 0, 'hits': []}
+
+        with sqlite3.connect(self.db_path) as conn:
+            total = conn.execute(
+                'SELECT COUNT(*) FROM messages_fts WHERE messages_fts MATCH ?',
+                (match,)
+            ).fetchone()[0]
+            # Rank inside the FTS index first so only one page of rows is joined.
+            # Hits may be archived messages, whose text is only in the archive payload.
+            rows = conn.execute(
+                '''
+                SELECT hits.rowid, COALESCE(m.session_id, a.session_id), s.title,
+                       COALESCE(m.type, a.type), COALESCE(m.created_at, a.created_at),
+                       m.id IS NULL, hits.rank
+                FROM (
+                    SELECT rowid, bm25(messages_fts) AS rank
+                    FROM messages_fts
+                    WHERE messages_fts MATCH ?
+                    ORDER BY rank
+                    LIMIT ? OFFSET ?
+                ) AS hits
+                LEFT JOIN messages m ON m.id = hits.rowid
+                LEFT JOIN archived_messages a ON a.id = hits.rowid
+                LEFT JOIN sessions s ON s.id = COALESCE(m.session_id, a.session_id)
+                WHERE m.id IS NOT NULL OR a.id IS NOT NULL
+                ORDER BY hits.rank
+                ''',
+                (match, limit, offset)
+            ).fetchall()
+            snippets = self._hit_snippets(conn, match, query, rows)
+            hits = [{
+                'message_id': row[0],
+                'session_id': row[1],
+                'session_title': row[2],
+                'type': row[3],
+                'created_at': row[4],
+                'snippet': snippets.get(row[0], ''),
+                'score': -row[6]
+            } for row in rows]
+
+        return {'total': total, 'hits': hits}
+
+    def _hit_snippets(self, conn: sqlite3.Connection, match: str, query: str,
+                      rows: List[tuple]) -> Dict[int, str]:
+        """Highlighted snippets for a page of search hits, keyed by message id"""
+        hot = [row[0] for row in rows if not row[5]]
+        snippets = {}
+        if hot:
+            placeholders = ', '.join('?' for _ in hot)
+            snippets.update(conn.execute(
+                f'''
+                SELECT rowid, snippet(messages_fts, 0, '<mark>', '</mark>', '…', 16)
+                FROM messages_fts
+                WHERE messages_fts MATCH ? AND rowid IN ({placeholders})
+                ''',
+                (match, *hot)
+            ).fetchall())
+        # FTS5 reads snippet text from the messages table, so build archived ones here
+        for session_id in {row[1] for row in rows if row[5]}:
+            texts = {message[0]: message[2]
+                     for message in self._load_archive_payload(conn, session_id) or []}
+            for row in rows:
+                if row[5] and row[1] == session_id and row[0] in texts:
+                    snippets[row[0]] = highlight_snippet(texts[row[0]], query)
+        return snippets
+
     def get_sessions(self) -> List[Dict[str, str]]:
         """Get all chat sessions"""
         with sqlite3.connect(self.db_path) as conn:
@@ -94,9 +227,274 @@ class Database:
         """Delete a chat session and all its messages"""
         with sqlite3.connect(self.db_path) as conn:
             conn.execute('DELETE FROM messages WHERE session_id = ?', (session_id,))
+            self._unindex_archived(conn, session_id)
+            conn.execute('DELETE FROM archived_messages WHERE session_id = ?', (session_id,))
+            conn.execute('DELETE FROM session_archive WHERE session_id = ?', (session_id,))
             conn.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
             conn.commit()
         logger.info(f"Deleted session: {session_id}")
 
+    def iter_export(self, session_ids: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Stream sessions and their messages as export records, one row at a time"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            if session_ids:
+                placeholders = ', '.join('?' for _ in session_ids)
+                sessions = conn.execute(
+                    f'SELECT id, title, created_at, updated_at FROM sessions '
+                    f'WHERE id IN ({placeholders}) ORDER BY created_at',
+                    session_ids
+                )
+            else:
+                sessions = conn.execute(
+                    'SELECT id, title, created_at, updated_at FROM sessions ORDER BY created_at'
+                )
+
+            # Iterate the cursors directly so neither the session list nor any
+            # single history is ever materialized.
+            for session_id, title, created_at, updated_at in sessions:
+                yield {
+                    'record': 'session',
+                    'id': session_id,
+                    'title': title,
+                    'created_at': created_at,
+                    'updated_at': updated_at
+                }
+                messages = self._load_archived_messages(conn, session_id)
+                if messages is None:
+                    messages = conn.execute(
+                        'SELECT type, text, created_at FROM messages WHERE session_id = ? ORDER BY id',
+                        (session_id,)
+                    )
+                for message_type, text, message_created_at in messages:
+                    yield {
+                        'record': 'message',
+                        'session_id': session_id,
+                        'type': message_type,
+                        'text': text,
+                        'created_at': message_created_at
+                    }
+        finally:
+            conn.close()
+
+    def import_records(self, records: Iterable[Dict[str, Any]], batch_size: int = 500) -> Dict[str, int]:
+        """Import export records in batched inserts inside a single transaction
+
+        Sessions that already exist are skipped together with their messages,
+        so importing the same export twice changes nothing. A message must
+        belong to a session in the import or in the database.
+        """
+        counts = {'sessions': 0, 'messages': 0, 'skipped_sessions': 0, 'skipped_messages': 0}
+        sessions: List[tuple] = []
+        messages: List[tuple] = []
+        # Session ids created by this import, skipped as already present, and
+        # known to exist from before (messages may be appended to those)
+        imported, skipped, existing = set(), set(), set()
+
+        def flush_sessions(conn: sqlite3.Connection) -> None:
+            if not sessions:
+                return
+            ids = list({session[0] for session in sessions})
+            placeholders = ', '.join('?' for _ in ids)
+            present = {row[0] for row in conn.execute(
+                f'SELECT id FROM sessions WHERE id IN ({placeholders})', ids
+            )}
+            new = []
+            for session in sessions:
+                if session[0] in imported:
+                    continue  # Repeated in the import; the first record wins
+                if session[0] in present:
+                    skipped.add(session[0])
+                    continue
+                imported.add(session[0])
+                new.append(session)
+            conn.executemany(
+                'INSERT INTO sessions (id, title, created_at, updated_at) VALUES (?, ?, ?, ?)',
+                new
+            )
+            counts['sessions'] += len(new)
+            sessions.clear()
+
+        def flush(conn: sqlite3.Connection) -> None:
+            flush_sessions(conn)
+            if messages:
+                conn.executemany(
+                    'INSERT INTO messages (session_id, type, text, created_at) VALUES (?, ?, ?, ?)',
+                    messages
+                )
+                counts['messages'] += len(messages)
+                messages.clear()
+
+        def session_exists(conn: sqlite3.Connection, session_id: str) -> bool:
+            if session_id in imported or session_id in existing:
+                return True
+            if conn.execute('SELECT 1 FROM sessions WHERE id = ?', (session_id,)).fetchone():
+                existing.add(session_id)
+                return True
+            return False
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            for line_no, record in enumerate(records, start=1):
+                kind = record.get('record')
+                now = datetime.now()
+                if kind == 'session':
+                    sessions.append((
+                        record['id'],
+                        record.get('title', 'New Chat'),
+                        record.get('created_at') or now,
+                        record.get('updated_at') or now
+                    ))
+                elif kind == 'message':
+                    # Sessions must land before the messages that follow them
+                    flush_sessions(conn)
+                    session_id = record['session_id']
+                    if session_id in skipped:
+                        counts['skipped_messages'] += 1
+                        continue
+                    if not session_exists(conn, session_id):
+                        raise ValueError(f"Record {line_no}: message for unknown session {session_id!r}")
+                    messages.append((
+                        session_id,
+                        record['type'],
+                        record['text'],
+                        record.get('created_at') or now
+                    ))
+                else:
+                    raise ValueError(f"Record {line_no}: unknown record type {kind!r}")
+
+                if len(sessions) + len(messages) >= batch_size:
+                    flush(conn)
+            flush(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        counts['skipped_sessions'] = len(skipped)
+        logger.info(
+            f"Imported {counts['sessions']} sessions and {counts['messages']} messages "
+            f"({counts['skipped_sessions']} existing sessions and their "
+            f"{counts['skipped_messages']} messages skipped)"
+        )
+        return counts
+
+    @staticmethod
+    def _load_archive_payload(conn: sqlite3.Connection, session_id: str) -> Optional[List[list]]:
+        """Decode an archived session's [id, type, text, created_at] rows, or None if not archived"""
+        row = conn.execute(
+            'SELECT payload FROM session_archive WHERE session_id = ?',
+            (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0]))
+
+    @classmethod
+    def _load_archived_messages(cls, conn: sqlite3.Connection, session_id: str) -> Optional[List[tuple]]:
+        """Decode an archived session's (type, text, created_at) messages, or None if not archived"""
+        payload = cls._load_archive_payload(conn, session_id)
+        if payload is None:
+            return None
+        return [tuple(message[1:]) for message in payload]
+
+    def _unindex_archived(self, conn: sqlite3.Connection, session_id: str) -> List[list]:
+        """Drop the FTS rows an archived session kept, returning its archived rows"""
+        payload = self._load_archive_payload(conn, session_id) or []
+        conn.executemany(
+            "INSERT INTO messages_fts (messages_fts, rowid, text) VALUES ('delete', ?, ?)",
+            [(message[0], message[2]) for message in payload]
+        )
+        return payload
+
+    def _restore_session(self, conn: sqlite3.Connection, session_id: str) -> bool:
+        """Move an archived session's messages back into the hot messages table"""
+        if not conn.execute(
+            'SELECT 1 FROM session_archive WHERE session_id = ?', (session_id,)
+        ).fetchone():
+            return False
+
+        # Reinsert under the original ids; the insert trigger indexes them again
+        payload = self._unindex_archived(conn, session_id)
+        conn.executemany(
+            'INSERT INTO messages (id, session_id, type, text, created_at) VALUES (?, ?, ?, ?, ?)',
+            [(message[0], session_id, *message[1:]) for message in payload]
+        )
+        conn.execute('DELETE FROM archived_messages WHERE session_id = ?', (session_id,))
+        conn.execute('DELETE FROM session_archive WHERE session_id = ?', (session_id,))
+        # A restored session is active again; otherwise the next sweep re-archives it
+        conn.execute(
+            'UPDATE sessions SET updated_at = ? WHERE id = ?',
+            (datetime.now(), session_id)
+        )
+        logger.info(f"Restored {len(payload)} archived messages for session {session_id}")
+        return True
+
+    def archive_idle_sessions(self, idle_seconds: int, limit: int = 100) -> List[str]:
+        """Move sessions idle longer than idle_seconds into the compressed archive table"""
+        cutoff = datetime.now() - timedelta(seconds=idle_seconds)
+        archived = []
+
+        with sqlite3.connect(self.db_path) as conn:
+            candidates = [row[0] for row in conn.execute(
+                '''
+                SELECT s.id FROM sessions s
+                WHERE s.updated_at < ?
+                  AND EXISTS (SELECT 1 FROM messages m WHERE m.session_id = s.id)
+                ORDER BY s.updated_at
+                LIMIT ?
+                ''',
+                (cutoff, limit)
+            )]
+
+            for session_id in candidates:
+                # Re-check idleness inside the transaction; a new message may have just landed
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    still_idle = conn.execute(
+                        'SELECT 1 FROM sessions WHERE id = ? AND updated_at < ?',
+                        (session_id, cutoff)
+                    ).fetchone()
+                    if not still_idle:
+                        conn.rollback()
+                        continue
+
+                    messages = conn.execute(
+                        'SELECT id, type, text, created_at FROM messages WHERE session_id = ? ORDER BY id',
+                        (session_id,)
+                    ).fetchall()
+                    payload = zlib.compress(
+                        json.dumps(messages, ensure_ascii=False, default=str).encode('utf-8'),
+                        level=9
+                    )
+                    conn.execute(
+                        'INSERT INTO session_archive (session_id, message_count, payload, archived_at) '
+                        'VALUES (?, ?, ?, ?)',
+                        (session_id, len(messages), payload, datetime.now())
+                    )
+                    conn.executemany(
+                        'INSERT INTO archived_messages (id, session_id, type, created_at) VALUES (?, ?, ?, ?)',
+                        [(message_id, session_id, message_type, created_at)
+                         for message_id, message_type, _, created_at in messages]
+                    )
+                    conn.execute('DELETE FROM messages WHERE session_id = ?', (session_id,))
+                    # The delete trigger unindexed the text; put it back so archived
+                    # sessions stay searchable without their messages being hot
+                    conn.executemany(
+                        'INSERT INTO messages_fts (rowid, text) VALUES (?, ?)',
+                        [(message_id, text) for message_id, _, text, _ in messages]
+                    )
+                    conn.commit()
+                    archived.append(session_id)
+                except Exception:
+                    conn.rollback()
+                    raise
+
+        if archived:
+            logger.info(f"Archived {len(archived)} idle sessions")
+        return archived
+
 # Global database instance
 db = Database() 
\ No newline at end of file
@@ -4,6 +4,32 @@ import os
 
 logger = logging.getLogger(__name__)
 
+def _add_missing_columns(cursor: sqlite3.Cursor, table: str, columns: dict) -> None:
+    """Add any of the given columns that an existing table lacks."""
+    existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    for name, declaration in columns.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {declaration}")
+            logger.info(f"Added column {table}.{name}")
+
+def _set_aside_chunks_without_rowid(cursor: sqlite3.Cursor) -> bool:
+    """Rename a document_chunks table that predates chunk_rowid so it can be copied over.
+
+    The FTS index keys on chunk_rowid; the implicit rowid of a table with a
+    TEXT primary key may be renumbered by VACUUM. Drops the old index and
+    triggers so they are recreated against the new table.
+    """
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(document_chunks)")}
+    if not columns or 'chunk_rowid' in columns:
+        return False
+    _add_missing_columns(cursor, 'document_chunks', {'content_hash': 'TEXT', 'deep_model': 'TEXT'})
+    for trigger in ('document_chunks_fts_ai', 'document_chunks_fts_ad', 'document_chunks_fts_au'):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    cursor.execute("DROP TABLE IF EXISTS document_chunks_fts")
+    cursor.execute("DROP INDEX IF EXISTS idx_document_chunks_doc")
+    cursor.execute("ALTER TABLE document_chunks RENAME TO document_chunks_old")
+    return True
+
 def create_tables(db_path: str = None):
     """Create all required tables in the SQLite database."""
     if db_path is None:
@@ -48,20 +74,111 @@ def create_tables(db_path: str = None):
             source_type  TEXT NOT NULL,
             source_path  TEXT,
             metadata     JSON,
+            content_hash TEXT,
+            embed_model  TEXT,
+            index_failed_source TEXT,
             created_at   DATETIME NOT NULL DEFAULT (CURRENT_TIMESTAMP),
             updated_at   DATETIME NOT NULL DEFAULT (CURRENT_TIMESTAMP)
         )
         """)
 
-        # Create document_chunks table
+        # Create document_chunks table; chunk_rowid is the stable key the FTS index uses
+        migrate_chunks = _set_aside_chunks_without_rowid(cursor)
         cursor.execute("""
         CREATE TABLE IF NOT EXISTS document_chunks (
-            chunk_id     TEXT PRIMARY KEY,
+            chunk_rowid  INTEGER PRIMARY KEY,
+            chunk_id     TEXT UNIQUE NOT NULL,
             doc_id       TEXT NOT NULL REFERENCES documents(doc_id),
             chunk_index  INTEGER NOT NULL,
             text         TEXT NOT NULL,
             chroma_id    TEXT UNIQUE NOT NULL,
-            created_at   DATETIME NOT NULL DEFAULT (CURRENT_TIMESTAMP)
+            content_hash TEXT,
+            created_at   DATETIME NOT NULL DEFAULT (CURRENT_TIMESTAMP),
+            deep_model   TEXT
+        )
+        """)
+        if migrate_chunks:
+            cursor.execute("""
+            INSERT INTO document_chunks (chunk_rowid, chunk_id, doc_id, chunk_index, text, chroma_id,
+                                         content_hash, created_at, deep_model)
+            SELECT rowid, chunk_id, doc_id, chunk_index, text, chroma_id,
+                   content_hash, created_at, deep_model
+            FROM document_chunks_old
+            """)
+            cursor.execute("DROP TABLE document_chunks_old")
+            logger.info("Added document_chunks.chunk_rowid")
+
+        # Bring tables created before content hashing up to date
+        # index_failed_source is the source fingerprint at the last failed indexing attempt
+        _add_missing_columns(cursor, 'documents', {
+            'content_hash': 'TEXT',
+            'embed_model': 'TEXT',
+            'index_failed_source': 'TEXT'
+        })
+        # deep_model names the embedder whose vector for this chunk is in the deep store
+        _add_missing_columns(cursor, 'document_chunks', {'content_hash': 'TEXT', 'deep_model': 'TEXT'})
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_document_chunks_doc ON document_chunks (doc_id, chunk_index)"
+        )
+
+        # Lexical (BM25) index over chunk text, kept in sync by triggers
+        fts_exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'document_chunks_fts'"
+        ).fetchone()
+        cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS document_chunks_fts USING fts5(
+            text,
+            content='document_chunks',
+            content_rowid='chunk_rowid',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """)
+        cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS document_chunks_fts_ai AFTER INSERT ON document_chunks BEGIN
+            INSERT INTO document_chunks_fts (rowid, text) VALUES (new.chunk_rowid, new.text);
+        END
+        """)
+        cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS document_chunks_fts_ad AFTER DELETE ON document_chunks BEGIN
+            INSERT INTO document_chunks_fts (document_chunks_fts, rowid, text)
+            VALUES ('delete', old.chunk_rowid, old.text);
+        END
+        """)
+        cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS document_chunks_fts_au AFTER UPDATE OF text ON document_chunks BEGIN
+            INSERT INTO document_chunks_fts (document_chunks_fts, rowid, text)
+            VALUES ('delete', old.chunk_rowid, old.text);
+            INSERT INTO document_chunks_fts (rowid, text) VALUES (new.chunk_rowid, new.text);
+        END
+        """)
+        if not fts_exists:
+            cursor.execute("INSERT INTO document_chunks_fts (document_chunks_fts) VALUES ('rebuild')")
+
+        # Durable indexing jobs; items are the per-document checkpoints of a job
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS indexing_jobs (
+            job_id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            embed_model     TEXT NOT NULL,
+            deep_model      TEXT,
+            status          TEXT NOT NULL DEFAULT 'pending'
+                            CHECK(status IN ('pending','running','paused','done','failed')),
+            total_items     INTEGER NOT NULL DEFAULT 0,
+            chunks_embedded INTEGER NOT NULL DEFAULT 0,
+            error           TEXT,
+            created_at      DATETIME NOT NULL DEFAULT (CURRENT_TIMESTAMP),
+            updated_at      DATETIME NOT NULL DEFAULT (CURRENT_TIMESTAMP)
+        )
+        """)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS indexing_job_items (
+            job_id       INTEGER NOT NULL REFERENCES indexing_jobs(job_id),
+            doc_id       TEXT NOT NULL REFERENCES documents(doc_id),
+            position     INTEGER NOT NULL,
+            status       TEXT NOT NULL DEFAULT 'pending'
+                         CHECK(status IN ('pending','done','failed')),
+            chunks_done  INTEGER NOT NULL DEFAULT 0,
+            error        TEXT,
+            PRIMARY KEY (job_id, doc_id)
         )
         """)
 
@@ -0,0 +1,76 @@
+"""Command-line export/import of conversations as NDJSON.
+
+    python -m backend.db.transfer export -o backup.ndjson
+    python -m backend.db.transfer import backup.ndjson
+"""
+import argparse
+import json
+import logging
+import sys
+from backend.database import Database
+
+logger = logging.getLogger(__name__)
+
+def to_ndjson(records):
+    """Serialize records as newline-delimited JSON, one line per record."""
+    for record in records:
+        yield json.dumps(record, default=str, ensure_ascii=False) + '\n'
+
+def from_ndjson(lines):
+    """Parse newline-delimited JSON lines, skipping blanks."""
+    for line_no, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Line {line_no}: invalid JSON ({e.msg})")
+
+def export_conversations(db: Database, output, session_ids=None) -> None:
+    """Write sessions and messages to a text stream as NDJSON."""
+    for line in to_ndjson(db.iter_export(session_ids)):
+        output.write(line)
+
+def import_conversations(db: Database, source, batch_size: int = 500) -> dict:
+    """Read NDJSON from a text stream into the database."""
+    return db.import_records(from_ndjson(source), batch_size=batch_size)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Export or import conversations as NDJSON")
+    parser.add_argument('--db', default='database.db', help="Path to the SQLite database")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = commands.add_parser('export', help="Stream conversations to NDJSON")
+    export_parser.add_argument('-o', '--output', default='-', help="Output file, '-' for stdout")
+    export_parser.add_argument('--session', action='append', dest='session_ids',
+                               help="Only export this session id (repeatable)")
+
+    import_parser = commands.add_parser('import', help="Load conversations from NDJSON")
+    import_parser.add_argument('input', help="Input file, '-' for stdin")
+    import_parser.add_argument('--batch-size', type=int, default=500)
+
+    args = parser.parse_args(argv)
+    db = Database(args.db)
+
+    if args.command == 'export':
+        if args.output == '-':
+            export_conversations(db, sys.stdout, args.session_ids)
+        else:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                export_conversations(db, f, args.session_ids)
+        return 0
+
+    if args.input == '-':
+        counts = import_conversations(db, sys.stdin, args.batch_size)
+    else:
+        with open(args.input, 'r', encoding='utf-8') as f:
+            counts = import_conversations(db, f, args.batch_size)
+    logger.info(f"Import finished: {counts}")
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
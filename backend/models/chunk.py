@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Optional
 from pydantic import BaseModel, Field
 
 class DocumentChunk(BaseModel):
@@ -8,6 +9,7 @@ class DocumentChunk(BaseModel):
     chunk_index: int = Field(..., description="Position of the chunk within the document")
     text: str = Field(..., description="The actual text content of the chunk")
     chroma_id: str = Field(..., description="Unique identifier in the Chroma vector store")
+    content_hash: Optional[str] = Field(None, description="SHA-256 of the chunk text")
     created_at: datetime = Field(default_factory=datetime.now, description="When the chunk was created")
 
     class Config:
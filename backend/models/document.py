@@ -8,6 +8,8 @@ class Document(BaseModel):
     source_type: str = Field(..., description="Type of document source (e.g. transcript, pdf, markdown)")
     source_path: Optional[str] = Field(None, description="Filesystem path or URL of the source")
     metadata: Dict[str, Any] = Field(default_factory=dict, description="Additional metadata/tags for the document")
+    content_hash: Optional[str] = Field(None, description="SHA-256 of the source content when last indexed")
+    embed_model: Optional[str] = Field(None, description="Embedding model used when last indexed")
     created_at: datetime = Field(default_factory=datetime.now, description="When the document was created")
     updated_at: datetime = Field(default_factory=datetime.now, description="When the document was last updated")
 
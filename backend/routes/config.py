@@ -1,5 +1,4 @@
-from flask import Blueprint, jsonify, request
-from backend.models.session_config import SessionConfig
+from flask import Blueprint, current_app, jsonify, request
 import os
 import requests
 import logging
@@ -128,36 +127,17 @@ def set_current_model():
 @bp.route('/sessions/<session_id>/config', methods=['GET'])
 def get_config(session_id: str):
     """Get configuration for a session."""
-    # TODO: Implement database query
-    # For now, return mock data
-    config = SessionConfig(
-        session_id=session_id,
-        model_name="llama-2-13b"
-    )
+    config = current_app.session_config_store.get(session_id)
     return jsonify(config.model_dump())
 
 @bp.route('/sessions/<session_id>/config', methods=['PUT'])
 def update_config(session_id: str):
     """Update configuration for a session."""
-    data = request.get_json()
-    
-    # TODO: Get existing config from database
-    current_config = SessionConfig(
-        session_id=session_id,
-        model_name="llama-2-13b"
-    )
-    
-    # Update fields that are present in request
-    update_data = {
-        'session_id': session_id,  # Ensure this doesn't change
-        **current_config.model_dump(),
-        **data
-    }
+    data = request.get_json() or {}
     
     try:
-        # Validate and create updated config
-        updated_config = SessionConfig(**update_data)
-        # TODO: Save to database
+        # Validates the merged config, persists it and notifies clients
+        updated_config = current_app.session_config_store.update(session_id, data)
         return jsonify(updated_config.model_dump())
     except ValueError as e:
-        return jsonify({'error': str(e)}), 400 
\ No newline at end of file
+        return jsonify({'error': str(e)}), 400
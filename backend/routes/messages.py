@@ -1,5 +1,5 @@
 from datetime import datetime
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 from backend.models.message import Message
 from backend.models.session_config import SessionConfig
 
@@ -38,12 +38,14 @@ def send_message(session_id: str):
         return jsonify({'error': 'Message content is required'}), 400
         
     # Get session config for thinking mode
-    # TODO: Get from database
-    config = SessionConfig(
-        session_id=session_id,
-        model_name="llama-2-13b",
-        thinking_mode=data.get('thinking_mode', 'hybrid')
-    )
+    config = current_app.session_config_store.get(session_id)
+    thinking_mode = data.get('thinking_mode')
+    if thinking_mode and thinking_mode != config.thinking_mode:
+        # Per-message override; only this path pays for validation
+        try:
+            config = SessionConfig(**{**config.model_dump(), 'thinking_mode': thinking_mode})
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
     
     # Create user message
     user_msg = Message(
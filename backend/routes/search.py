@@ -0,0 +1,36 @@
+from flask import Blueprint, jsonify, request
+from backend.database import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('search', __name__, url_prefix='/api')
+
+MAX_PAGE_SIZE = 100
+
+@bp.route('/search', methods=['GET'])
+def search_messages():
+    """Search message text across all conversations."""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': False, 'error': 'Query parameter q is required'}), 400
+
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), MAX_PAGE_SIZE)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit and offset must be integers'}), 400
+
+    try:
+        results = db.search_messages(query, limit=limit, offset=offset)
+        return jsonify({
+            'success': True,
+            'query': query,
+            'total': results['total'],
+            'limit': limit,
+            'offset': offset,
+            'hits': results['hits']
+        })
+    except Exception as e:
+        logger.error(f"Error searching messages: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
@@ -1,8 +1,7 @@
 from datetime import datetime
 import uuid
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 from ..models.session import Session
-from ..models.session_config import SessionConfig
 
 bp = Blueprint('sessions', __name__, url_prefix='/api/sessions')
 
@@ -37,13 +36,14 @@ def create_session():
         updated_at=datetime.now()
     )
     
-    # Create default config for the session
-    config = SessionConfig(
-        session_id=session_id,
-        model_name=data.get('model_name', 'llama-2-13b')
-    )
+    # TODO: Save session to database
     
-    # TODO: Save session and config to database
+    # Persist the initial config for the session
+    overrides = {'model_name': data['model_name']} if data.get('model_name') else {}
+    try:
+        current_app.session_config_store.create(session_id, **overrides)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     return jsonify(session.model_dump()), 201
 
@@ -62,10 +62,7 @@ def get_session(session_id: str):
         updated_at=datetime.now()
     )
     
-    config = SessionConfig(
-        session_id=session_id,
-        model_name="llama-2-13b"
-    )
+    config = current_app.session_config_store.get(session_id)
     
     return jsonify({
         'session': session.model_dump(),
@@ -0,0 +1,39 @@
+import logging
+from datetime import datetime
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from backend.conversation_store import conversation_store
+from backend.database import db
+from backend.db.transfer import from_ndjson, to_ndjson
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('transfer', __name__, url_prefix='/api')
+
+@bp.route('/export', methods=['GET'])
+def export_conversations():
+    """Stream all (or selected) sessions and their messages as NDJSON."""
+    session_ids = request.args.getlist('session_id') or None
+    filename = f"conversations-{datetime.now().strftime('%Y%m%d-%H%M%S')}.ndjson"
+
+    return Response(
+        stream_with_context(to_ndjson(db.iter_export(session_ids))),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@bp.route('/import', methods=['POST'])
+def import_conversations():
+    """Import sessions and messages from an NDJSON request body."""
+    try:
+        batch_size = int(request.args.get('batch_size', 500))
+        counts = db.import_records(from_ndjson(request.stream), batch_size=batch_size)
+    except (ValueError, KeyError) as e:
+        logger.error(f"Rejected conversation import: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error importing conversations: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    # Imported messages may extend sessions that are already cached
+    conversation_store.invalidate()
+    return jsonify({'success': True, **counts})
@@ -1,15 +1,44 @@
 import os
 import re
 import logging
+import time
 import requests
-from typing import Optional
+from threading import Lock, Thread
+from typing import List, Optional
+from .memory_index import format_turn
 
 logger = logging.getLogger(__name__)
 
 class AIService:
-    def __init__(self, conversation_store):
+    def __init__(self, conversation_store, memory=None, recent_turns: int = 4, recall_k: int = 3):
         self.conversation_store = conversation_store
         self.service = os.getenv('AI_SERVICE', 'ollama').lower()
+        # With long-term memory, prompts carry only the last few turns plus recalled ones
+        self.memory = memory
+        self.recent_turns = recent_turns
+        self.recall_k = recall_k
+        # How long Ollama keeps the model loaded after each request
+        self.keep_alive = os.getenv('OLLAMA_KEEP_ALIVE', '30m')
+        # Context size of the last request; Ollama reloads the model when it changes
+        self._num_ctx = 2048
+        self._warm_lock = Lock()
+        # Background warm-ups closer together than this are dropped
+        self.warm_up_interval_s = float(os.getenv('OLLAMA_WARM_UP_INTERVAL_S', '60'))
+        self._last_warm_up: Optional[float] = None
+        self._warm_schedule_lock = Lock()
+
+    def _recall_memories(self, chat_id: str, prompt: str, recent: List[dict]) -> List[str]:
+        """Past turns relevant to the prompt that are not already in the recent tail"""
+        in_prompt = [
+            format_turn(user['text'], ai['text'])
+            for user, ai in zip(recent, recent[1:])
+            if user['type'] == 'user' and ai['type'] != 'user'
+        ]
+        try:
+            return self.memory.recall(chat_id, prompt, k=self.recall_k, exclude=in_prompt)
+        except Exception as e:
+            logger.warning(f"Memory recall failed for chat {chat_id}: {str(e)}")
+            return []
 
     def get_response(self, prompt: str, chat_id: str, max_tokens: Optional[int] = None) -> str:
         """Get AI response using configured service"""
@@ -34,6 +63,15 @@ class AIService:
 
         # Get conversation history within token limit
         history = self.conversation_store.get_history(chat_id, max_tokens)
+        memory_text = ""
+        if self.memory and history:
+            # Recent tail verbatim, older turns only when relevant to this prompt
+            history = history[-self.recent_turns * 2:]
+            memories = self._recall_memories(chat_id, prompt, history)
+            if memories:
+                memory_text = "Relevant earlier conversation:\n" + "\n".join(memories) + "\n\n"
+                logger.info(f"[Ollama] Recalled {len(memories)} earlier turns")
+
         history_text = ""
         if history:
             for msg in history:
@@ -44,20 +82,15 @@ class AIService:
         logger.debug(f"[Ollama] History text:\n{history_text}")
         logger.info(f"[Ollama] Current prompt: {prompt}")
 
-        full_prompt = f"{system_prompt}\n\n{history_text}User: {prompt}\nAssistant:"
+        full_prompt = f"{system_prompt}\n\n{memory_text}{history_text}User: {prompt}\nAssistant:"
 
+        self._num_ctx = max_tokens if max_tokens else 2048
         data = {
             "model": os.getenv('OLLAMA_MODEL', 'deepseek-r1'),
             "prompt": full_prompt,
             "stream": False,
-            "options": {
-                "num_gpu": 33,  # Use all GPU layers
-                "num_thread": 20,  # More CPU threads
-                "temperature": 0.7,  # Lower temperature for faster, more focused responses
-                "top_p": 0.9,  # Nucleus sampling parameter
-                "repeat_penalty": 1.1,  # Penalize repetition
-                "num_ctx": max_tokens if max_tokens else 2048  # Use provided context window size
-            }
+            "keep_alive": self.keep_alive,
+            "options": self._ollama_options(self._num_ctx)
         }
         
         try:
@@ -80,6 +113,55 @@ class AIService:
         except requests.exceptions.RequestException as e:
             raise Exception(f"Ollama API request failed: {str(e)}")
 
+    @staticmethod
+    def _ollama_options(num_ctx: int) -> dict:
+        return {
+            "num_gpu": 33,  # Use all GPU layers
+            "num_thread": 20,  # More CPU threads
+            "temperature": 0.7,  # Lower temperature for faster, more focused responses
+            "top_p": 0.9,  # Nucleus sampling parameter
+            "repeat_penalty": 1.1,  # Penalize repetition
+            "num_ctx": num_ctx  # Use provided context window size
+        }
+
+    def warm_up(self) -> bool:
+        """Load the Ollama model and generate one token so the next turn starts hot.
+
+        Uses the options of the last real request, since a different context
+        size would make Ollama load the model again. Returns False when the
+        service is not Ollama, a warm-up is already running, or it failed.
+        """
+        if self.service != 'ollama' or not self._warm_lock.acquire(blocking=False):
+            return False
+        try:
+            base_url = os.getenv('OLLAMA_URL', 'http://localhost:11434').rstrip('/')
+            model = os.getenv('OLLAMA_MODEL', 'deepseek-r1')
+            started = time.monotonic()
+            response = requests.post(f"{base_url}/api/generate", json={
+                "model": model,
+                "prompt": "Hello",
+                "stream": False,
+                "keep_alive": self.keep_alive,
+                "options": {**self._ollama_options(self._num_ctx), "num_predict": 1}
+            }, timeout=120)
+            response.raise_for_status()
+            logger.info(f"[Ollama] Warmed up {model} in {time.monotonic() - started:.2f}s")
+            return True
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"[Ollama] Warm-up failed: {str(e)}")
+            return False
+        finally:
+            self._warm_lock.release()
+
+    def warm_up_async(self) -> None:
+        """Run warm_up in the background, at most once per warm_up_interval_s."""
+        now = time.monotonic()
+        with self._warm_schedule_lock:
+            if self._last_warm_up is not None and now - self._last_warm_up < self.warm_up_interval_s:
+                return
+            self._last_warm_up = now
+        Thread(target=self.warm_up, daemon=True).start()
+
     def _get_n8n_response(self, prompt: str, chat_id: str) -> str:
         """Get response from n8n webhook"""
         url = os.getenv('N8N_WEBHOOK_URL')
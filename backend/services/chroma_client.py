@@ -1,126 +1,246 @@
 import logging
-from typing import List, Dict, Any, Optional
+import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import List, Dict, Any, Optional, Tuple, Union
 import chromadb
 from chromadb.config import Settings
 import numpy as np
+from .vector_store import VectorStore
+from ..utils.retries import call_with_retries
 
 logger = logging.getLogger(__name__)
 
-class ChromaClient:
-    def __init__(self, persist_directory: str = "./chroma_db"):
+# One HTTP client per server, shared by every collection in the process so
+# connections are pooled and reused rather than opened per ChromaClient
+_http_clients: Dict[Tuple[str, int], Any] = {}
+_http_clients_lock = Lock()
+
+def _get_http_client(host: str, port: int):
+    with _http_clients_lock:
+        client = _http_clients.get((host, port))
+        if client is None:
+            client = _http_clients[(host, port)] = chromadb.HttpClient(host=host, port=port)
+        return client
+
+class ChromaClient(VectorStore):
+    def __init__(self,
+                 persist_directory: str = "./chroma_db",
+                 collection_name: str = "document_chunks",
+                 mode: str = "embedded",
+                 host: str = "localhost",
+                 port: int = 8000,
+                 upsert_batch_size: int = 1000,
+                 upsert_concurrency: int = 4,
+                 max_retries: int = 3):
         self._persist_directory = persist_directory
-        self._client = chromadb.Client(Settings(
-            persist_directory=persist_directory,
-            is_persistent=True
-        ))
-        self._collection = self._client.get_or_create_collection(
-            name="document_chunks",
+        self._mode = mode
+        if mode == "http":
+            self._client = _get_http_client(host, port)
+            location = f"http://{host}:{port}"
+        elif mode == "embedded":
+            self._client = chromadb.Client(Settings(
+                persist_directory=persist_directory,
+                is_persistent=True
+            ))
+            location = os.path.abspath(persist_directory)
+        else:
+            raise ValueError(f"Unknown Chroma mode: {mode}")
+        super().__init__(location, collection_name)
+
+        self._max_retries = max_retries
+        self._collection = self._call(lambda: self._client.get_or_create_collection(
+            name=collection_name,
             metadata={"hnsw:space": "cosine"}
-        )
-        logger.info(f"Initialized ChromaDB client with persistence at {persist_directory}")
+        ), "get_or_create_collection")
+
+        # Never send more per request than the server accepts
+        server_limit = getattr(self._client, 'max_batch_size', None)
+        if not isinstance(server_limit, int) or server_limit <= 0:
+            server_limit = upsert_batch_size
+        self._upsert_batch_size = max(1, min(upsert_batch_size, server_limit))
+        # The embedded client writes to one SQLite file, so only the server gets parallel batches
+        self._upsert_concurrency = max(1, upsert_concurrency) if mode == "http" else 1
+        logger.info(f"Initialized ChromaDB client ({mode}) at {location}")
+
+    @property
+    def shared(self) -> bool:
+        # Other processes on the node write through the same server
+        return self._mode == "http"
+
+    def _call(self, fn, description: str):
+        """Run one collection call, retrying transient failures."""
+        return call_with_retries(fn, attempts=self._max_retries, description=f"Chroma {description}")
 
     def upsert_chunks(self, chunks: List[Dict[str, Any]]) -> None:
         """
         Upsert chunks into the vector store.
+
+        Chunks are sent in batches of at most upsert_batch_size; in HTTP mode
+        up to upsert_concurrency batches are in flight at once.
         
         Args:
             chunks: List of dicts with keys:
                 - chroma_id: str
-                - embedding: List[float]
+                - embedding: List[float] or 1-D np.ndarray
                 - text: str
                 - metadata: Dict (optional)
         """
         if not chunks:
             return
 
-        # Prepare data for bulk upsert
-        ids = []
-        embeddings = []
-        documents = []
-        metadatas = []
+        embeddings = np.asarray([chunk['embedding'] for chunk in chunks], dtype=np.float32)
 
-        for chunk in chunks:
-            ids.append(chunk['chroma_id'])
-            embeddings.append(chunk['embedding'])
-            documents.append(chunk['text'])
-            metadatas.append(chunk.get('metadata', {}))
+        def upsert_batch(start: int) -> None:
+            batch = chunks[start:start + self._upsert_batch_size]
+            self._call(lambda: self._collection.upsert(
+                ids=[chunk['chroma_id'] for chunk in batch],
+                embeddings=embeddings[start:start + len(batch)],
+                documents=[chunk['text'] for chunk in batch],
+                metadatas=[chunk.get('metadata', {}) for chunk in batch]
+            ), "upsert")
 
+        starts = range(0, len(chunks), self._upsert_batch_size)
         try:
-            self._collection.upsert(
-                ids=ids,
-                embeddings=embeddings,
-                documents=documents,
-                metadatas=metadatas
-            )
-            logger.info(f"Upserted {len(chunks)} chunks into ChromaDB")
+            if self._upsert_concurrency == 1 or len(starts) == 1:
+                for start in starts:
+                    upsert_batch(start)
+            else:
+                with ThreadPoolExecutor(max_workers=self._upsert_concurrency) as executor:
+                    # Wait for every batch, then surface the first failure
+                    for future in [executor.submit(upsert_batch, start) for start in starts]:
+                        future.result()
+            logger.info(f"Upserted {len(chunks)} chunks into ChromaDB in {len(starts)} batches")
         except Exception as e:
             logger.error(f"Error upserting chunks: {str(e)}")
             raise
+        finally:
+            # Even a partial upsert changed the collection
+            self._bump_generation()
 
-    def query(self, 
-             embedding: List[float], 
-             top_k: int = 5,
-             where: Optional[Dict[str, Any]] = None
-             ) -> List[Dict[str, Any]]:
+    def query_batch(self,
+                    embeddings: np.ndarray,
+                    top_k: int = 5,
+                    where: Optional[Dict[str, Any]] = None,
+                    as_arrays: bool = False
+                    ) -> Union[List[List[Dict[str, Any]]], Dict[str, np.ndarray]]:
         """
-        Query the vector store for similar chunks.
+        Query the vector store with many embeddings in a single call.
         
         Args:
-            embedding: Query embedding vector
-            top_k: Number of results to return
-            where: Optional filter conditions
+            embeddings: (N, D) array of query vectors
+            top_k: Number of results to return per query
+            where: Optional filter conditions applied to every query
+            as_arrays: Return column arrays instead of per-result dicts
             
         Returns:
-            List of dicts with keys:
-                - chroma_id: str
-                - text: str
-                - metadata: Dict
-                - distance: float
+            If as_arrays is False, a list of N result lists shaped like query().
+            Otherwise a dict of (N, top_k) arrays:
+                - ids: object array, None where fewer than top_k matched
+                - distances: float32 array, inf where fewer than top_k matched
+                - texts: object array
+                - metadatas: object array
         """
+        query_embeddings = np.asarray(embeddings, dtype=np.float32)
+        if query_embeddings.ndim == 1:
+            query_embeddings = query_embeddings[np.newaxis, :]
+
         try:
-            # Convert embedding to numpy array for consistency
-            query_embedding = np.array(embedding).reshape(1, -1)
-            
-            # Execute query
-            results = self._collection.query(
-                query_embeddings=query_embedding,
+            results = self._call(lambda: self._collection.query(
+                query_embeddings=query_embeddings,
                 n_results=top_k,
-                where=where
-            )
-            
-            # Format results
-            formatted_results = []
-            for i in range(len(results['ids'][0])):
-                formatted_results.append({
-                    'chroma_id': results['ids'][0][i],
-                    'text': results['documents'][0][i],
-                    'metadata': results['metadatas'][0][i],
-                    'distance': float(results['distances'][0][i])
-                })
-            
-            return formatted_results
-            
+                where=where,
+                include=['documents', 'metadatas', 'distances']
+            ), "query")
         except Exception as e:
             logger.error(f"Error querying ChromaDB: {str(e)}")
             raise
 
+        if as_arrays:
+            n = len(query_embeddings)
+            ids = np.full((n, top_k), None, dtype=object)
+            texts = np.full((n, top_k), None, dtype=object)
+            metadatas = np.full((n, top_k), None, dtype=object)
+            distances = np.full((n, top_k), np.inf, dtype=np.float32)
+            for row in range(n):
+                # Chroma returns ragged rows when a filter leaves fewer than top_k matches
+                count = len(results['ids'][row])
+                ids[row, :count] = results['ids'][row]
+                texts[row, :count] = results['documents'][row]
+                metadatas[row, :count] = results['metadatas'][row]
+                distances[row, :count] = results['distances'][row]
+            return {'ids': ids, 'distances': distances, 'texts': texts, 'metadatas': metadatas}
+
+        return [
+            [{
+                'chroma_id': chroma_id,
+                'text': text,
+                'metadata': metadata,
+                'distance': float(distance)
+            } for chroma_id, text, metadata, distance in zip(
+                row_ids, row_texts, row_metadatas, row_distances
+            )]
+            for row_ids, row_texts, row_metadatas, row_distances in zip(
+                results['ids'], results['documents'], results['metadatas'], results['distances']
+            )
+        ]
+
+    def get_embeddings(self, chunk_ids: List[str]) -> Dict[str, np.ndarray]:
+        """Stored vectors by id; ids that are not in the collection are omitted."""
+        if not chunk_ids:
+            return {}
+        try:
+            results = self._call(
+                lambda: self._collection.get(ids=chunk_ids, include=['embeddings']), "get"
+            )
+        except Exception as e:
+            logger.error(f"Error fetching embeddings: {str(e)}")
+            raise
+        return {
+            chroma_id: np.asarray(embedding, dtype=np.float32)
+            for chroma_id, embedding in zip(results['ids'], results['embeddings'])
+        }
+
+    def update_metadata(self, chunk_ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Update chunk metadata in place without touching embeddings."""
+        if not chunk_ids:
+            return
+        try:
+            self._call(lambda: self._collection.update(ids=chunk_ids, metadatas=metadatas), "update")
+            self._bump_generation()
+        except Exception as e:
+            logger.error(f"Error updating chunk metadata: {str(e)}")
+            raise
+
     def delete_chunks(self, chunk_ids: List[str]) -> None:
         """Delete chunks from the vector store."""
         try:
-            self._collection.delete(ids=chunk_ids)
+            self._call(lambda: self._collection.delete(ids=chunk_ids), "delete")
+            self._bump_generation()
             logger.info(f"Deleted {len(chunk_ids)} chunks from ChromaDB")
         except Exception as e:
             logger.error(f"Error deleting chunks: {str(e)}")
             raise
 
+    def delete_where(self, where: Dict[str, Any]) -> None:
+        """Delete every chunk whose metadata matches the filter."""
+        try:
+            self._call(lambda: self._collection.delete(where=where), "delete")
+            self._bump_generation()
+            logger.info(f"Deleted chunks matching {where} from ChromaDB")
+        except Exception as e:
+            logger.error(f"Error deleting chunks: {str(e)}")
+            raise
+
     def get_collection_stats(self) -> Dict[str, Any]:
         """Get statistics about the collection."""
         try:
-            count = self._collection.count()
+            count = self._call(self._collection.count, "count")
             return {
                 'total_chunks': count,
                 'collection_name': self._collection.name,
-                'persist_directory': self._persist_directory
+                'persist_directory': self._persist_directory,
+                'mode': self._mode
             }
         except Exception as e:
             logger.error(f"Error getting collection stats: {str(e)}")
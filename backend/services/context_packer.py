@@ -0,0 +1,112 @@
+import logging
+from typing import List, Dict, Any, Optional
+import numpy as np
+from ..utils.text_chunker import SENTENCE_BOUNDARY
+
+logger = logging.getLogger(__name__)
+
+def estimate_tokens(text: str) -> int:
+    # Rough token estimation (4 chars per token)
+    return len(text) // 4
+
+class ContextPacker:
+    """Choose which retrieved chunks go into the prompt, and how much of each.
+
+    Chunks arrive ranked by retrieval; rank is taken as relevance. Selection
+    is maximal marginal relevance over chunk embeddings, so a chunk that
+    repeats one already chosen loses out to a different one, and chunks at
+    or above dedup_threshold cosine similarity (or whose text is contained
+    in a chosen chunk) are dropped outright. Chosen chunks are packed into
+    the token budget; one that does not fit is cut back to the whole
+    sentences that do.
+    """
+
+    def __init__(self,
+                 dedup_threshold: float = 0.92,
+                 mmr_lambda: float = 0.7,
+                 min_chunk_tokens: int = 16):
+        self._dedup_threshold = dedup_threshold
+        self._mmr_lambda = mmr_lambda
+        # Budget remainders smaller than this are not worth a partial chunk
+        self._min_chunk_tokens = min_chunk_tokens
+
+    @staticmethod
+    def _trim_to_sentences(text: str, budget_tokens: int) -> str:
+        kept = []
+        total_tokens = 0
+        for sentence in SENTENCE_BOUNDARY.split(text):
+            tokens = estimate_tokens(sentence) + 1
+            if total_tokens + tokens > budget_tokens:
+                break
+            kept.append(sentence)
+            total_tokens += tokens
+        return ' '.join(kept)
+
+    def _similarities(self, chunks: List[Dict[str, Any]], vectors: Dict[str, np.ndarray]) -> np.ndarray:
+        """Pairwise cosine similarity; chunks without a vector are similar to nothing."""
+        dim = next((len(v) for v in vectors.values()), 0)
+        matrix = np.zeros((len(chunks), dim), dtype=np.float32)
+        for i, chunk in enumerate(chunks):
+            vector = vectors.get(chunk['chroma_id'])
+            if vector is not None:
+                norm = np.linalg.norm(vector)
+                matrix[i] = vector / norm if norm else 0.0
+        return matrix @ matrix.T
+
+    def pack(self,
+             chunks: List[Dict[str, Any]],
+             budget_tokens: int,
+             vectors: Optional[Dict[str, np.ndarray]] = None,
+             max_chunks: Optional[int] = None,
+             chunk_overhead_tokens: int = 0
+             ) -> List[Dict[str, Any]]:
+        """Select, de-duplicate and trim chunks to fit budget_tokens.
+
+        Args:
+            chunks: Retrieved chunks, best first
+            budget_tokens: Tokens available for context text
+            vectors: Embeddings by chroma_id, used for similarity
+            max_chunks: Maximum number of chunks to keep
+            chunk_overhead_tokens: Tokens the prompt adds around each chunk
+
+        Returns:
+            Chosen chunks in selection order, with 'text' possibly trimmed.
+        """
+        if not chunks or budget_tokens <= 0:
+            return []
+
+        n = len(chunks)
+        max_chunks = max_chunks or n
+        relevance = 1.0 - np.arange(n) / n
+        similarity = self._similarities(chunks, vectors or {})
+        redundancy = np.zeros(n, dtype=np.float32)  # Max similarity to any chosen chunk
+        remaining = np.ones(n, dtype=bool)
+
+        packed, chosen_texts = [], []
+        budget = budget_tokens
+        dropped = 0
+        while remaining.any() and len(packed) < max_chunks and budget >= self._min_chunk_tokens:
+            scores = self._mmr_lambda * relevance - (1 - self._mmr_lambda) * redundancy
+            best = int(np.argmax(np.where(remaining, scores, -np.inf)))
+            remaining[best] = False
+
+            text = chunks[best]['text'].strip()
+            normalized = ' '.join(text.lower().split())
+            if redundancy[best] >= self._dedup_threshold or any(normalized in t for t in chosen_texts):
+                dropped += 1
+                continue
+
+            available = budget - chunk_overhead_tokens
+            if estimate_tokens(text) > available:
+                text = self._trim_to_sentences(text, available)
+                if not text:
+                    continue
+
+            packed.append({**chunks[best], 'text': text})
+            chosen_texts.append(normalized)
+            budget -= estimate_tokens(text) + chunk_overhead_tokens
+            redundancy = np.maximum(redundancy, similarity[best])
+
+        if dropped:
+            logger.debug(f"Dropped {dropped} near-duplicate chunks from context")
+        return packed
@@ -0,0 +1,259 @@
+import json
+import logging
+import sqlite3
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from ..models.chunk import DocumentChunk
+from ..models.document import Document
+from ..utils.document_reader import source_fingerprint
+from ..utils.fts import match_any_term
+
+logger = logging.getLogger(__name__)
+
+# Chunk metadata keys (as stored with each vector) and the columns search_chunks filters them on
+_CHUNK_FILTER_COLUMNS = {
+    'doc_id': 'c.doc_id',
+    'chunk_index': 'c.chunk_index',
+    'source_type': 'd.source_type'
+}
+
+class DocumentStore:
+    """SQLite access to the documents and document_chunks tables."""
+
+    def __init__(self, db_path: str):
+        self._db_path = db_path
+        self._document_listeners: List[Callable[[], None]] = []
+
+    def add_document_listener(self, callback: Callable[[], None]) -> None:
+        """Call callback() after a document is saved without index state, i.e. needs indexing."""
+        self._document_listeners.append(callback)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _row_to_document(row: sqlite3.Row) -> Document:
+        return Document(
+            doc_id=row['doc_id'],
+            source_type=row['source_type'],
+            source_path=row['source_path'],
+            metadata=json.loads(row['metadata']) if row['metadata'] else {},
+            content_hash=row['content_hash'],
+            embed_model=row['embed_model'],
+            created_at=row['created_at'],
+            updated_at=row['updated_at']
+        )
+
+    def get_document(self, doc_id: str) -> Optional[Document]:
+        """Get a document by id."""
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM documents WHERE doc_id = ?', (doc_id,)).fetchone()
+        return self._row_to_document(row) if row else None
+
+    def list_documents(self) -> List[Document]:
+        """List all registered documents."""
+        with self._connect() as conn:
+            rows = conn.execute('SELECT * FROM documents ORDER BY created_at').fetchall()
+        return [self._row_to_document(row) for row in rows]
+
+    def list_unindexed_documents(self, embed_model: str) -> List[Document]:
+        """Documents never indexed, or last indexed with a different embedder.
+
+        Documents whose last indexing attempt failed are left out until their
+        source file changes or the document is saved again.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                '''
+                SELECT * FROM documents
+                WHERE content_hash IS NULL OR embed_model IS NOT ?
+                ORDER BY created_at
+                ''',
+                (embed_model,)
+            ).fetchall()
+        return [self._row_to_document(row) for row in rows
+                if row['index_failed_source'] is None
+                or row['index_failed_source'] != source_fingerprint(row['source_path'])]
+
+    def record_index_failure(self, doc: Document) -> None:
+        """Remember that indexing doc failed with its source file as it is now."""
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE documents SET index_failed_source = ? WHERE doc_id = ?',
+                (source_fingerprint(doc.source_path), doc.doc_id)
+            )
+            conn.commit()
+
+    def save_document(self, doc: Document) -> None:
+        """Insert or update a document row, including its index state."""
+        with self._connect() as conn:
+            conn.execute(
+                '''
+                INSERT INTO documents (doc_id, source_type, source_path, metadata,
+                                       content_hash, embed_model, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (doc_id) DO UPDATE SET
+                    source_type = excluded.source_type,
+                    source_path = excluded.source_path,
+                    metadata = excluded.metadata,
+                    content_hash = excluded.content_hash,
+                    embed_model = excluded.embed_model,
+                    index_failed_source = NULL,
+                    updated_at = excluded.updated_at
+                ''',
+                (doc.doc_id, doc.source_type, doc.source_path, json.dumps(doc.metadata),
+                 doc.content_hash, doc.embed_model, doc.created_at, datetime.now())
+            )
+            conn.commit()
+        # Saves that record a finished index carry a content hash and are not news
+        if doc.content_hash is None:
+            for callback in self._document_listeners:
+                callback()
+
+    def get_chunk_hashes(self, doc_id: str) -> Dict[str, str]:
+        """Map chroma_id -> content_hash for every stored chunk of a document."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT chroma_id, content_hash FROM document_chunks WHERE doc_id = ?',
+                (doc_id,)
+            ).fetchall()
+        return {row['chroma_id']: row['content_hash'] for row in rows}
+
+    def upsert_chunks(self, chunks: Iterable[DocumentChunk]) -> None:
+        """Insert or update chunk rows."""
+        with self._connect() as conn:
+            conn.executemany(
+                '''
+                INSERT INTO document_chunks (chunk_id, doc_id, chunk_index, text, chroma_id,
+                                             content_hash, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (chunk_id) DO UPDATE SET
+                    chunk_index = excluded.chunk_index,
+                    text = excluded.text,
+                    content_hash = excluded.content_hash,
+                    deep_model = CASE WHEN content_hash IS excluded.content_hash
+                                      THEN deep_model END
+                ''',
+                [(c.chunk_id, c.doc_id, c.chunk_index, c.text, c.chroma_id, c.content_hash,
+                  c.created_at) for c in chunks]
+            )
+            conn.commit()
+
+    def get_chunks_missing_deep(self, embed_model: str, limit: int = 256) -> List[DocumentChunk]:
+        """Chunks with no deep-store vector from embed_model yet."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                '''
+                SELECT chunk_id, doc_id, chunk_index, text, chroma_id, content_hash, created_at
+                FROM document_chunks
+                WHERE deep_model IS NULL OR deep_model != ?
+                ORDER BY chunk_rowid
+                LIMIT ?
+                ''',
+                (embed_model, limit)
+            ).fetchall()
+        return [DocumentChunk(**dict(row)) for row in rows]
+
+    def count_chunks_missing_deep(self, embed_model: str) -> int:
+        """Number of chunks get_chunks_missing_deep still has to return."""
+        with self._connect() as conn:
+            return conn.execute(
+                'SELECT COUNT(*) FROM document_chunks WHERE deep_model IS NULL OR deep_model != ?',
+                (embed_model,)
+            ).fetchone()[0]
+
+    def mark_deep_embedded(self, chroma_ids: List[str], embed_model: str) -> None:
+        """Record that the deep store holds embed_model vectors for these chunks."""
+        with self._connect() as conn:
+            conn.executemany(
+                'UPDATE document_chunks SET deep_model = ? WHERE chroma_id = ?',
+                [(embed_model, chroma_id) for chroma_id in chroma_ids]
+            )
+            conn.commit()
+
+    def get_deep_models(self, chroma_ids: List[str]) -> Dict[str, str]:
+        """Map chroma_id -> the model that made its deep-store vector, for chunks that have one."""
+        if not chroma_ids:
+            return {}
+        placeholders = ', '.join('?' for _ in chroma_ids)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f'SELECT chroma_id, deep_model FROM document_chunks '
+                f'WHERE chroma_id IN ({placeholders}) AND deep_model IS NOT NULL',
+                list(chroma_ids)
+            ).fetchall()
+        return {row['chroma_id']: row['deep_model'] for row in rows}
+
+    def search_chunks(self,
+                      query: str,
+                      limit: int = 20,
+                      where: Optional[Dict[str, Any]] = None
+                      ) -> List[Dict[str, Any]]:
+        """BM25 search over chunk text.
+
+        Args:
+            query: Free-text query; any non-stopword term may match
+            limit: Maximum number of results
+            where: Optional equality filter on the chunk metadata keys,
+                doc_id, chunk_index and source_type
+
+        Raises:
+            ValueError: If where has any other key
+
+        Returns:
+            List of dicts shaped like vector-store results, best first, with
+            a 'bm25' score (higher is better) in place of 'distance'.
+        """
+        match = match_any_term(query)
+        if not match:
+            return []
+
+        unsupported = set(where or {}) - set(_CHUNK_FILTER_COLUMNS)
+        if unsupported:
+            raise ValueError(f"Unsupported chunk filter keys: {', '.join(sorted(unsupported))}")
+
+        filters, params = [], [match]
+        for key, value in (where or {}).items():
+            filters.append(f"{_CHUNK_FILTER_COLUMNS[key]} = ?")
+            params.append(value)
+        params.append(limit)
+
+        with self._connect() as conn:
+            rows = conn.execute(
+                f'''
+                SELECT c.chroma_id, c.text, c.doc_id, c.chunk_index, d.source_type,
+                       bm25(document_chunks_fts) AS rank
+                FROM document_chunks_fts
+                JOIN document_chunks c ON c.chunk_rowid = document_chunks_fts.rowid
+                LEFT JOIN documents d ON d.doc_id = c.doc_id
+                WHERE document_chunks_fts MATCH ? {''.join(' AND ' + f for f in filters)}
+                ORDER BY rank
+                LIMIT ?
+                ''',
+                params
+            ).fetchall()
+
+        return [{
+            'chroma_id': row['chroma_id'],
+            'text': row['text'],
+            'metadata': {
+                'doc_id': row['doc_id'],
+                'chunk_index': row['chunk_index'],
+                'source_type': row['source_type']
+            },
+            'bm25': -row['rank']
+        } for row in rows]
+
+    def delete_chunks(self, chroma_ids: List[str]) -> None:
+        """Delete chunk rows by vector-store id."""
+        if not chroma_ids:
+            return
+        with self._connect() as conn:
+            conn.executemany(
+                'DELETE FROM document_chunks WHERE chroma_id = ?',
+                [(chroma_id,) for chroma_id in chroma_ids]
+            )
+            conn.commit()
+        logger.info(f"Deleted {len(chroma_ids)} chunk rows")
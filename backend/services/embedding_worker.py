@@ -0,0 +1,440 @@
+"""Node-wide embedding worker.
+
+One process loads each embedder once and serves encode requests from every
+backend worker on the node:
+
+    EMBEDDING_WORKER_AUTHKEY=... python -m backend.services.embedding_worker --address localhost:6010
+
+Connections are authenticated with a shared key, which is required, and
+messages are pickled, so anyone holding the key can run code in the
+worker. It therefore binds to loopback or a Unix socket unless remote
+access is explicitly allowed.
+
+Requests from different callers for the same model are coalesced into one
+encode() call. Vectors come back through a per-connection shared-memory
+buffer; only the buffer name and array shape cross the socket.
+"""
+import argparse
+import ipaddress
+import logging
+import os
+import signal
+import sys
+import time
+from concurrent.futures import Future
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Listener
+from multiprocessing.shared_memory import SharedMemory
+from queue import Empty, Queue
+from threading import Event, Lock, Thread, local
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def parse_address(address: str) -> Union[Tuple[str, int], str]:
+    """'host:port' for TCP, anything else is a Unix socket path."""
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit():
+        return host or 'localhost', int(port)
+    return address
+
+def is_local_address(address: Union[Tuple[str, int], str]) -> bool:
+    """True for Unix socket paths and TCP addresses on the loopback interface."""
+    if isinstance(address, str):
+        return True
+    host = address[0]
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False  # Any other host name may resolve to a reachable interface
+
+def _require_authkey(authkey: Optional[bytes]) -> bytes:
+    if not authkey:
+        raise ValueError("The embedding worker needs an authkey (set EMBEDDING_WORKER_AUTHKEY)")
+    return authkey
+
+def _shared_memory(name: Optional[str] = None, size: int = 0) -> SharedMemory:
+    """Create or attach to a block whose lifetime this module manages itself.
+
+    The resource tracker would otherwise unlink blocks when the process that
+    merely attached to them exits.
+    """
+    try:
+        return SharedMemory(name=name, create=name is None, size=size, track=False)
+    except TypeError:  # Python < 3.13 has no track argument
+        block = SharedMemory(name=name, create=name is None, size=size)
+        resource_tracker.unregister(block._name, 'shared_memory')
+        return block
+
+class _EncodeRequest:
+    __slots__ = ('texts', 'done', 'vectors', 'error')
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.done = Event()
+        self.vectors: Optional[np.ndarray] = None
+        self.error: Optional[Exception] = None
+
+class _ModelBatcher:
+    """Coalesces concurrent encode requests for one model into shared batches."""
+
+    def __init__(self, model, normalize: bool, max_batch: int, max_wait_s: float):
+        self._model = model
+        self._normalize = normalize
+        self._max_batch = max_batch
+        self._max_wait_s = max_wait_s
+        self._queue: Queue = Queue()
+        self._thread = Thread(target=self._batch_loop, daemon=True)
+        self._thread.start()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        request = _EncodeRequest(texts)
+        self._queue.put(request)
+        request.done.wait()
+        if request.error:
+            raise request.error
+        return request.vectors
+
+    def _batch_loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            count = len(batch[0].texts)
+            # Wait briefly for other callers so their texts share this encode() call
+            deadline = time.monotonic() + self._max_wait_s
+            while count < self._max_batch:
+                try:
+                    request = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except Empty:
+                    break
+                batch.append(request)
+                count += len(request.texts)
+
+            try:
+                vectors = np.asarray(self._model.encode(
+                    [text for request in batch for text in request.texts],
+                    batch_size=count,
+                    convert_to_numpy=True,
+                    show_progress_bar=False,
+                    normalize_embeddings=self._normalize
+                ), dtype=np.float32)
+                start = 0
+                for request in batch:
+                    request.vectors = vectors[start:start + len(request.texts)]
+                    start += len(request.texts)
+            except Exception as e:
+                logger.error(f"Error encoding batch of {count} texts: {str(e)}")
+                for request in batch:
+                    request.error = e
+            for request in batch:
+                request.done.set()
+
+class EmbeddingWorker:
+    """Serves encode requests for every process on the node from one set of loaded models."""
+
+    def __init__(self,
+                 address: Union[Tuple[str, int], str] = ('localhost', 6010),
+                 authkey: Optional[bytes] = None,
+                 model_factory: Optional[Callable[[str], Any]] = None,
+                 max_batch: int = 64,
+                 max_wait_s: float = 0.005,
+                 allow_remote: bool = False):
+        if not allow_remote and not is_local_address(address):
+            raise ValueError(
+                f"Refusing to serve embeddings on non-loopback address {address}; "
+                f"pass allow_remote to expose the worker to other hosts"
+            )
+        self._address = address
+        self._authkey = _require_authkey(authkey)
+        self._model_factory = model_factory
+        self._max_batch = max_batch
+        self._max_wait_s = max_wait_s
+        self._models: Dict[str, Any] = {}
+        # Loads in progress; other requests for the same model wait on these
+        self._loading: Dict[str, Future] = {}
+        self._batchers: Dict[Tuple[str, bool], _ModelBatcher] = {}
+        self._models_lock = Lock()
+        self._listener: Optional[Listener] = None
+        self._accept_thread: Optional[Thread] = None
+        self._stop_event = Event()
+        # Result buffers of open connections, released on stop even if clients never disconnect
+        self._buffers: Dict[int, SharedMemory] = {}
+        self._buffers_lock = Lock()
+
+    @property
+    def address(self):
+        """Bound address (useful when started on port 0)."""
+        return self._listener.address if self._listener else self._address
+
+    def start(self) -> None:
+        """Start accepting connections."""
+        if self._listener:
+            return
+        self._stop_event.clear()
+        # Every backend worker thread may connect at once; the default backlog is 1
+        self._listener = Listener(self._address, authkey=self._authkey, backlog=64)
+        self._accept_thread = Thread(target=self._accept_loop, daemon=True)
+        self._accept_thread.start()
+        logger.info(f"Embedding worker listening on {self.address}")
+
+    def stop(self) -> None:
+        """Stop accepting connections."""
+        if not self._listener:
+            return
+        self._stop_event.set()
+        # Closing a listening socket does not wake a blocked accept(); a last connection does
+        try:
+            Client(self._listener.address, authkey=self._authkey).close()
+        except OSError:
+            pass
+        if self._accept_thread:
+            self._accept_thread.join()
+            self._accept_thread = None
+        self._listener.close()
+        self._listener = None
+        with self._buffers_lock:
+            for buffer in self._buffers.values():
+                self._release(buffer)
+            self._buffers.clear()
+        logger.info("Embedding worker stopped")
+
+    @staticmethod
+    def _release(buffer: SharedMemory) -> None:
+        try:
+            buffer.unlink()
+        except FileNotFoundError:
+            pass
+        try:
+            buffer.close()
+        except BufferError:
+            pass  # Still mapped by a serving thread; the name is gone, memory goes with the mapping
+
+    def wait(self) -> None:
+        """Block until the worker is stopped."""
+        if self._accept_thread:
+            self._accept_thread.join()
+
+    def _load_model(self, name: str):
+        """Return a loaded model, loading it once however many requests ask.
+
+        The load runs outside the lock, so requests for models that are
+        already loaded are not held up by it.
+        """
+        with self._models_lock:
+            model = self._models.get(name)
+            if model is not None:
+                return model
+            future = self._loading.get(name)
+            owner = future is None
+            if owner:
+                future = self._loading[name] = Future()
+
+        if not owner:
+            return future.result()
+
+        logger.info(f"Loading embedder: {name}")
+        try:
+            if self._model_factory:
+                model = self._model_factory(name)
+            else:
+                from sentence_transformers import SentenceTransformer
+                model = SentenceTransformer(name)
+        except Exception as e:
+            with self._models_lock:
+                del self._loading[name]
+            future.set_exception(e)
+            raise
+
+        with self._models_lock:
+            self._models[name] = model
+            del self._loading[name]
+        future.set_result(model)
+        return model
+
+    def _batcher(self, name: str, normalize: bool) -> _ModelBatcher:
+        model = self._load_model(name)
+        with self._models_lock:
+            batcher = self._batchers.get((name, normalize))
+            if batcher is None:
+                batcher = self._batchers[(name, normalize)] = _ModelBatcher(
+                    model, normalize, self._max_batch, self._max_wait_s
+                )
+            return batcher
+
+    def _model_info(self, name: str) -> Dict[str, Any]:
+        model = self._load_model(name)
+        dimension = getattr(model, 'get_sentence_embedding_dimension', lambda: None)()
+        tokenizer = getattr(model, 'tokenizer', None)
+        return {
+            'dimension': dimension,
+            'max_seq_length': getattr(model, 'max_seq_length', None),
+            'tokenizer_name': getattr(tokenizer, 'name_or_path', None)
+        }
+
+    def _accept_loop(self) -> None:
+        while True:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                return  # Listener closed
+            except Exception as e:
+                logger.warning(f"Rejected embedding client: {str(e)}")
+                continue
+            if self._stop_event.is_set():
+                conn.close()
+                return
+            Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def _result_buffer(self, key: int, nbytes: int) -> SharedMemory:
+        """This connection's result buffer, replaced by a larger one when too small."""
+        with self._buffers_lock:
+            buffer = self._buffers.get(key)
+            if buffer is None or buffer.size < nbytes:
+                size = max(nbytes, 2 * (buffer.size if buffer else 0), 1)
+                if buffer is not None:
+                    self._release(buffer)
+                buffer = self._buffers[key] = _shared_memory(size=size)
+            return buffer
+
+    def _serve_connection(self, conn) -> None:
+        """Answer one client's requests, reusing one result buffer for the connection."""
+        key = id(conn)
+        try:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    op = message[0]
+                    if op == 'info':
+                        conn.send(('ok', self._model_info(message[1])))
+                    elif op == 'encode':
+                        _, name, texts, normalize = message
+                        vectors = self._batcher(name, normalize).encode(texts)
+                        buffer = self._result_buffer(key, vectors.nbytes)
+                        np.ndarray(vectors.shape, dtype=np.float32, buffer=buffer.buf)[:] = vectors
+                        conn.send(('ok', (buffer.name, vectors.shape)))
+                    else:
+                        conn.send(('error', f"Unknown operation: {op}"))
+                except Exception as e:
+                    conn.send(('error', str(e)))
+        finally:
+            with self._buffers_lock:
+                buffer = self._buffers.pop(key, None)
+            if buffer is not None:
+                self._release(buffer)
+            conn.close()
+
+class RemoteEmbedder:
+    """SentenceTransformer-like encode() backed by the node's embedding worker.
+
+    Each calling thread gets its own connection, so concurrent callers can
+    be batched together by the worker.
+    """
+
+    def __init__(self,
+                 address: Union[Tuple[str, int], str],
+                 model_name: str,
+                 authkey: Optional[bytes] = None):
+        self._address = address
+        self._authkey = _require_authkey(authkey)
+        self.model_name = model_name
+        self._local = local()
+        self._tokenizer = None
+        info = self._request(('info', model_name))
+        self.max_seq_length = info['max_seq_length']
+        self._dimension = info['dimension']
+        self._tokenizer_name = info['tokenizer_name']
+
+    def _request(self, message):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = Client(self._address, authkey=self._authkey)
+        try:
+            conn.send(message)
+            status, payload = conn.recv()
+        except (EOFError, OSError):
+            self._local.conn = None
+            raise
+        if status != 'ok':
+            raise RuntimeError(f"Embedding worker error: {payload}")
+        return payload
+
+    def _read_buffer(self, name: str, shape: Tuple[int, ...]) -> np.ndarray:
+        block = getattr(self._local, 'buffer', None)
+        if block is None or block.name != name:
+            # The worker replaced its buffer with a larger one
+            if block is not None:
+                block.close()
+            block = self._local.buffer = _shared_memory(name=name)
+        view = np.ndarray(shape, dtype=np.float32, buffer=block.buf)
+        vectors = view.copy()
+        del view
+        return vectors
+
+    def get_sentence_embedding_dimension(self) -> Optional[int]:
+        return self._dimension
+
+    @property
+    def tokenizer(self):
+        """Tokenizer loaded locally (it is small), or None if unavailable."""
+        if self._tokenizer is None and self._tokenizer_name:
+            try:
+                from transformers import AutoTokenizer
+                self._tokenizer = AutoTokenizer.from_pretrained(self._tokenizer_name)
+            except Exception as e:
+                logger.warning(f"Tokenizer {self._tokenizer_name} unavailable locally: {str(e)}")
+                self._tokenizer_name = None
+        return self._tokenizer
+
+    def encode(self,
+               sentences: Union[str, List[str]],
+               batch_size: Optional[int] = None,
+               convert_to_numpy: bool = True,
+               show_progress_bar: bool = False,
+               normalize_embeddings: bool = False,
+               **kwargs) -> np.ndarray:
+        """Encode text(s) to float32 vectors; a single string gives a 1-D array."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.empty((0, self._dimension or 0), dtype=np.float32)
+        name, shape = self._request(('encode', self.model_name, texts, normalize_embeddings))
+        vectors = self._read_buffer(name, shape)
+        return vectors[0] if single else vectors
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve embeddings to every backend process on this node")
+    parser.add_argument('--address', default=os.getenv('EMBEDDING_WORKER_ADDRESS') or 'localhost:6010',
+                        help="host:port or Unix socket path")
+    parser.add_argument('--allow-remote', action='store_true',
+                        help="Allow a non-loopback host; anyone holding the authkey can then run code here")
+    parser.add_argument('--preload', action='append', default=[], help="Model to load at startup (repeatable)")
+    parser.add_argument('--max-batch', type=int, default=64, help="Texts per coalesced encode() call")
+    parser.add_argument('--max-wait-ms', type=float, default=5.0,
+                        help="How long a request waits for others to join its batch")
+    args = parser.parse_args(argv)
+
+    authkey = os.getenv('EMBEDDING_WORKER_AUTHKEY', '').encode()
+    try:
+        worker = EmbeddingWorker(parse_address(args.address), authkey=authkey,
+                                 max_batch=args.max_batch, max_wait_s=args.max_wait_ms / 1000,
+                                 allow_remote=args.allow_remote)
+    except ValueError as e:
+        parser.error(str(e))
+    for name in args.preload:
+        worker._load_model(name)
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    worker.start()
+    try:
+        worker.wait()
+    except KeyboardInterrupt:
+        worker.stop()
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -1,6 +1,7 @@
 import logging
+import os
 import time
-from typing import Optional, Dict
+from typing import Any, Callable, Dict, List, Optional
 try:
     import pynvml
     NVIDIA_AVAILABLE = True
@@ -8,23 +9,80 @@ except ImportError:
     NVIDIA_AVAILABLE = False
     logger = logging.getLogger(__name__)
     logger.warning("pynvml not available. GPU monitoring will be limited.")
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
 from threading import Thread, Lock
 
 logger = logging.getLogger(__name__)
 
+def _cpu_metrics() -> Dict[str, float]:
+    """CPU load, this process's RSS and system memory, for hosts without NVML."""
+    if PSUTIL_AVAILABLE:
+        memory = psutil.virtual_memory()
+        return {
+            # Since the previous call, so one call per poll gives the poll-interval average
+            'cpu_percent': psutil.cpu_percent(interval=None),
+            'process_rss': psutil.Process().memory_info().rss,
+            'memory_used': memory.total - memory.available,
+            'memory_total': memory.total
+        }
+
+    metrics = {'cpu_percent': 0.0, 'process_rss': 0, 'memory_used': 0, 'memory_total': 0}
+    try:
+        # One-minute load average as a share of the cores
+        metrics['cpu_percent'] = min(100.0, os.getloadavg()[0] / (os.cpu_count() or 1) * 100)
+    except (AttributeError, OSError):
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            metrics['process_rss'] = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        with open('/proc/meminfo') as f:
+            meminfo = {line.split(':')[0]: int(line.split()[1]) * 1024 for line in f}
+        metrics['memory_total'] = meminfo['MemTotal']
+        metrics['memory_used'] = meminfo['MemTotal'] - meminfo.get('MemAvailable', meminfo['MemFree'])
+    except (OSError, KeyError, ValueError, IndexError):
+        pass
+    return metrics
+
 class GPUMonitor:
-    def __init__(self, websocket_service=None, poll_interval: float = 1.0):
+    """Polls GPU (or, without NVML, CPU and RAM) load for the scheduler and the UI.
+
+    utilization is the busiest GPU, or CPU load on hosts without one. Status
+    is broadcast only when utilization or memory use moves by at least
+    hysteresis points since the last broadcast, at most once per
+    min_broadcast_interval, plus a heartbeat every heartbeat_interval.
+    """
+
+    def __init__(self,
+                 websocket_service=None,
+                 poll_interval: float = 1.0,
+                 hysteresis: float = 5.0,
+                 min_broadcast_interval: float = 2.0,
+                 heartbeat_interval: float = 30.0):
         self._poll_interval = poll_interval
+        self._hysteresis = hysteresis
+        self._min_broadcast_interval = min_broadcast_interval
+        self._heartbeat_interval = heartbeat_interval
         self._utilization = 0.0
         self._memory_used = 0
         self._memory_total = 0
+        self._devices: List[Dict[str, Any]] = []
+        self._system: Dict[str, float] = {}
         self._lock = Lock()
         self._running = False
         self._monitor_thread: Optional[Thread] = None
         self._websocket_service = websocket_service
         self._is_indexing = False
         self._device_count = 0
-        
+        # Values and time of the last broadcast, for change detection and the rate cap
+        self._broadcast_state: Optional[tuple] = None
+        self._last_broadcast = 0.0
+        # (threshold, callback, last side) for listeners told about threshold crossings
+        self._threshold_listeners: List[list] = []
+
         if NVIDIA_AVAILABLE:
             try:
                 pynvml.nvmlInit()
@@ -33,7 +91,7 @@ class GPUMonitor:
             except Exception as e:
                 logger.warning(f"Could not initialize NVML: {str(e)}")
         else:
-            logger.info("NVIDIA GPU monitoring not available. Running in limited mode.")
+            logger.info("NVIDIA GPU monitoring not available. Falling back to CPU and memory metrics.")
 
     def start(self) -> None:
         """Start the GPU monitoring thread."""
@@ -53,69 +111,151 @@ class GPUMonitor:
             self._monitor_thread = None
         logger.info("GPU monitoring stopped")
 
+    @property
+    def gpu_available(self) -> bool:
+        return NVIDIA_AVAILABLE and self._device_count > 0
+
     def set_indexing_status(self, is_indexing: bool) -> None:
         """Set the current indexing status."""
+        changed = is_indexing != self._is_indexing
         self._is_indexing = is_indexing
-        self._broadcast_status()
+        if changed:
+            self._broadcast_status(force=True)
+
+    def add_threshold_listener(self, threshold: float, callback: Callable[[bool], None]) -> None:
+        """Call callback(above) whenever utilization crosses threshold, from the monitor thread.
+
+        Rising needs utilization >= threshold; falling needs it below
+        threshold - hysteresis, so load hovering at the threshold does not flap.
+        """
+        with self._lock:
+            self._threshold_listeners.append([threshold, callback, self._utilization >= threshold])
+
+    def _notify_threshold_listeners(self) -> None:
+        crossed = []
+        with self._lock:
+            for listener in self._threshold_listeners:
+                threshold, _, was_above = listener
+                if was_above:
+                    above = self._utilization >= threshold - self._hysteresis
+                else:
+                    above = self._utilization >= threshold
+                if above != was_above:
+                    listener[2] = above
+                    crossed.append((listener[1], above))
+        for callback, above in crossed:
+            try:
+                callback(above)
+            except Exception as e:
+                logger.error(f"Error in GPU threshold listener: {str(e)}")
 
     def _monitor_loop(self) -> None:
         """Main monitoring loop."""
         while self._running:
             try:
                 self._update_metrics()
+                self._notify_threshold_listeners()
                 self._broadcast_status()
             except Exception as e:
                 logger.error(f"Error updating GPU metrics: {str(e)}")
             time.sleep(self._poll_interval)
 
-    def _broadcast_status(self) -> None:
-        """Broadcast current GPU status via WebSocket."""
-        if self._websocket_service:
-            self._websocket_service.broadcast_gpu_status(
-                is_indexing=self._is_indexing,
-                gpu_utilization=self._utilization
-            )
+    def _memory_pct(self) -> float:
+        return self._memory_used / self._memory_total * 100 if self._memory_total else 0.0
 
-    def _update_metrics(self) -> None:
-        """Update GPU metrics."""
-        if not NVIDIA_AVAILABLE or self._device_count == 0:
+    def _broadcast_status(self, force: bool = False) -> None:
+        """Broadcast current GPU status via WebSocket when it has moved enough."""
+        if not self._websocket_service:
             return
 
-        try:
-            # We'll monitor the first GPU for now
-            handle = pynvml.nvmlDeviceGetHandleByIndex(0)
-            
-            # Get utilization
-            util = pynvml.nvmlDeviceGetUtilizationRates(handle)
-            gpu_util = float(util.gpu)
-            
-            # Get memory info
-            mem_info = pynvml.nvmlDeviceGetMemoryInfo(handle)
-            mem_used = mem_info.used
-            mem_total = mem_info.total
-            
-            # Update metrics thread-safely
+        now = time.monotonic()
+        with self._lock:
+            state = (self._is_indexing, self._utilization, self._memory_pct())
+            if not force:
+                since_last = now - self._last_broadcast
+                if since_last < self._min_broadcast_interval:
+                    return
+                previous = self._broadcast_state
+                moved = (previous is None
+                         or state[0] != previous[0]
+                         or abs(state[1] - previous[1]) >= self._hysteresis
+                         or abs(state[2] - previous[2]) >= self._hysteresis)
+                if not moved and since_last < self._heartbeat_interval:
+                    return
+            self._broadcast_state = state
+            self._last_broadcast = now
+            metrics = self._metrics_locked()
+
+        self._websocket_service.broadcast_gpu_status(
+            is_indexing=self._is_indexing,
+            gpu_utilization=metrics['utilization'],
+            metrics=metrics
+        )
+
+    def _update_metrics(self) -> None:
+        """Update GPU metrics for every device, or CPU metrics without NVML."""
+        if not self.gpu_available:
+            system = _cpu_metrics()
             with self._lock:
-                self._utilization = gpu_util
-                self._memory_used = mem_used
-                self._memory_total = mem_total
+                self._system = system
+                self._utilization = system['cpu_percent']
+                self._memory_used = system['memory_used']
+                self._memory_total = system['memory_total']
+            return
+
+        devices = []
+        for index in range(self._device_count):
+            try:
+                handle = pynvml.nvmlDeviceGetHandleByIndex(index)
+                name = pynvml.nvmlDeviceGetName(handle)
+                util = pynvml.nvmlDeviceGetUtilizationRates(handle)
+                mem_info = pynvml.nvmlDeviceGetMemoryInfo(handle)
+                devices.append({
+                    'index': index,
+                    'name': name.decode() if isinstance(name, bytes) else name,
+                    'utilization': float(util.gpu),
+                    'memory_used': mem_info.used,
+                    'memory_total': mem_info.total
+                })
+            except Exception as e:
+                logger.error(f"Error getting metrics for GPU {index}: {str(e)}")
+
+        if not devices:
+            return
+
+        # Update metrics thread-safely; scheduling follows the busiest device
+        with self._lock:
+            self._devices = devices
+            self._utilization = max(d['utilization'] for d in devices)
+            self._memory_used = sum(d['memory_used'] for d in devices)
+            self._memory_total = sum(d['memory_total'] for d in devices)
 
-        except Exception as e:
-            logger.error(f"Error getting GPU metrics: {str(e)}")
+    def _metrics_locked(self) -> Dict[str, Any]:
+        return {
+            'source': 'gpu' if self.gpu_available else 'cpu',
+            'utilization': self._utilization,
+            'memory_used_mb': self._memory_used / (1024 * 1024),
+            'memory_total_mb': self._memory_total / (1024 * 1024),
+            'memory_used_pct': self._memory_pct(),
+            'gpu_available': self.gpu_available,
+            'devices': [{
+                'index': d['index'],
+                'name': d['name'],
+                'utilization': d['utilization'],
+                'memory_used_mb': d['memory_used'] / (1024 * 1024),
+                'memory_total_mb': d['memory_total'] / (1024 * 1024)
+            } for d in self._devices],
+            'cpu_percent': self._system.get('cpu_percent'),
+            'process_rss_mb': self._system['process_rss'] / (1024 * 1024) if self._system else None
+        }
 
-    def get_metrics(self) -> Dict[str, float]:
-        """Get current GPU metrics."""
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get current metrics: totals over all GPUs, per-device values, or CPU fallback values."""
         with self._lock:
-            return {
-                'utilization': self._utilization,
-                'memory_used_mb': self._memory_used / (1024 * 1024),
-                'memory_total_mb': self._memory_total / (1024 * 1024),
-                'memory_used_pct': (self._memory_used / self._memory_total * 100) if self._memory_total else 0,
-                'gpu_available': NVIDIA_AVAILABLE and self._device_count > 0
-            }
+            return self._metrics_locked()
 
     def get_utilization(self) -> float:
-        """Get current GPU utilization percentage."""
+        """Get current utilization percentage: the busiest GPU, or CPU load without one."""
         with self._lock:
             return self._utilization
 
@@ -126,4 +266,4 @@ class GPUMonitor:
             try:
                 pynvml.nvmlShutdown()
             except:
-                pass 
\ No newline at end of file
+                pass
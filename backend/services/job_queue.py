@@ -0,0 +1,147 @@
+import logging
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Jobs in these states still have work left and are picked up oldest first
+UNFINISHED_STATUSES = ('pending', 'running', 'paused')
+
+class IndexingJobQueue:
+    """Durable indexing jobs in the indexing_jobs and indexing_job_items tables.
+
+    A job is a list of documents to index with one embedder, optionally
+    followed by a deep-embedding pass. Each document is an item carrying its
+    own checkpoint: the item is marked done when the document is fully
+    stored, and chunks_done records how far an unfinished document got, so a
+    paused or interrupted job resumes at the window where it stopped.
+    """
+
+    def __init__(self, db_path: str):
+        self._db_path = db_path
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def enqueue(self, doc_ids: List[str], embed_model: str, deep_model: Optional[str] = None) -> int:
+        """Create a pending job over doc_ids; returns its job_id."""
+        now = datetime.now()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                '''
+                INSERT INTO indexing_jobs (embed_model, deep_model, total_items, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ''',
+                (embed_model, deep_model, len(doc_ids), now, now)
+            )
+            job_id = cursor.lastrowid
+            conn.executemany(
+                'INSERT INTO indexing_job_items (job_id, doc_id, position) VALUES (?, ?, ?)',
+                [(job_id, doc_id, position) for position, doc_id in enumerate(doc_ids)]
+            )
+            conn.commit()
+        logger.info(f"Queued indexing job {job_id} with {len(doc_ids)} documents")
+        return job_id
+
+    def get_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """A job row with its item counts, or None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                '''
+                SELECT j.*,
+                       COUNT(CASE WHEN i.status = 'done' THEN 1 END) AS items_done,
+                       COUNT(CASE WHEN i.status = 'failed' THEN 1 END) AS items_failed
+                FROM indexing_jobs j
+                LEFT JOIN indexing_job_items i ON i.job_id = j.job_id
+                WHERE j.job_id = ?
+                GROUP BY j.job_id
+                ''',
+                (job_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def next_job(self) -> Optional[Dict[str, Any]]:
+        """The oldest job with work left, or None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                f'''
+                SELECT job_id FROM indexing_jobs
+                WHERE status IN ({','.join('?' * len(UNFINISHED_STATUSES))})
+                ORDER BY job_id
+                LIMIT 1
+                ''',
+                UNFINISHED_STATUSES
+            ).fetchone()
+        return self.get_job(row['job_id']) if row else None
+
+    def pending_items(self, job_id: int) -> List[Dict[str, Any]]:
+        """Unfinished items of a job in queue order, with their chunk checkpoints."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                '''
+                SELECT doc_id, chunks_done FROM indexing_job_items
+                WHERE job_id = ? AND status = 'pending'
+                ORDER BY position
+                ''',
+                (job_id,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def set_status(self, job_id: int, status: str, error: Optional[str] = None) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE indexing_jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?',
+                (status, error, datetime.now(), job_id)
+            )
+            conn.commit()
+
+    def checkpoint(self, job_id: int, doc_id: str, chunks_done: int, chunks_embedded: int) -> None:
+        """Record that the first chunks_done chunks of a document are stored."""
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE indexing_job_items SET chunks_done = ? WHERE job_id = ? AND doc_id = ?',
+                (chunks_done, job_id, doc_id)
+            )
+            self._add_chunks(conn, job_id, chunks_embedded)
+            conn.commit()
+
+    def add_chunks(self, job_id: int, chunks_embedded: int) -> None:
+        """Count chunks embedded outside any one document, by the deep pass."""
+        with self._connect() as conn:
+            self._add_chunks(conn, job_id, chunks_embedded)
+            conn.commit()
+
+    @staticmethod
+    def _add_chunks(conn: sqlite3.Connection, job_id: int, chunks_embedded: int) -> None:
+        conn.execute(
+            '''
+            UPDATE indexing_jobs
+            SET chunks_embedded = chunks_embedded + ?, updated_at = ?
+            WHERE job_id = ?
+            ''',
+            (chunks_embedded, datetime.now(), job_id)
+        )
+
+    def finish_item(self, job_id: int, doc_id: str, status: str = 'done', error: Optional[str] = None) -> None:
+        """Mark a document of a job done or failed."""
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE indexing_job_items SET status = ?, error = ? WHERE job_id = ? AND doc_id = ?',
+                (status, error, job_id, doc_id)
+            )
+            conn.commit()
+
+    def recover_interrupted(self) -> int:
+        """Mark jobs left running by a previous process as paused; returns how many."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE indexing_jobs SET status = 'paused', updated_at = ? WHERE status = 'running'",
+                (datetime.now(),)
+            )
+            conn.commit()
+        if cursor.rowcount:
+            logger.info(f"Recovered {cursor.rowcount} interrupted indexing jobs")
+        return cursor.rowcount
@@ -0,0 +1,153 @@
+import hashlib
+import logging
+import time
+from datetime import datetime
+from queue import Empty, Queue
+from threading import Event, Lock, Thread
+from typing import Dict, List, Optional, Set
+import numpy as np
+from .model_manager import EMBEDDER, ModelManager
+from .vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+def format_turn(user_text: str, ai_text: str) -> str:
+    return f"User: {user_text}\nAssistant: {ai_text}"
+
+class ConversationMemory:
+    """Long-term memory of finished conversation turns.
+
+    Each user/assistant exchange is queued when the turn ends and embedded
+    by a background thread, several turns per encode() call, into a memory
+    collection keyed by session. Prompt assembly then recalls the few past
+    turns most similar to the new message instead of sending the whole
+    history, so prompt length stays flat as conversations grow.
+    """
+
+    def __init__(self,
+                 model_manager: ModelManager,
+                 vector_store: VectorStore,
+                 embedder_name: str,
+                 batch_size: int = 32,
+                 flush_interval: float = 2.0):
+        self._model_manager = model_manager
+        self._vector_store = vector_store
+        self._embedder_name = embedder_name
+        self._batch_size = batch_size
+        # Longest a queued turn waits for more turns to fill its batch
+        self._flush_interval = flush_interval
+        self._pending: Queue = Queue()
+        self._stop_event = Event()
+        self._memory_thread: Optional[Thread] = None
+        # Deleted sessions; their turns still queued, in flight or finished later are dropped
+        self._forgotten: Set[str] = set()
+        self._index_lock = Lock()
+
+    def start(self) -> None:
+        """Start the memory indexing thread."""
+        if self._memory_thread:
+            return
+
+        self._stop_event.clear()
+        self._memory_thread = Thread(target=self._memory_loop, daemon=True)
+        self._memory_thread.start()
+        logger.info("Conversation memory indexer started")
+
+    def stop(self) -> None:
+        """Stop the memory indexing thread, embedding any turns still queued."""
+        self._stop_event.set()
+        if self._memory_thread:
+            self._memory_thread.join()
+            self._memory_thread = None
+        self.flush()
+        logger.info("Conversation memory indexer stopped")
+
+    def record_turn(self, chat_id: str, user_text: str, ai_text: str) -> None:
+        """Queue a finished turn for embedding; returns immediately."""
+        if chat_id in self._forgotten:
+            return
+        created_at = datetime.now().isoformat()
+        text = format_turn(user_text, ai_text)
+        digest = hashlib.sha256(f"{created_at}\n{text}".encode('utf-8')).hexdigest()[:16]
+        self._pending.put({
+            'chroma_id': f"{chat_id}:{digest}",
+            'text': text,
+            'metadata': {'session_id': chat_id, 'created_at': created_at}
+        })
+
+    def _take_batch(self, wait: float) -> List[Dict]:
+        batch = []
+        deadline = time.monotonic() + wait
+        while len(batch) < self._batch_size:
+            try:
+                batch.append(self._pending.get(timeout=max(0.0, deadline - time.monotonic())))
+            except Empty:
+                break
+        return batch
+
+    def _index_batch(self, batch: List[Dict]) -> None:
+        with self._index_lock:
+            batch = [turn for turn in batch if turn['metadata']['session_id'] not in self._forgotten]
+            if not batch:
+                return
+            with self._model_manager.use(EMBEDDER, self._embedder_name) as embedder:
+                embeddings = np.asarray(embedder.encode(
+                    [turn['text'] for turn in batch],
+                    batch_size=len(batch),
+                    convert_to_numpy=True,
+                    show_progress_bar=False
+                ), dtype=np.float32)
+            self._vector_store.upsert_chunks([
+                {**turn, 'embedding': embeddings[i]} for i, turn in enumerate(batch)
+            ])
+
+    def forget(self, chat_id: str) -> None:
+        """Delete a session's remembered turns, including ones not embedded yet."""
+        with self._index_lock:
+            self._forgotten.add(chat_id)
+            self._vector_store.delete_where({'session_id': chat_id})
+
+    def flush(self) -> int:
+        """Embed every queued turn now; returns how many were indexed."""
+        indexed = 0
+        while True:
+            batch = self._take_batch(0.0)
+            if not batch:
+                return indexed
+            self._index_batch(batch)
+            indexed += len(batch)
+
+    def _memory_loop(self) -> None:
+        """Main memory loop: embed queued turns in batches."""
+        while not self._stop_event.is_set():
+            batch = self._take_batch(self._flush_interval)
+            if not batch:
+                continue
+            try:
+                self._index_batch(batch)
+            except Exception as e:
+                logger.error(f"Error indexing {len(batch)} conversation turns: {str(e)}")
+
+    def recall(self,
+               chat_id: str,
+               query: str,
+               k: int = 3,
+               exclude: Optional[List[str]] = None
+               ) -> List[str]:
+        """Past turns of this chat most similar to query, oldest first.
+
+        Args:
+            chat_id: Session whose memory to search
+            query: The new user message
+            k: Number of turns to return
+            exclude: Turn texts already in the prompt (the recent tail)
+        """
+        exclude = set(exclude or [])
+        with self._model_manager.use(EMBEDDER, self._embedder_name) as embedder:
+            query_vector = np.asarray(embedder.encode(query), dtype=np.float32)
+        hits = self._vector_store.query(
+            query_vector, top_k=k + len(exclude), where={'session_id': chat_id}
+        )
+        turns = [hit for hit in hits if hit['text'] not in exclude][:k]
+        turns.sort(key=lambda hit: hit['metadata'].get('created_at', ''))
+        return [hit['text'] for hit in turns]
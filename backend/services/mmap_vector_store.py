@@ -0,0 +1,517 @@
+import json
+import logging
+import os
+import sqlite3
+from threading import RLock
+from typing import List, Dict, Any, Iterable, Optional, Tuple, Union
+import numpy as np
+from .vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+# Rows decoded to float32 per matrix product; bounds scan memory to ~SCAN_BLOCK * dim * 4 bytes
+SCAN_BLOCK = 16384
+INITIAL_CAPACITY = 1024
+# SQLite's default limit on bound parameters is 999
+_SQL_BATCH = 900
+
+class MmapVectorStore(VectorStore):
+    """In-process vector index over a memory-mapped matrix.
+
+    Vectors are L2-normalized and stored as float16, or as int8 with a
+    per-row scale, in a flat file mapped with np.memmap, so opening the
+    index reads no vectors and pages stay in the OS cache across restarts.
+    Ids, text and metadata live in a SQLite sidecar. Queries are exact,
+    blocked matrix products with argpartition top-k; after build_ivf()
+    they scan only the nprobe nearest k-means partitions instead.
+    """
+
+    def __init__(self,
+                 persist_directory: str = "./vector_index",
+                 dtype: str = "float16",
+                 nprobe: int = 8):
+        # The directory holds a single collection
+        super().__init__(os.path.abspath(persist_directory), '')
+        if dtype not in ('float16', 'int8'):
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        os.makedirs(persist_directory, exist_ok=True)
+        self._persist_directory = persist_directory
+        self._db_path = os.path.join(persist_directory, 'index.db')
+        self._vectors_path = os.path.join(persist_directory, 'vectors.bin')
+        self._scales_path = os.path.join(persist_directory, 'scales.bin')
+        self._centroids_path = os.path.join(persist_directory, 'ivf_centroids.npy')
+        self._nprobe = nprobe
+        self._lock = RLock()
+        self._init_db()
+
+        meta = self._read_meta()
+        # An existing index keeps the dtype it was built with
+        self._dtype = meta.get('dtype', dtype)
+        self._dim: Optional[int] = int(meta['dim']) if 'dim' in meta else None
+        self._size = int(meta.get('size', 0))  # High-water mark of allocated rows
+        self._capacity = 0
+        self._vectors: Optional[np.memmap] = None
+        self._scales: Optional[np.memmap] = None
+
+        self._ids: Dict[str, int] = {}
+        self._row_ids = np.empty(0, dtype=object)
+        self._live = np.zeros(0, dtype=bool)
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._centroids: Optional[np.ndarray] = None
+        self._load()
+        logger.info(
+            f"Opened mmap vector index at {persist_directory} "
+            f"({len(self._ids)} vectors, {self._dtype})"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self._db_path)
+
+    def _init_db(self) -> None:
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS vectors (
+                    row INTEGER PRIMARY KEY,
+                    chroma_id TEXT NOT NULL UNIQUE,
+                    text TEXT,
+                    metadata TEXT,
+                    ivf_list INTEGER
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS index_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            ''')
+
+    def _read_meta(self) -> Dict[str, str]:
+        with self._connect() as conn:
+            return dict(conn.execute('SELECT key, value FROM index_meta').fetchall())
+
+    @staticmethod
+    def _write_meta(conn: sqlite3.Connection, **values) -> None:
+        conn.executemany(
+            'INSERT OR REPLACE INTO index_meta (key, value) VALUES (?, ?)',
+            [(key, str(value)) for key, value in values.items()]
+        )
+
+    def _load(self) -> None:
+        """Rebuild the id map and live mask from the sidecar; vectors stay on disk."""
+        if self._dim is not None and self._size:
+            self._ensure_capacity(self._size)
+        with self._connect() as conn:
+            rows = conn.execute('SELECT row, chroma_id, ivf_list FROM vectors').fetchall()
+        for row, chroma_id, ivf_list in rows:
+            self._ids[chroma_id] = row
+            self._row_ids[row] = chroma_id
+            self._live[row] = True
+            self._assign[row] = -1 if ivf_list is None else ivf_list
+        self._free = sorted(set(range(self._size)) - set(self._ids.values()), reverse=True)
+
+        if os.path.exists(self._centroids_path):
+            self._centroids = np.load(self._centroids_path)
+
+    def _map(self, path: str, dtype, shape: Tuple[int, ...]) -> np.memmap:
+        """Map a file, growing it with zeros to fit shape."""
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        with open(path, 'ab') as f:
+            if f.tell() < nbytes:
+                f.truncate(nbytes)
+        return np.memmap(path, dtype=dtype, mode='r+', shape=shape)
+
+    def _ensure_capacity(self, rows: int) -> None:
+        if rows <= self._capacity:
+            return
+        capacity = max(rows, self._capacity * 2, INITIAL_CAPACITY)
+        if self._vectors is not None:
+            self._vectors.flush()
+        self._vectors = self._map(self._vectors_path, self._dtype, (capacity, self._dim))
+        if self._dtype == 'int8':
+            if self._scales is not None:
+                self._scales.flush()
+            self._scales = self._map(self._scales_path, np.float32, (capacity,))
+
+        grown = capacity - self._capacity
+        self._row_ids = np.concatenate([self._row_ids, np.full(grown, None, dtype=object)])
+        self._live = np.concatenate([self._live, np.zeros(grown, dtype=bool)])
+        self._assign = np.concatenate([self._assign, np.full(grown, -1, dtype=np.int32)])
+        self._capacity = capacity
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def _encode_rows(self, rows: np.ndarray, matrix: np.ndarray) -> None:
+        if self._dtype == 'int8':
+            scales = np.abs(matrix).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self._vectors[rows] = np.round(matrix / scales[:, np.newaxis]).astype(np.int8)
+            self._scales[rows] = scales
+        else:
+            self._vectors[rows] = matrix.astype(np.float16)
+
+    def _decode_rows(self, rows: Union[slice, np.ndarray]) -> np.ndarray:
+        block = np.asarray(self._vectors[rows], dtype=np.float32)
+        if self._dtype == 'int8':
+            block *= self._scales[rows][:, np.newaxis]
+        return block
+
+    def upsert_chunks(self, chunks: List[Dict[str, Any]]) -> None:
+        """
+        Upsert chunks into the vector store.
+
+        Args:
+            chunks: List of dicts with keys:
+                - chroma_id: str
+                - embedding: List[float] or 1-D np.ndarray
+                - text: str
+                - metadata: Dict (optional)
+        """
+        if not chunks:
+            return
+
+        matrix = self._normalize(np.asarray([c['embedding'] for c in chunks], dtype=np.float32))
+        with self._lock:
+            if self._dim is None:
+                self._dim = matrix.shape[1]
+            elif matrix.shape[1] != self._dim:
+                raise ValueError(f"Expected {self._dim}-dimensional embeddings, got {matrix.shape[1]}")
+
+            # Existing ids are overwritten in place; new ids reuse freed rows first
+            assigned: Dict[str, int] = {}
+            free = list(self._free)
+            size = self._size
+            for chunk in chunks:
+                chroma_id = chunk['chroma_id']
+                if chroma_id in assigned:
+                    continue
+                row = self._ids.get(chroma_id)
+                if row is None:
+                    if free:
+                        row = free.pop()
+                    else:
+                        row, size = size, size + 1
+                assigned[chroma_id] = row
+            rows = np.array([assigned[c['chroma_id']] for c in chunks], dtype=np.int64)
+
+            self._ensure_capacity(size)
+            self._encode_rows(rows, matrix)
+            assign = self._nearest_lists(matrix) if self._centroids is not None else None
+            self._vectors.flush()
+            if self._scales is not None:
+                self._scales.flush()
+
+            with self._connect() as conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO vectors (row, chroma_id, text, metadata, ivf_list) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    [(int(rows[i]), c['chroma_id'], c['text'], json.dumps(c.get('metadata') or {}),
+                      None if assign is None else int(assign[i])) for i, c in enumerate(chunks)]
+                )
+                self._write_meta(conn, dim=self._dim, dtype=self._dtype, size=size)
+
+            self._free = free
+            self._size = size
+            self._ids.update(assigned)
+            self._row_ids[rows] = [c['chroma_id'] for c in chunks]
+            self._live[rows] = True
+            if assign is not None:
+                self._assign[rows] = assign
+            self._bump_generation()
+        logger.info(f"Upserted {len(chunks)} chunks into mmap index")
+
+    def _filter_mask(self, where: Optional[Dict[str, Any]]) -> np.ndarray:
+        """Live rows, narrowed to those whose metadata equals every `where` value."""
+        mask = self._live[:self._size].copy()
+        if not where:
+            return mask
+
+        clauses, params = [], []
+        for key, value in where.items():
+            if isinstance(value, dict):
+                if set(value) != {'$eq'}:
+                    raise ValueError(f"Unsupported filter on '{key}': only equality is supported")
+                value = value['$eq']
+            if key.startswith('$'):
+                raise ValueError(f"Unsupported filter operator: {key}")
+            clauses.append('json_extract(metadata, ?) = ?')
+            params.extend([f'$.{key}', value])
+
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT row FROM vectors WHERE {' AND '.join(clauses)}", params
+            ).fetchall()
+        matched = np.zeros(self._size, dtype=bool)
+        if rows:
+            matched[np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))] = True
+        return mask & matched
+
+    @staticmethod
+    def _merge_top_k(best_scores: np.ndarray,
+                     best_rows: np.ndarray,
+                     scores: np.ndarray,
+                     rows: np.ndarray,
+                     k: int
+                     ) -> Tuple[np.ndarray, np.ndarray]:
+        """Keep the k highest scores per query across the running best and a new block."""
+        all_scores = np.concatenate([best_scores, scores], axis=1)
+        all_rows = np.concatenate([best_rows, np.broadcast_to(rows, scores.shape)], axis=1)
+        if all_scores.shape[1] > k:
+            keep = np.argpartition(-all_scores, k - 1, axis=1)[:, :k]
+            all_scores = np.take_along_axis(all_scores, keep, axis=1)
+            all_rows = np.take_along_axis(all_rows, keep, axis=1)
+        return all_scores, all_rows
+
+    def _search_exact(self, queries: np.ndarray, mask: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        n = len(queries)
+        best_scores = np.empty((n, 0), dtype=np.float32)
+        best_rows = np.empty((n, 0), dtype=np.int64)
+        for start in range(0, self._size, SCAN_BLOCK):
+            stop = min(start + SCAN_BLOCK, self._size)
+            local = np.flatnonzero(mask[start:stop])
+            if not len(local):
+                continue
+            if len(local) == stop - start:
+                block, rows = self._decode_rows(slice(start, stop)), np.arange(start, stop)
+            else:
+                rows = start + local
+                block = self._decode_rows(rows)
+            best_scores, best_rows = self._merge_top_k(
+                best_scores, best_rows, queries @ block.T, rows, k
+            )
+        return best_scores, best_rows
+
+    def _search_ivf(self, queries: np.ndarray, mask: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        nprobe = min(self._nprobe, len(self._centroids))
+        probes = np.argpartition(-(queries @ self._centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        assign = self._assign[:self._size]
+
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        for i, query in enumerate(queries):
+            rows = np.flatnonzero(mask & np.isin(assign, probes[i]))
+            if not len(rows):
+                continue
+            scores, found = self._merge_top_k(
+                np.empty((1, 0), dtype=np.float32), np.empty((1, 0), dtype=np.int64),
+                (self._decode_rows(rows) @ query)[np.newaxis, :], rows, k
+            )
+            best_scores[i, :scores.shape[1]] = scores[0]
+            best_rows[i, :found.shape[1]] = found[0]
+        return best_scores, best_rows
+
+    def _fetch_rows(self, rows: Iterable[int]) -> Dict[int, Tuple[str, Dict[str, Any]]]:
+        """row -> (text, metadata) for the given rows."""
+        rows = list(rows)
+        found = {}
+        with self._connect() as conn:
+            for start in range(0, len(rows), _SQL_BATCH):
+                batch = rows[start:start + _SQL_BATCH]
+                placeholders = ','.join('?' * len(batch))
+                for row, text, metadata in conn.execute(
+                    f'SELECT row, text, metadata FROM vectors WHERE row IN ({placeholders})', batch
+                ):
+                    found[row] = (text, json.loads(metadata) if metadata else {})
+        return found
+
+    def query_batch(self,
+                    embeddings: np.ndarray,
+                    top_k: int = 5,
+                    where: Optional[Dict[str, Any]] = None,
+                    as_arrays: bool = False
+                    ) -> Union[List[List[Dict[str, Any]]], Dict[str, np.ndarray]]:
+        """
+        Query the index with many embeddings in a single call.
+
+        Args:
+            embeddings: (N, D) array of query vectors
+            top_k: Number of results to return per query
+            where: Optional metadata equality filter applied to every query
+            as_arrays: Return column arrays instead of per-result dicts
+
+        Returns:
+            Same shapes as VectorStore.query_batch.
+        """
+        queries = np.asarray(embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[np.newaxis, :]
+        queries = self._normalize(queries)
+        n = len(queries)
+
+        scores = np.full((n, top_k), -np.inf, dtype=np.float32)
+        rows = np.full((n, top_k), -1, dtype=np.int64)
+        with self._lock:
+            if self._dim is not None and self._ids and top_k > 0:
+                if queries.shape[1] != self._dim:
+                    raise ValueError(f"Expected {self._dim}-dimensional queries, got {queries.shape[1]}")
+                mask = self._filter_mask(where)
+                search = self._search_ivf if self._centroids is not None else self._search_exact
+                found_scores, found_rows = search(queries, mask, top_k)
+                width = found_scores.shape[1]
+                scores[:, :width] = found_scores
+                rows[:, :width] = found_rows
+
+            # Best first; padding (-inf) sorts last
+            order = np.argsort(-scores, axis=1, kind='stable')
+            scores = np.take_along_axis(scores, order, axis=1)
+            rows = np.take_along_axis(rows, order, axis=1)
+            valid = rows >= 0
+            ids = np.full((n, top_k), None, dtype=object)
+            ids[valid] = self._row_ids[rows[valid]]
+            details = self._fetch_rows(np.unique(rows[valid]).tolist())
+
+        distances = np.where(valid, 1.0 - scores, np.inf).astype(np.float32)
+        texts = np.full((n, top_k), None, dtype=object)
+        metadatas = np.full((n, top_k), None, dtype=object)
+        for i, j in zip(*np.nonzero(valid)):
+            texts[i, j], metadatas[i, j] = details[rows[i, j]]
+
+        if as_arrays:
+            return {'ids': ids, 'distances': distances, 'texts': texts, 'metadatas': metadatas}
+
+        return [
+            [{
+                'chroma_id': ids[i, j],
+                'text': texts[i, j],
+                'metadata': metadatas[i, j],
+                'distance': float(distances[i, j])
+            } for j in range(top_k) if valid[i, j]]
+            for i in range(n)
+        ]
+
+    def get_embeddings(self, chunk_ids: List[str]) -> Dict[str, np.ndarray]:
+        """Stored (normalized, dequantized) vectors by id; unknown ids are omitted."""
+        with self._lock:
+            found = [chroma_id for chroma_id in chunk_ids if chroma_id in self._ids]
+            if not found:
+                return {}
+            vectors = self._decode_rows(np.array([self._ids[c] for c in found], dtype=np.int64))
+        return dict(zip(found, vectors))
+
+    def update_metadata(self, chunk_ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Update chunk metadata in place without touching embeddings."""
+        if not chunk_ids:
+            return
+        with self._lock:
+            with self._connect() as conn:
+                conn.executemany(
+                    'UPDATE vectors SET metadata = ? WHERE chroma_id = ?',
+                    [(json.dumps(metadata or {}), chroma_id)
+                     for chroma_id, metadata in zip(chunk_ids, metadatas)]
+                )
+            self._bump_generation()
+
+    def delete_chunks(self, chunk_ids: List[str]) -> None:
+        """Delete chunks; their rows are reused by later upserts."""
+        with self._lock:
+            rows = [self._ids.pop(chroma_id) for chroma_id in chunk_ids if chroma_id in self._ids]
+            if not rows:
+                return
+            with self._connect() as conn:
+                conn.executemany('DELETE FROM vectors WHERE row = ?', [(row,) for row in rows])
+            self._live[rows] = False
+            self._row_ids[rows] = None
+            self._free.extend(rows)
+            self._free.sort(reverse=True)
+            self._bump_generation()
+        logger.info(f"Deleted {len(rows)} chunks from mmap index")
+
+    def delete_where(self, where: Dict[str, Any]) -> None:
+        """Delete every chunk whose metadata matches the filter."""
+        with self._lock:
+            rows = np.flatnonzero(self._filter_mask(where))
+            self.delete_chunks([self._row_ids[row] for row in rows])
+
+    def _nearest_lists(self, matrix: np.ndarray) -> np.ndarray:
+        return np.argmax(matrix @ self._centroids.T, axis=1).astype(np.int32)
+
+    def build_ivf(self,
+                  n_lists: Optional[int] = None,
+                  iterations: int = 10,
+                  sample_size: int = 50000,
+                  seed: int = 0
+                  ) -> int:
+        """Partition vectors with spherical k-means so queries probe only nearby lists.
+
+        Args:
+            n_lists: Number of partitions; defaults to sqrt of the vector count
+            iterations: k-means iterations over the training sample
+            sample_size: Vectors sampled to train the centroids
+            seed: Random seed for sampling and initialization
+
+        Returns:
+            The number of partitions built (0 if the index is empty).
+        """
+        with self._lock:
+            live_rows = np.flatnonzero(self._live[:self._size])
+            if not len(live_rows):
+                return 0
+            n_lists = min(n_lists or max(1, int(np.sqrt(len(live_rows)))), len(live_rows))
+
+            rng = np.random.default_rng(seed)
+            sample_rows = np.sort(rng.choice(live_rows, min(sample_size, len(live_rows)), replace=False))
+            sample = self._normalize(self._decode_rows(sample_rows))
+            centroids = sample[rng.choice(len(sample), n_lists, replace=False)]
+            for _ in range(iterations):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sample)
+                counts = np.bincount(labels, minlength=n_lists)
+                # Empty partitions are re-seeded from random sample vectors
+                empty = counts == 0
+                sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+                centroids = self._normalize(sums)
+
+            self._centroids = centroids.astype(np.float32)
+            for start in range(0, len(live_rows), SCAN_BLOCK):
+                rows = live_rows[start:start + SCAN_BLOCK]
+                self._assign[rows] = self._nearest_lists(self._decode_rows(rows))
+
+            np.save(self._centroids_path, self._centroids)
+            with self._connect() as conn:
+                conn.executemany(
+                    'UPDATE vectors SET ivf_list = ? WHERE row = ?',
+                    [(int(self._assign[row]), int(row)) for row in live_rows]
+                )
+            self._bump_generation()
+        logger.info(f"Built IVF index with {n_lists} lists over {len(live_rows)} vectors")
+        return n_lists
+
+    def drop_ivf(self) -> None:
+        """Return to exact search."""
+        with self._lock:
+            self._centroids = None
+            self._assign[:] = -1
+            if os.path.exists(self._centroids_path):
+                os.remove(self._centroids_path)
+            with self._connect() as conn:
+                conn.execute('UPDATE vectors SET ivf_list = NULL')
+            self._bump_generation()
+
+    def get_collection_stats(self) -> Dict[str, Any]:
+        """Get statistics about the index."""
+        with self._lock:
+            index_bytes = self._capacity * (self._dim or 0) * np.dtype(self._dtype).itemsize
+            if self._scales is not None:
+                index_bytes += self._capacity * 4
+            return {
+                'total_chunks': len(self._ids),
+                'collection_name': 'document_chunks',
+                'persist_directory': self._persist_directory,
+                'dtype': self._dtype,
+                'dimension': self._dim,
+                'capacity': self._capacity,
+                'index_bytes': index_bytes,
+                'ivf_lists': 0 if self._centroids is None else len(self._centroids)
+            }
+
+    def close(self) -> None:
+        """Flush mapped files and release them; the store is unusable afterwards."""
+        with self._lock:
+            for array in (self._vectors, self._scales):
+                if array is not None:
+                    array.flush()
+            self._vectors = self._scales = None
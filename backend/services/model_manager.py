@@ -1,97 +1,245 @@
 import logging
-from typing import Optional, Dict, Any
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from threading import Lock
+from typing import Optional, Dict, Any, Callable, Iterator, Tuple
 from langchain.llms import Ollama
 from sentence_transformers import SentenceTransformer
+from .embedding_worker import RemoteEmbedder, parse_address
 
 logger = logging.getLogger(__name__)
 
+CHAT = 'chat'
+EMBEDDER = 'embedder'
+
+def estimate_model_bytes(model) -> int:
+    """Memory held by a model's weights in this process.
+
+    Counts torch parameters and buffers. Ollama models live in the Ollama
+    server and remote embedders in the embedding worker, so both count as 0.
+    """
+    total = 0
+    for attr in ('parameters', 'buffers'):
+        tensors = getattr(model, attr, None)
+        if callable(tensors):
+            try:
+                total += sum(t.numel() * t.element_size() for t in tensors())
+            except Exception:
+                pass
+    return total
+
+class _ResidentModel:
+    __slots__ = ('model', 'size_bytes', 'refs', 'pinned', 'last_used')
+
+    def __init__(self, model, size_bytes: int):
+        self.model = model
+        self.size_bytes = size_bytes
+        self.refs = 0
+        self.pinned = False
+        self.last_used = time.monotonic()
+
 class ModelManager:
-    def __init__(self):
-        self._current_chat_model: Optional[Ollama] = None
-        self._current_embedder: Optional[SentenceTransformer] = None
+    """Cache of loaded chat models and embedders, keyed by kind and name.
+
+    Models stay resident after use so switching between them is a dict
+    lookup. When their estimated memory exceeds memory_budget_bytes, the
+    least recently used models are unloaded, skipping pinned ones and ones
+    held through use(). Concurrent requests for a model that is still
+    loading wait for that one load instead of starting their own.
+    """
+
+    def __init__(self,
+                 embedding_worker_address: Optional[str] = None,
+                 embedding_worker_authkey: Optional[bytes] = None,
+                 memory_budget_bytes: Optional[int] = None):
+        if embedding_worker_address and not embedding_worker_authkey:
+            raise ValueError("EMBEDDING_WORKER_ADDRESS is set but EMBEDDING_WORKER_AUTHKEY is not")
+        # When set, embedders live in the node's shared embedding worker instead of this process
+        self._embedding_worker_address = embedding_worker_address
+        self._embedding_worker_authkey = embedding_worker_authkey
+        # None means no limit
+        self._memory_budget_bytes = memory_budget_bytes
+        self._models: Dict[Tuple[str, str], _ResidentModel] = {}
+        self._loading: Dict[Tuple[str, str], Future] = {}
+        # Sizes seen at earlier loads, used to make room before loading again
+        self._known_sizes: Dict[Tuple[str, str], int] = {}
+        self._lock = Lock()
         self._chat_model_name: Optional[str] = None
         self._embedder_name: Optional[str] = None
 
     @property
     def current_chat_model(self) -> Optional[Ollama]:
-        return self._current_chat_model
+        return self._resident_model(CHAT, self._chat_model_name)
 
     @property
     def current_embedder(self) -> Optional[SentenceTransformer]:
-        return self._current_embedder
-
-    def load_chat_model(self, name: str) -> Ollama:
-        """Load a chat model using Ollama."""
-        if self._current_chat_model and self._chat_model_name == name:
-            return self._current_chat_model
-
-        logger.info(f"Loading chat model: {name}")
+        return self._resident_model(EMBEDDER, self._embedder_name)
+
+    def _resident_model(self, kind: str, name: Optional[str]):
+        with self._lock:
+            entry = self._models.get((kind, name))
+            return entry.model if entry else None
+
+    def _get(self, kind: str, name: str, factory: Callable[[], Any]):
+        """Return a resident model, loading it once however many threads ask."""
+        key = (kind, name)
+        with self._lock:
+            entry = self._models.get(key)
+            if entry:
+                entry.last_used = time.monotonic()
+                return entry.model
+            future = self._loading.get(key)
+            owner = future is None
+            if owner:
+                future = self._loading[key] = Future()
+                self._evict(self._known_sizes.get(key, 0))
+
+        if not owner:
+            return future.result()
+
+        logger.info(f"Loading {kind}: {name}")
         try:
-            # Unload current model if different
-            if self._current_chat_model and self._chat_model_name != name:
-                self.unload_chat_model()
-
-            # Initialize new Ollama model
-            model = Ollama(model=name)
-            self._current_chat_model = model
-            self._chat_model_name = name
-            return model
-
+            model = factory()
         except Exception as e:
-            logger.error(f"Error loading chat model {name}: {str(e)}")
+            logger.error(f"Error loading {kind} {name}: {str(e)}")
+            with self._lock:
+                del self._loading[key]
+            future.set_exception(e)
             raise
 
-    def unload_chat_model(self) -> None:
-        """Unload the current chat model."""
-        if self._current_chat_model:
-            logger.info(f"Unloading chat model: {self._chat_model_name}")
-            # Ollama doesn't have explicit unload, but we can clear our reference
-            self._current_chat_model = None
-            self._chat_model_name = None
-
-    def load_embedder(self, name: str) -> SentenceTransformer:
-        """Load an embedding model."""
-        if self._current_embedder and self._embedder_name == name:
-            return self._current_embedder
-
-        logger.info(f"Loading embedder: {name}")
+        size_bytes = estimate_model_bytes(model)
+        with self._lock:
+            self._evict(size_bytes)
+            self._models[key] = _ResidentModel(model, size_bytes)
+            self._known_sizes[key] = size_bytes
+            del self._loading[key]
+        future.set_result(model)
+        return model
+
+    def _used_bytes(self) -> int:
+        return sum(entry.size_bytes for entry in self._models.values())
+
+    def _evict(self, incoming_bytes: int) -> None:
+        """Unload LRU models until incoming_bytes fits the budget; call with the lock held."""
+        if self._memory_budget_bytes is None:
+            return
+        candidates = sorted(
+            (item for item in self._models.items() if not item[1].pinned and not item[1].refs),
+            key=lambda item: item[1].last_used
+        )
+        for key, entry in candidates:
+            if self._used_bytes() + incoming_bytes <= self._memory_budget_bytes:
+                return
+            logger.info(f"Evicting {key[0]} {key[1]} ({entry.size_bytes / 2**20:.0f} MB)")
+            del self._models[key]
+        if self._used_bytes() + incoming_bytes > self._memory_budget_bytes:
+            logger.warning(
+                f"Resident models exceed the memory budget: "
+                f"{(self._used_bytes() + incoming_bytes) / 2**20:.0f} MB > "
+                f"{self._memory_budget_bytes / 2**20:.0f} MB"
+            )
+
+    @contextmanager
+    def use(self, kind: str, name: str) -> Iterator[Any]:
+        """Hold a model for the duration of a block so it cannot be evicted."""
+        load = self.load_chat_model if kind == CHAT else self.load_embedder
+        while True:
+            model = load(name)
+            with self._lock:
+                entry = self._models.get((kind, name))
+                # Evicted between loading and taking the reference; load it again
+                if entry is not None:
+                    entry.refs += 1
+                    break
         try:
-            # Unload current embedder if different
-            if self._current_embedder and self._embedder_name != name:
-                self.unload_embedder()
+            yield model
+        finally:
+            with self._lock:
+                entry.refs -= 1
+                entry.last_used = time.monotonic()
+
+    def pin(self, kind: str, name: str, pinned: bool = True) -> None:
+        """Keep a model resident regardless of the budget, loading it if needed."""
+        load = self.load_chat_model if kind == CHAT else self.load_embedder
+        load(name)
+        with self._lock:
+            entry = self._models.get((kind, name))
+            if entry:
+                entry.pinned = pinned
 
-            # Initialize new SentenceTransformer
-            model = SentenceTransformer(name)
-            self._current_embedder = model
-            self._embedder_name = name
-            return model
+    def load_chat_model(self, name: str) -> Ollama:
+        """Load a chat model using Ollama."""
+        model = self._get(CHAT, name, lambda: Ollama(model=name))
+        self._chat_model_name = name
+        return model
+
+    def unload_chat_model(self, name: Optional[str] = None) -> None:
+        """Unload a chat model, the most recently loaded one by default."""
+        self._unload(CHAT, name or self._chat_model_name)
+        if name is None or name == self._chat_model_name:
+            self._chat_model_name = None
 
-        except Exception as e:
-            logger.error(f"Error loading embedder {name}: {str(e)}")
-            raise
+    def _create_embedder(self, name: str):
+        if self._embedding_worker_address:
+            return RemoteEmbedder(
+                parse_address(self._embedding_worker_address),
+                name,
+                authkey=self._embedding_worker_authkey
+            )
+        # Initialize new SentenceTransformer
+        return SentenceTransformer(name)
 
-    def unload_embedder(self) -> None:
-        """Unload the current embedding model."""
-        if self._current_embedder:
-            logger.info(f"Unloading embedder: {self._embedder_name}")
-            # Clear reference to allow garbage collection
-            self._current_embedder = None
+    def load_embedder(self, name: str) -> SentenceTransformer:
+        """Load an embedding model."""
+        model = self._get(EMBEDDER, name, lambda: self._create_embedder(name))
+        self._embedder_name = name
+        return model
+
+    def unload_embedder(self, name: Optional[str] = None) -> None:
+        """Unload an embedding model, the most recently loaded one by default."""
+        self._unload(EMBEDDER, name or self._embedder_name)
+        if name is None or name == self._embedder_name:
             self._embedder_name = None
 
-    def swap_to_embedder(self, name: str) -> None:
-        """Unload chat model and load embedder."""
-        self.unload_chat_model()
-        self.load_embedder(name)
+    def _unload(self, kind: str, name: Optional[str]) -> None:
+        with self._lock:
+            entry = self._models.get((kind, name))
+            if entry is None:
+                return
+            if entry.refs:
+                logger.warning(f"Not unloading {kind} {name}: {entry.refs} users hold it")
+                return
+            logger.info(f"Unloading {kind}: {name}")
+            # Clear reference to allow garbage collection
+            del self._models[(kind, name)]
 
     def get_model_info(self) -> Dict[str, Any]:
-        """Get information about currently loaded models."""
+        """Get information about loaded models."""
+        with self._lock:
+            resident = [{
+                'kind': kind,
+                'name': name,
+                'size_mb': round(entry.size_bytes / 2**20, 1),
+                'refs': entry.refs,
+                'pinned': entry.pinned
+            } for (kind, name), entry in sorted(
+                self._models.items(), key=lambda item: item[1].last_used, reverse=True
+            )]
+            used_bytes = self._used_bytes()
+            chat_loaded = (CHAT, self._chat_model_name) in self._models
+            embedder_loaded = (EMBEDDER, self._embedder_name) in self._models
         return {
             'chat_model': {
                 'name': self._chat_model_name,
-                'loaded': self._current_chat_model is not None
+                'loaded': chat_loaded
             },
             'embedder': {
                 'name': self._embedder_name,
-                'loaded': self._current_embedder is not None
-            }
-        } 
\ No newline at end of file
+                'loaded': embedder_loaded
+            },
+            'resident': resident,
+            'memory_used_mb': round(used_bytes / 2**20, 1),
+            'memory_budget_mb': round(self._memory_budget_bytes / 2**20, 1)
+                                if self._memory_budget_bytes is not None else None
+        }
@@ -1,68 +1,341 @@
+import json
 import logging
-from typing import List, Dict, Any, Optional
-from .model_manager import ModelManager
-from .chroma_client import ChromaClient
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from .context_packer import ContextPacker, estimate_tokens
+from .model_manager import CHAT, EMBEDDER, ModelManager
+from .vector_store import VectorStore
+from .document_store import DocumentStore
 from ..models.session_config import SessionConfig
+from ..utils.fts import is_keyword_query
+from ..utils.lru_cache import LRUCache
 
 logger = logging.getLogger(__name__)
 
+# Phrases that mean the model has started concluding; thinking stops there
+CONCLUSION_MARKER = re.compile(r'\b(therefore|in conclusion|conclusion|finally)\b', re.IGNORECASE)
+_MARKER_OVERLAP = len('in conclusion')
+# End of the sentence a conclusion marker appears in
+SENTENCE_END = re.compile(r'[.!?](?=\s)')
+
 class RAGService:
-    def __init__(self, model_manager: ModelManager, chroma_client: ChromaClient):
+    def __init__(self,
+                 model_manager: ModelManager,
+                 chroma_client: VectorStore,
+                 query_cache_size: int = 1024,
+                 result_cache_size: int = 1024,
+                 document_store: Optional[DocumentStore] = None,
+                 rrf_k: int = 60,
+                 candidate_multiplier: int = 4,
+                 deep_store: Optional[VectorStore] = None,
+                 deadline_s: float = 30.0,
+                 scratchpad_tokens: int = 512,
+                 thought_tokens: int = 256,
+                 num_ctx: int = 2048,
+                 answer_tokens: int = 512,
+                 context_packer: Optional[ContextPacker] = None):
         self._model_manager = model_manager
         self._chroma_client = chroma_client
+        # Lexical (BM25) candidates come from the chunk table; vector-only without it
+        self._document_store = document_store
+        self._rrf_k = rrf_k
+        self._candidate_multiplier = candidate_multiplier
+        # Precomputed deep-embedder vectors; when set, candidates are re-ranked with them
+        self._deep_store = deep_store
+        # Wall-clock budget per response; past it, thinking stops and the model answers directly
+        self._deadline_s = deadline_s
+        # Tokens of earlier thoughts carried into each chain-of-thought prompt
+        self._scratchpad_tokens = scratchpad_tokens
+        # Cap on the length of each streamed thought
+        self._thought_tokens = thought_tokens
+        # Context window the prompt must fit, less the room left for the answer
+        self._num_ctx = num_ctx
+        self._answer_tokens = answer_tokens
+        self._context_packer = context_packer or ContextPacker()
+        # Runs retrieval alongside chat-model loading
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='rag')
+        # (embedder, normalized query) -> query vector
+        self._query_cache = LRUCache(query_cache_size)
+        # (query vector, top_k, filter, collection generation) -> retrieved chunks
+        self._result_cache = LRUCache(result_cache_size)
+
+    @staticmethod
+    def _stream_thought(chat_model,
+                        prompt: str,
+                        max_tokens: int,
+                        deadline: float
+                        ) -> Tuple[str, bool]:
+        """Stream one thought, stopping after the sentence with a conclusion marker,
+        at max_tokens or at the deadline.
+
+        Returns the thought text and whether a conclusion marker was reached.
+        """
+        text = ''
+        marker_end = None
+        stream = chat_model.stream(prompt)
+        try:
+            for piece in stream:
+                scanned = len(text)
+                text += piece
+                if marker_end is None:
+                    # Re-scan a little of the previous text so markers split across pieces are found
+                    match = CONCLUSION_MARKER.search(text, max(0, scanned - _MARKER_OVERLAP))
+                    if match:
+                        marker_end = match.end()
+                if marker_end is not None:
+                    end = SENTENCE_END.search(text, max(marker_end, scanned - 1))
+                    if end:
+                        return text[:end.end()], True
+                if estimate_tokens(text) >= max_tokens or time.monotonic() >= deadline:
+                    break
+        finally:
+            RAGService._close_stream(stream)
+        return text, marker_end is not None
+
+    @staticmethod
+    def _close_stream(stream) -> None:
+        # Closing the generator drops the connection, so the model stops generating
+        close = getattr(stream, 'close', None)
+        if close:
+            close()
+
+    def _bounded_answer(self, chat_model, prompt: str) -> str:
+        """Answer without thinking, stopping after answer_tokens; used once the deadline has passed."""
+        text = ''
+        stream = chat_model.stream(prompt)
+        try:
+            for piece in stream:
+                text += piece
+                if estimate_tokens(text) >= self._answer_tokens:
+                    break
+        finally:
+            self._close_stream(stream)
+        return text
 
-    def _run_chain_of_thought(self, 
-                            prompt: str, 
+    def _scratchpad(self, thoughts: List[str]) -> str:
+        """Most recent thoughts that fit within the scratchpad token budget."""
+        kept = []
+        total_tokens = 0
+        for thought in reversed(thoughts):
+            tokens = estimate_tokens(thought)
+            if kept and total_tokens + tokens > self._scratchpad_tokens:
+                break
+            kept.insert(0, thought)
+            total_tokens += tokens
+        return '\n'.join(kept)
+
+    def _run_chain_of_thought(self,
+                            prompt: str,
                             model_name: str,
-                            max_iterations: int = 3
+                            max_iterations: int = 3,
+                            deadline: Optional[float] = None,
+                            chat_model = None
                             ) -> str:
-        """Run chain-of-thought reasoning iterations."""
-        chat_model = self._model_manager.load_chat_model(model_name)
-        
+        """Run streamed chain-of-thought iterations, then answer.
+
+        Each thought streams and ends as soon as the model starts concluding.
+        Later iterations see only the scratchpad (the most recent thoughts
+        within the token budget). If the deadline passes before any thought
+        completes, or passes while thinking, the model answers the prompt
+        directly with an answer capped at answer_tokens.
+        """
+        if chat_model is None:
+            with self._model_manager.use(CHAT, model_name) as chat_model:
+                return self._run_chain_of_thought(
+                    prompt, model_name, max_iterations, deadline, chat_model
+                )
+        deadline = deadline or time.monotonic() + self._deadline_s
+
         # Initial CoT prompt
         cot_prompt = "Let me think about this step by step:\n\n" + prompt
-        
+
         thoughts = []
         for i in range(max_iterations):
-            # Get next thought
-            response = chat_model(cot_prompt)
-            thoughts.append(response)
-            
+            if time.monotonic() >= deadline:
+                break
+            thought, concluded = self._stream_thought(
+                chat_model, cot_prompt, self._thought_tokens, deadline
+            )
+            if thought.strip():
+                thoughts.append(thought)
+
             # Check if we've reached a conclusion
-            if any(word in response.lower() for word in ['therefore', 'conclusion', 'finally']):
+            if concluded:
                 break
-                
+
             # Prepare next iteration
-            cot_prompt = f"Based on these thoughts:\n{' '.join(thoughts)}\n\nLet me continue thinking:"
-        
+            cot_prompt = f"{prompt}\n\nBased on these thoughts:\n{self._scratchpad(thoughts)}\n\nLet me continue thinking:"
+
+        if not thoughts or time.monotonic() >= deadline:
+            logger.info("Thinking deadline reached; answering directly")
+            return self._bounded_answer(chat_model, prompt)
+
         # Generate final response incorporating thoughts
-        final_prompt = f"""Based on this chain of reasoning:
-{' '.join(thoughts)}
+        final_prompt = f"""{prompt}
+
+Based on this chain of reasoning:
+{self._scratchpad(thoughts)}
 
 Please provide a clear and concise final response."""
-        
+
         return chat_model(final_prompt)
 
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        # Whitespace only; cased embedders give different vectors for different case
+        return ' '.join(query.split())
+
+    def _embed_query(self, embedder_name: str, query: str) -> np.ndarray:
+        """Encode a query, reusing the vector for repeated or re-spaced queries."""
+        key = (embedder_name, self._normalize_query(query))
+        vector = self._query_cache.get(key)
+        if vector is None:
+            with self._model_manager.use(EMBEDDER, embedder_name) as embedder:
+                vector = np.asarray(embedder.encode(query), dtype=np.float32)
+            vector.flags.writeable = False  # Shared between callers
+            self._query_cache.put(key, vector)
+        return vector
+
+    def _vector_candidates(self,
+                           query: str,
+                           config: SessionConfig,
+                           top_k: int,
+                           where: Optional[Dict[str, Any]] = None
+                           ) -> List[Dict[str, Any]]:
+        """Nearest chunks by light-embedder similarity, cached per collection generation.
+
+        Not cached when the store is shared with other processes, since their
+        writes never change this process's generation.
+        """
+        query_embedding = self._embed_query(config.embed_light, query)
+        if self._chroma_client.shared:
+            return self._chroma_client.query(embedding=query_embedding, top_k=top_k, where=where)
+
+        key = (
+            query_embedding.tobytes(),
+            top_k,
+            json.dumps(where, sort_keys=True) if where else None,
+            self._chroma_client.generation
+        )
+        results = self._result_cache.get(key)
+        if results is None:
+            results = self._chroma_client.query(
+                embedding=query_embedding,
+                top_k=top_k,
+                where=where
+            )
+            self._result_cache.put(key, results)
+        return list(results)
+
+    def _fuse(self, *rankings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Reciprocal rank fusion: score each chunk by sum of 1 / (rrf_k + rank)."""
+        scores: Dict[str, float] = {}
+        chunks: Dict[str, Dict[str, Any]] = {}
+        for ranking in rankings:
+            for rank, chunk in enumerate(ranking, start=1):
+                chroma_id = chunk['chroma_id']
+                scores[chroma_id] = scores.get(chroma_id, 0.0) + 1.0 / (self._rrf_k + rank)
+                # Keep the first copy seen, merging in scores from the other list
+                chunks[chroma_id] = {**chunk, **chunks.get(chroma_id, {})}
+
+        fused = sorted(scores, key=scores.get, reverse=True)
+        return [{**chunks[chroma_id], 'rrf_score': scores[chroma_id]} for chroma_id in fused]
+
+    def _rerank(self,
+                query: str,
+                config: SessionConfig,
+                candidates: List[Dict[str, Any]]
+                ) -> List[Dict[str, Any]]:
+        """Re-order candidates by cosine distance between deep-embedder vectors.
+
+        Chunk vectors come precomputed from the deep store, so only the query
+        is encoded (once, then cached). Only vectors made by the session's
+        deep embedder are compared; candidates the idle indexer has not
+        deep-embedded with it yet follow in their first-stage order.
+        """
+        deep_models = self._document_store.get_deep_models([c['chroma_id'] for c in candidates])
+        deep_vectors = self._deep_store.get_embeddings([
+            chroma_id for chroma_id, model in deep_models.items() if model == config.embed_deep
+        ])
+        if not deep_vectors:
+            return candidates
+
+        query_vector = self._embed_query(config.embed_deep, query)
+        query_vector = query_vector / (np.linalg.norm(query_vector) or 1.0)
+        scored = [c for c in candidates if c['chroma_id'] in deep_vectors]
+        matrix = np.stack([deep_vectors[c['chroma_id']] for c in scored])
+        norms = np.linalg.norm(matrix, axis=1)
+        norms[norms == 0] = 1.0
+        distances = 1.0 - (matrix @ query_vector) / norms
+
+        reranked = [
+            {**scored[i], 'deep_distance': float(distances[i])}
+            for i in np.argsort(distances, kind='stable')
+        ]
+        return reranked + [c for c in candidates if c['chroma_id'] not in deep_vectors]
+
     def _retrieve_relevant_chunks(self,
                                 query: str,
-                                config: SessionConfig
+                                config: SessionConfig,
+                                where: Optional[Dict[str, Any]] = None,
+                                limit: Optional[int] = None
                                 ) -> List[Dict[str, Any]]:
-        """Retrieve relevant chunks using the light embedder."""
-        # Load light embedder and generate query embedding
-        embedder = self._model_manager.load_embedder(config.embed_light)
-        query_embedding = embedder.encode(query).tolist()
-        
-        # Query Chroma
-        return self._chroma_client.query(
-            embedding=query_embedding,
-            top_k=config.top_k
-        )
+        """Retrieve relevant chunks in two stages.
+
+        Stage one fuses BM25 and light-embedder rankings into a wide candidate
+        set; stage two re-ranks it with deep-embedder vectors when a deep store
+        and a document store are configured. Keyword-heavy queries (ids, error codes, quoted phrases)
+        with enough lexical hits are answered from the FTS index alone,
+        without embedding the query. Returns up to `limit` chunks (top_k by
+        default), best first.
+        """
+        limit = limit or config.top_k
+        # The document store records which model made each deep vector
+        rerank = (self._deep_store is not None and self._document_store is not None
+                  and bool(config.embed_deep))
+        if self._document_store is None and not rerank:
+            return self._vector_candidates(query, config, limit, where)
+
+        candidates = max(config.top_k * self._candidate_multiplier, limit)
+        lexical = []
+        if self._document_store is not None:
+            lexical = self._document_store.search_chunks(query, limit=candidates, where=where)
+            if len(lexical) >= limit and is_keyword_query(query):
+                return lexical[:limit]
+
+        results = self._vector_candidates(query, config, candidates, where)
+        if lexical:
+            results = self._fuse(lexical, results)
+        if rerank:
+            results = self._rerank(query, config, results)
+        return results[:limit]
 
     def _build_rag_prompt(self,
                          query: str,
-                         chunks: List[Dict[str, Any]]
+                         chunks: List[Dict[str, Any]],
+                         budget_tokens: Optional[int] = None,
+                         max_chunks: Optional[int] = None
                          ) -> str:
-        """Build RAG prompt with retrieved context."""
+        """Build RAG prompt with retrieved context.
+
+        With a token budget, the context is packed first: near-duplicate
+        chunks are dropped, the rest diversified and trimmed to fit.
+        """
+        if budget_tokens is not None:
+            try:
+                vectors = self._chroma_client.get_embeddings([c['chroma_id'] for c in chunks])
+            except Exception as e:
+                logger.warning(f"Packing context without embeddings: {str(e)}")
+                vectors = {}
+            chunks = self._context_packer.pack(
+                chunks, budget_tokens, vectors, max_chunks,
+                # "Context N:" header and blank-line separator
+                chunk_overhead_tokens=estimate_tokens(f"\n\nContext {len(chunks)}:\n") + 1
+            )
+
         context_str = "\n\n".join([
             f"Context {i+1}:\n{chunk['text']}"
             for i, chunk in enumerate(chunks)
@@ -76,32 +349,68 @@ Here is some relevant context to help you:
 
 Based on this context and your knowledge, please provide a detailed answer."""
 
+    def _context_budget(self, query: str, thinking_mode: str) -> int:
+        """Tokens left for context once the template, question and answer are accounted for."""
+        budget = self._num_ctx - self._answer_tokens - estimate_tokens(self._build_rag_prompt(query, []))
+        if thinking_mode == "hybrid":
+            # Chain-of-thought prompts carry the scratchpad alongside the context
+            budget -= self._scratchpad_tokens
+        return max(0, budget)
+
     def generate_response(self,
                          session_id: str,
                          user_message: str,
                          config: SessionConfig
                          ) -> str:
-        """Generate response using specified thinking mode."""
+        """Generate response using specified thinking mode.
+
+        Retrieval runs concurrently with loading the chat model. If retrieval
+        misses the response deadline the model answers without context; if
+        the model itself is not loaded by then, TimeoutError is raised.
+        """
+        deadline = time.monotonic() + self._deadline_s
         try:
             if config.thinking_mode == "cot":
                 # Pure chain-of-thought
-                return self._run_chain_of_thought(user_message, config.model_name)
-                
-            elif config.thinking_mode == "rag":
-                # Pure retrieval-augmented
-                chunks = self._retrieve_relevant_chunks(user_message, config)
-                prompt = self._build_rag_prompt(user_message, chunks)
-                chat_model = self._model_manager.load_chat_model(config.model_name)
-                return chat_model(prompt)
-                
-            else:  # hybrid
-                # First retrieve context
-                chunks = self._retrieve_relevant_chunks(user_message, config)
-                prompt = self._build_rag_prompt(user_message, chunks)
-                
-                # Then run chain-of-thought with context
-                return self._run_chain_of_thought(prompt, config.model_name)
-                
+                return self._run_chain_of_thought(user_message, config.model_name, deadline=deadline)
+
+            # Retrieve a wider pool so the packer has alternatives to near-duplicates
+            retrieval = self._executor.submit(
+                self._retrieve_relevant_chunks, user_message, config, None, config.top_k * 2
+            )
+            warm_up = self._executor.submit(self._model_manager.load_chat_model, config.model_name)
+            try:
+                warm_up.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeout:
+                # The load keeps going and leaves the model resident for the next request
+                retrieval.cancel()
+                raise TimeoutError(
+                    f"Chat model {config.model_name} did not load within {self._deadline_s}s"
+                )
+            # Resident now; holding it keeps it from being evicted mid-answer
+            with self._model_manager.use(CHAT, config.model_name) as chat_model:
+                try:
+                    chunks = retrieval.result(timeout=max(0.0, deadline - time.monotonic()))
+                except FutureTimeout:
+                    # Drop it if still queued; a running retrieval finishes and is ignored
+                    retrieval.cancel()
+                    logger.warning("Retrieval missed the response deadline; answering without context")
+                    return self._bounded_answer(chat_model, user_message)
+                prompt = self._build_rag_prompt(
+                    user_message, chunks,
+                    budget_tokens=self._context_budget(user_message, config.thinking_mode),
+                    max_chunks=config.top_k
+                )
+
+                if config.thinking_mode == "rag":
+                    # Pure retrieval-augmented
+                    return chat_model(prompt)
+
+                # Hybrid: chain-of-thought with context
+                return self._run_chain_of_thought(
+                    prompt, config.model_name, deadline=deadline, chat_model=chat_model
+                )
+
         except Exception as e:
             logger.error(f"Error generating response: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
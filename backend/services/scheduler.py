@@ -1,29 +1,132 @@
 import logging
 import time
+from contextlib import contextmanager
 from datetime import datetime
-from threading import Thread, Event, Lock
-from typing import Optional, Dict, Any
+from threading import Condition, Thread, Event, Lock
+from typing import Optional, Dict, Any, Callable, Iterator, List
+from .document_store import DocumentStore
 from .gpu_monitor import GPUMonitor
+from .job_queue import IndexingJobQueue
 from .model_manager import ModelManager
-from ..models.session_config import SessionConfig
+from .session_config_store import SessionConfigStore, default_session_config
+from ..tasks.indexing_task import IndexingTask
 
 logger = logging.getLogger(__name__)
 
+class _JobProgress:
+    """Progress, throughput and ETA of one run of an indexing job."""
+
+    def __init__(self, job: Dict[str, Any]):
+        self.job_id = job['job_id']
+        self.status = 'running'
+        self.phase = 'documents'
+        self.documents_total = job['total_items']
+        self.documents_done = job['items_done'] + job['items_failed']
+        self.chunks_embedded = job['chunks_embedded']
+        self.current_doc: Optional[str] = None
+        self.deep_remaining: Optional[int] = None
+        # Documents indexed (or found unchanged) in this run, not counting failures
+        self.documents_indexed = 0
+        self._documents_at_start = self.documents_done
+        self._chunks_this_run = 0
+        self._started = time.monotonic()
+
+    def add_chunks(self, count: int) -> None:
+        self.chunks_embedded += count
+        self._chunks_this_run += count
+        if self.deep_remaining is not None:
+            self.deep_remaining = max(0, self.deep_remaining - count)
+
+    @property
+    def chunks_this_run(self) -> int:
+        return self._chunks_this_run
+
+    @property
+    def made_progress(self) -> bool:
+        return self.documents_indexed > 0 or self._chunks_this_run > 0
+
+    def payload(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self._started
+        chunks_per_s = self._chunks_this_run / elapsed if elapsed > 0 else 0.0
+        eta_s = None
+        if self.phase == 'documents':
+            # Documents vary in size, so extrapolate from the ones finished in this run
+            documents_this_run = self.documents_done - self._documents_at_start
+            if documents_this_run:
+                eta_s = elapsed / documents_this_run * (self.documents_total - self.documents_done)
+        elif chunks_per_s:
+            eta_s = self.deep_remaining / chunks_per_s
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'phase': self.phase,
+            'current_doc': self.current_doc,
+            'documents_done': self.documents_done,
+            'documents_total': self.documents_total,
+            'chunks_embedded': self.chunks_embedded,
+            'chunks_per_s': round(chunks_per_s, 2),
+            'eta_s': round(eta_s, 1) if eta_s is not None else None
+        }
+
 class Scheduler:
     def __init__(self,
                  gpu_monitor: GPUMonitor,
                  model_manager: ModelManager,
-                 poll_interval: float = 30.0,
-                 gpu_threshold: float = 10.0):
+                 retry_interval: float = 30.0,
+                 gpu_threshold: float = 10.0,
+                 config_store: Optional[SessionConfigStore] = None,
+                 job_queue: Optional[IndexingJobQueue] = None,
+                 indexing_task: Optional[IndexingTask] = None,
+                 document_store: Optional[DocumentStore] = None,
+                 websocket_service=None,
+                 progress_interval: float = 1.0,
+                 resume_delay_s: float = 2.0,
+                 max_pause_s: float = 120.0,
+                 on_resume: Optional[Callable[[], None]] = None,
+                 warm_after_s: float = 5.0):
         self._gpu_monitor = gpu_monitor
         self._model_manager = model_manager
-        self._poll_interval = poll_interval
+        self._job_queue = job_queue
+        self._indexing_task = indexing_task
+        self._document_store = document_store
+        self._websocket_service = websocket_service
+        # Minimum seconds between progress broadcasts
+        self._progress_interval = progress_interval
+        self._progress: Optional[_JobProgress] = None
+        self._last_progress_broadcast = 0.0
+        self._run_requested = False
+        # Interactive requests in flight; indexing parks while any are running
+        self._interactive = 0
+        self._interactive_ended = 0.0
+        # Quiet time after the last interactive request before parked indexing resumes
+        self._resume_delay_s = resume_delay_s
+        # A job parked longer than this gives up and waits for the next idle window
+        self._max_pause_s = max_pause_s
+        # Warms the chat model when the user is likely back: first activity after
+        # an idle window or indexing, and when an indexing run that held the GPU ends
+        self._on_resume = on_resume
+        # Only runs that embedded for at least this long count as having displaced the chat model
+        self._warm_after_s = warm_after_s
+        self._indexed_since_activity = False
+        # Built once; the scheduler is not tied to a session and only needs the defaults
+        self._config = config_store.default_config if config_store else default_session_config()
+        # Back-off after an error or a run that made no progress
+        self._retry_interval = retry_interval
+        # Monotonic time before which no new run starts, unless one is requested
+        self._backoff_until = 0.0
         self._gpu_threshold = gpu_threshold
         
         self._last_activity = datetime.now()
         self._is_indexing = False
         self._cancel_event = Event()
         self._lock = Lock()
+        # Signalled by the events that can make indexing possible
+        self._wakeup = Condition(self._lock)
+        # Unknown until the first check, then cleared when no job is left
+        self._work_pending = True
+        self._can_index = None not in (job_queue, indexing_task, document_store)
+        self._gpu_busy = gpu_monitor.get_utilization() >= gpu_threshold
+        gpu_monitor.add_threshold_listener(gpu_threshold, self._on_gpu_threshold)
         self._scheduler_thread: Optional[Thread] = None
         self._running = False
 
@@ -31,7 +134,10 @@ class Scheduler:
         """Start the scheduler thread."""
         if self._running:
             return
-            
+
+        if self._job_queue:
+            # Jobs a previous process left running resume from their checkpoints
+            self._job_queue.recover_interrupted()
         self._running = True
         self._scheduler_thread = Thread(target=self._scheduler_loop, daemon=True)
         self._scheduler_thread.start()
@@ -39,7 +145,11 @@ class Scheduler:
 
     def stop(self) -> None:
         """Stop the scheduler thread."""
-        self._running = False
+        # A running job pauses at its next batch boundary and resumes on the next start
+        self._cancel_event.set()
+        with self._wakeup:
+            self._running = False
+            self._wakeup.notify_all()
         if self._scheduler_thread:
             self._scheduler_thread.join()
             self._scheduler_thread = None
@@ -48,70 +158,302 @@ class Scheduler:
     def record_activity(self) -> None:
         """Record user activity to reset idle timer."""
         with self._lock:
-            self._last_activity = datetime.now()
+            # Activity only moves the idle deadline later, so the sleeping loop
+            # is not woken: it re-arms its timer when the old deadline passes
+            resuming = self._touch()
+        if resuming:
+            self._resume()
+
+    def _touch(self) -> bool:
+        """Record activity with the lock held; True if it ends an idle window or follows indexing."""
+        now = datetime.now()
+        resuming = (self._indexed_since_activity
+                    or (now - self._last_activity).total_seconds() >= self._config.idle_threshold_s)
+        self._last_activity = now
+        self._indexed_since_activity = False
+        return resuming
+
+    def _resume(self) -> None:
+        if self._on_resume:
+            try:
+                self._on_resume()
+            except Exception as e:
+                logger.error(f"Error resuming chat model: {str(e)}")
+
+    @contextmanager
+    def interactive(self) -> Iterator[None]:
+        """Mark an interactive request; running indexing yields to it.
+
+        Never blocks the caller. The indexer notices at its next batch
+        boundary, parks without unloading any model, and continues in place
+        once no interactive request has run for resume_delay_s.
+        """
+        with self._wakeup:
+            self._interactive += 1
+            resuming = self._touch()
+        if resuming:
+            # Overlaps the chat model load with whatever the request does first
+            self._resume()
+        try:
+            yield
+        finally:
+            with self._wakeup:
+                self._interactive -= 1
+                self._last_activity = datetime.now()
+                self._interactive_ended = time.monotonic()
+                self._wakeup.notify_all()
+
+    def _yield_to_interactive(self) -> bool:
+        """cancel_check for IndexingTask: park while interactive work runs; True stops the job."""
+        if self._cancel_event.is_set():
+            return True
+        if not self._interactive:
+            return False
+
+        parked = time.monotonic()
+        logger.info("Indexing parked for an interactive request")
+        self._gpu_monitor.set_indexing_status(False)
+        self._report_progress('preempted', force=True)
+        with self._wakeup:
+            while True:
+                if self._cancel_event.is_set():
+                    return True
+                now = time.monotonic()
+                if now - parked >= self._max_pause_s:
+                    logger.info(f"Indexing parked over {self._max_pause_s}s; pausing the job until idle")
+                    return True
+                quiet = now - self._interactive_ended
+                if not self._interactive and quiet >= self._resume_delay_s:
+                    break
+                timeout = self._max_pause_s - (now - parked)
+                if not self._interactive:
+                    timeout = min(timeout, self._resume_delay_s - quiet)
+                self._wakeup.wait(timeout)
+
+        logger.info(f"Indexing resumed after {time.monotonic() - parked:.1f}s")
+        self._gpu_monitor.set_indexing_status(True)
+        self._report_progress('running', force=True)
+        return False
+
+    def notify_documents_changed(self) -> None:
+        """Wake the scheduler because documents were added or need re-indexing."""
+        with self._wakeup:
+            self._work_pending = True
+            self._wakeup.notify()
+
+    def _on_gpu_threshold(self, above: bool) -> None:
+        """GPUMonitor callback for utilization crossing gpu_threshold."""
+        with self._wakeup:
+            self._gpu_busy = above
+            self._wakeup.notify()
+
+    def _idle_seconds_left(self) -> float:
+        if self._run_requested:
+            return 0.0
+        idle_seconds = (datetime.now() - self._last_activity).total_seconds()
+        return max(0.0, self._config.idle_threshold_s - idle_seconds)
+
+    def _should_index(self) -> bool:
+        """Whether indexing may start now; call with the lock held."""
+        return (not self._is_indexing
+                and not self._interactive
+                and self._can_index
+                and self._work_pending
+                and not self._gpu_busy
+                and self._idle_seconds_left() == 0.0
+                and time.monotonic() >= self._backoff_until)
+
+    def _sleep_timeout(self) -> Optional[float]:
+        """Seconds until the idle deadline, or None when only an event can help."""
+        # interactive() notifies when the last request ends, so there is no deadline to wake for
+        if self._interactive or self._gpu_busy or not (self._can_index and self._work_pending):
+            return None
+        return max(self._idle_seconds_left(), self._backoff_until - time.monotonic())
 
     def _scheduler_loop(self) -> None:
-        """Main scheduler loop checking for idle conditions."""
-        while self._running:
+        """Main scheduler loop: sleep until an event or the idle deadline, then index."""
+        while True:
+            with self._wakeup:
+                while self._running and not self._should_index():
+                    self._wakeup.wait(self._sleep_timeout())
+                if not self._running:
+                    return
             try:
                 self._check_conditions()
             except Exception as e:
                 logger.error(f"Error in scheduler loop: {str(e)}")
-            time.sleep(self._poll_interval)
+                with self._wakeup:
+                    self._wakeup.wait(self._retry_interval)
 
     def _check_conditions(self) -> None:
         """Check if conditions are met to start indexing."""
         with self._lock:
-            # Skip if already indexing
-            if self._is_indexing:
-                return
-                
-            # Check GPU utilization
-            gpu_util = self._gpu_monitor.get_utilization()
-            if gpu_util >= self._gpu_threshold:
-                return
-                
-            # Check idle time
-            idle_seconds = (datetime.now() - self._last_activity).total_seconds()
-            if idle_seconds < SessionConfig().idle_threshold_s:  # Use default config
+            # Requires a free GPU, pending work, and an idle user or a requested run
+            if not self._should_index():
                 return
                 
             # All conditions met, start indexing
-            self._start_indexing()
+            self._is_indexing = True
+            self._cancel_event.clear()
+
+        # Run outside the lock so recording activity never waits on indexing
+        self._start_indexing()
+
+    def request_indexing(self, doc_ids: Optional[List[str]] = None) -> int:
+        """Queue a job over doc_ids (all documents by default) and run it without waiting for idle.
+
+        Unchanged documents are skipped cheaply by content hash, so queueing
+        every document picks up files edited on disk.
+        """
+        if doc_ids is None:
+            doc_ids = [doc.doc_id for doc in self._document_store.list_documents()]
+        job_id = self._job_queue.enqueue(doc_ids, self._config.embed_light, self._config.embed_deep)
+        with self._wakeup:
+            self._run_requested = True
+            self._work_pending = True
+            self._backoff_until = 0.0
+            self._wakeup.notify()
+        return job_id
+
+    def has_unfinished_job(self) -> bool:
+        """Whether a job is running or still queued."""
+        return self._is_indexing or (self._job_queue is not None and self._job_queue.next_job() is not None)
+
+    def _enqueue_unindexed(self) -> Optional[Dict[str, Any]]:
+        """Queue a job for documents never indexed and chunks missing deep vectors, if any."""
+        docs = self._document_store.list_unindexed_documents(self._config.embed_light)
+        if not docs and not self._document_store.count_chunks_missing_deep(self._config.embed_deep):
+            return None
+        job_id = self._job_queue.enqueue(
+            [doc.doc_id for doc in docs], self._config.embed_light, self._config.embed_deep
+        )
+        return self._job_queue.get_job(job_id)
 
     def _start_indexing(self) -> None:
-        """Start the indexing process."""
-        self._is_indexing = True
-        self._cancel_event.clear()
-        
-        try:
-            # TODO: Get list of documents needing indexing
-            # For now, just simulate indexing
-            logger.info("Starting background indexing")
-            
-            # Swap to deep embedder
-            current_info = self._model_manager.get_model_info()
-            if current_info['chat_model']['loaded']:
-                self._model_manager.swap_to_embedder(SessionConfig().embed_deep)
-            
-            # TODO: Process documents
-            time.sleep(5)  # Simulate work
-            
-            if self._cancel_event.is_set():
-                logger.info("Indexing cancelled")
+        """Run the next indexing job, if there is one, in the scheduler thread."""
+        with self._lock:
+            job = self._job_queue.next_job() or self._enqueue_unindexed()
+            self._run_requested = False
+            if job is None:
+                # Nothing to do until documents change or a run is requested
+                self._work_pending = False
+                self._is_indexing = False
                 return
-                
-            logger.info("Background indexing completed")
-            
+
+        job_id = job['job_id']
+        started = time.monotonic()
+        self._progress = _JobProgress(job)
+        self._job_queue.set_status(job_id, 'running')
+        self._gpu_monitor.set_indexing_status(True)
+        status = 'paused'
+        try:
+            logger.info(f"Starting background indexing job {job_id}")
+
+            if self._index_job_documents(job) and self._embed_job_deep(job):
+                status = 'done'
+                logger.info(f"Background indexing job {job_id} completed")
+            else:
+                logger.info(f"Indexing job {job_id} paused; it resumes from its checkpoint")
+            self._job_queue.set_status(job_id, status)
+
         except Exception as e:
-            logger.error(f"Error during indexing: {str(e)}")
+            status = 'failed'
+            logger.error(f"Error during indexing job {job_id}: {str(e)}")
+            self._job_queue.set_status(job_id, status, error=str(e))
         finally:
-            self._is_indexing = False
+            self._report_progress(status, force=True)
+            self._gpu_monitor.set_indexing_status(False)
+            held_gpu = (self._progress.chunks_this_run > 0
+                        and time.monotonic() - started >= self._warm_after_s)
+            with self._lock:
+                self._is_indexing = False
+                if held_gpu:
+                    self._indexed_since_activity = True
+                if status != 'paused' and not self._progress.made_progress:
+                    # Starting again at once would fail or find nothing the same way, so
+                    # only other queued jobs stay pending, and only after the back-off
+                    self._work_pending = self._job_queue.next_job() is not None
+                    self._backoff_until = time.monotonic() + self._retry_interval
+            if held_gpu and status == 'done':
+                # Bring the chat model back while the user is still away
+                self._resume()
+
+    def _index_job_documents(self, job: Dict[str, Any]) -> bool:
+        """Index the job's unfinished documents; False if cancelled."""
+        job_id = job['job_id']
+        progress = self._progress
+
+        def on_window(doc, chunks_done: int, embedded: int) -> None:
+            self._job_queue.checkpoint(job_id, doc.doc_id, chunks_done, embedded)
+            progress.add_chunks(embedded)
+            self._report_progress('running')
+
+        for item in self._job_queue.pending_items(job_id):
+            if self._yield_to_interactive():
+                return False
+            doc = self._document_store.get_document(item['doc_id'])
+            if doc is None:
+                self._job_queue.finish_item(job_id, item['doc_id'], 'failed', error="Document no longer exists")
+                progress.documents_done += 1
+                continue
+
+            progress.current_doc = doc.doc_id
+            stats = self._indexing_task.process_documents(
+                [doc], job['embed_model'], self._yield_to_interactive,
+                on_window=on_window,
+                resume={doc.doc_id: item['chunks_done']}
+            )
+            if stats['cancelled']:
+                return False
+            if stats['failed_documents']:
+                self._job_queue.finish_item(job_id, doc.doc_id, 'failed', error="Indexing failed; see log")
+                # Not queued again by idle runs until the source file changes
+                self._document_store.record_index_failure(doc)
+            else:
+                self._job_queue.finish_item(job_id, doc.doc_id)
+                progress.documents_indexed += 1
+            progress.documents_done += 1
+            self._report_progress('running')
+        return True
+
+    def _embed_job_deep(self, job: Dict[str, Any]) -> bool:
+        """Run the job's deep-embedding pass; False if cancelled."""
+        if not job['deep_model']:
+            return True
+        job_id = job['job_id']
+        progress = self._progress
+        progress.phase = 'deep'
+        progress.current_doc = None
+        progress.deep_remaining = self._document_store.count_chunks_missing_deep(job['deep_model'])
+
+        def on_window(embedded: int) -> None:
+            self._job_queue.add_chunks(job_id, embedded)
+            progress.add_chunks(embedded)
+            self._report_progress('running')
+
+        stats = self._indexing_task.embed_deep(job['deep_model'], self._yield_to_interactive, on_window)
+        return not stats['cancelled']
+
+    def _report_progress(self, status: str, force: bool = False) -> None:
+        """Broadcast job progress, at most once per progress_interval unless forced."""
+        if not self._progress:
+            return
+        self._progress.status = status
+        now = time.monotonic()
+        if not self._websocket_service:
+            return
+        if not force and now - self._last_progress_broadcast < self._progress_interval:
+            return
+        self._last_progress_broadcast = now
+        self._websocket_service.broadcast_indexing_progress(self._progress.payload())
 
     def cancel_indexing(self) -> None:
         """Cancel any running indexing job."""
         if self._is_indexing:
             self._cancel_event.set()
+            with self._wakeup:
+                # A parked job is waiting on the condition, not the event
+                self._wakeup.notify_all()
             logger.info("Indexing cancellation requested")
 
     def get_status(self) -> Dict[str, Any]:
@@ -120,5 +462,6 @@ class Scheduler:
             return {
                 'is_indexing': self._is_indexing,
                 'last_activity': self._last_activity.isoformat(),
-                'idle_seconds': (datetime.now() - self._last_activity).total_seconds()
+                'idle_seconds': (datetime.now() - self._last_activity).total_seconds(),
+                'job': self._progress.payload() if self._progress else None
             } 
\ No newline at end of file
@@ -0,0 +1,67 @@
+import logging
+from threading import Event, Thread
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+class SessionArchiver:
+    """Background job that moves long-idle sessions into the compressed archive tier.
+
+    Archived sessions keep their row in ``sessions`` so listings are unaffected;
+    their messages are faulted back into the hot table on the next read or write.
+    """
+
+    def __init__(self,
+                 database,
+                 conversation_store=None,
+                 idle_threshold_s: int = 30 * 24 * 3600,
+                 poll_interval: float = 3600.0,
+                 batch_size: int = 100):
+        self._db = database
+        self._conversation_store = conversation_store
+        self._idle_threshold_s = idle_threshold_s
+        self._poll_interval = poll_interval
+        self._batch_size = batch_size
+        self._stop_event = Event()
+        self._archiver_thread: Optional[Thread] = None
+
+    def start(self) -> None:
+        """Start the archiver thread."""
+        if self._archiver_thread:
+            return
+
+        self._stop_event.clear()
+        self._archiver_thread = Thread(target=self._archiver_loop, daemon=True)
+        self._archiver_thread.start()
+        logger.info("Session archiver started")
+
+    def stop(self) -> None:
+        """Stop the archiver thread."""
+        self._stop_event.set()
+        if self._archiver_thread:
+            self._archiver_thread.join()
+            self._archiver_thread = None
+        logger.info("Session archiver stopped")
+
+    def run_once(self) -> List[str]:
+        """Archive every currently idle session, in batches."""
+        archived = []
+        while not self._stop_event.is_set():
+            batch = self._db.archive_idle_sessions(self._idle_threshold_s, limit=self._batch_size)
+            if self._conversation_store:
+                # Drop cached histories so archived sessions stop costing memory
+                for session_id in batch:
+                    self._conversation_store.invalidate(session_id)
+            archived.extend(batch)
+            if len(batch) < self._batch_size:
+                break
+        return archived
+
+    def _archiver_loop(self) -> None:
+        """Main archiver loop."""
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Error archiving idle sessions: {str(e)}")
+            self._stop_event.wait(self._poll_interval)
@@ -0,0 +1,115 @@
+import logging
+import sqlite3
+from threading import Lock
+from typing import Any, Dict, Optional
+from ..config import Config
+from ..models.session_config import SessionConfig
+
+logger = logging.getLogger(__name__)
+
+CONFIG_FIELDS = (
+    'model_name', 'thinking_mode', 'top_k', 'embed_light', 'embed_deep', 'idle_threshold_s'
+)
+
+def default_session_config(session_id: str = 'default') -> SessionConfig:
+    """Build a session config from the application-wide defaults."""
+    return SessionConfig(
+        session_id=session_id,
+        model_name=Config.DEFAULT_MODEL,
+        thinking_mode=Config.DEFAULT_THINKING_MODE,
+        top_k=Config.DEFAULT_TOP_K,
+        embed_light=Config.EMBED_LIGHT,
+        embed_deep=Config.EMBED_DEEP,
+        idle_threshold_s=Config.IDLE_THRESHOLD_S
+    )
+
+class SessionConfigStore:
+    """Read-through cache over the session_config table.
+
+    Reads are a dict lookup once a session has been seen; configs are validated
+    when they are written or first loaded, never on the read path. Returned
+    configs are shared and must be treated as read-only.
+    """
+
+    def __init__(self, db_path: str, websocket_service=None):
+        self._db_path = db_path
+        self._websocket_service = websocket_service
+        self._cache: Dict[str, SessionConfig] = {}
+        self._lock = Lock()
+        self._default_config = default_session_config()
+
+    @property
+    def default_config(self) -> SessionConfig:
+        """Application-wide defaults, for callers that are not tied to a session."""
+        return self._default_config
+
+    def get(self, session_id: str) -> SessionConfig:
+        """Get the config for a session, loading it from the database on first use."""
+        config = self._cache.get(session_id)
+        if config is not None:
+            return config
+
+        with self._lock:
+            config = self._cache.get(session_id)
+            if config is None:
+                config = self._load(session_id)
+                self._cache[session_id] = config
+        return config
+
+    def create(self, session_id: str, **overrides: Any) -> SessionConfig:
+        """Persist the initial config for a new session."""
+        values = {**self._default_config.model_dump(), **overrides, 'session_id': session_id}
+        config = SessionConfig(**values)
+        with self._lock:
+            self._save(config)
+            self._cache[session_id] = config
+        return config
+
+    def update(self, session_id: str, data: Dict[str, Any]) -> SessionConfig:
+        """Merge, validate and persist changes, then notify connected clients.
+
+        Raises:
+            ValueError: if the merged config fails validation
+        """
+        with self._lock:
+            current = self._cache.get(session_id) or self._load(session_id)
+            updated = SessionConfig(**{**current.model_dump(), **data, 'session_id': session_id})
+            self._save(updated)
+            self._cache[session_id] = updated
+
+        logger.info(f"Updated config for session {session_id}")
+        if self._websocket_service:
+            self._websocket_service.broadcast_config_update(session_id, updated.model_dump())
+        return updated
+
+    def invalidate(self, session_id: Optional[str] = None) -> None:
+        """Drop cached configs so the next read goes to the database."""
+        with self._lock:
+            if session_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(session_id, None)
+
+    def _load(self, session_id: str) -> SessionConfig:
+        with sqlite3.connect(self._db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute(
+                f"SELECT {', '.join(CONFIG_FIELDS)} FROM session_config WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+
+        if row is None:
+            # Sessions without a stored config use the defaults until first update
+            return self._default_config.model_copy(update={'session_id': session_id})
+        return SessionConfig(session_id=session_id, **dict(row))
+
+    def _save(self, config: SessionConfig) -> None:
+        values = config.model_dump()
+        columns = ('session_id',) + CONFIG_FIELDS
+        with sqlite3.connect(self._db_path) as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO session_config ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)})",
+                tuple(values[column] for column in columns)
+            )
+            conn.commit()
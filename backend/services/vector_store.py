@@ -0,0 +1,157 @@
+import logging
+import os
+from abc import ABC, abstractmethod
+from threading import Lock
+from typing import List, Dict, Any, Optional, Tuple, Union
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Write counters per (location, collection name), shared by every store
+# instance in the process that opens the same collection
+_generations: Dict[Tuple[str, str], int] = {}
+_generations_lock = Lock()
+
+class VectorStore(ABC):
+    """Interface shared by the vector backends.
+
+    Results use cosine distance (1 - cosine similarity), smaller is closer.
+    Every write bumps `generation` so result caches keyed on it go stale.
+    The counter belongs to the collection, identified by location and
+    name, so writes through any store instance in the process bump it.
+    """
+
+    def __init__(self, location: str, collection_name: str):
+        self._generation_key = (location, collection_name)
+
+    @property
+    def generation(self) -> int:
+        """Counter that changes whenever the collection contents change."""
+        return _generations.get(self._generation_key, 0)
+
+    @property
+    def shared(self) -> bool:
+        """True when other processes can write the collection, which `generation` does not see."""
+        return False
+
+    def _bump_generation(self) -> None:
+        with _generations_lock:
+            _generations[self._generation_key] = _generations.get(self._generation_key, 0) + 1
+
+    @abstractmethod
+    def upsert_chunks(self, chunks: List[Dict[str, Any]]) -> None:
+        """
+        Upsert chunks into the vector store.
+
+        Args:
+            chunks: List of dicts with keys:
+                - chroma_id: str
+                - embedding: List[float] or 1-D np.ndarray
+                - text: str
+                - metadata: Dict (optional)
+        """
+
+    def query(self,
+             embedding: List[float],
+             top_k: int = 5,
+             where: Optional[Dict[str, Any]] = None
+             ) -> List[Dict[str, Any]]:
+        """
+        Query the vector store for similar chunks.
+
+        Args:
+            embedding: Query embedding vector (list or 1-D np.ndarray)
+            top_k: Number of results to return
+            where: Optional filter conditions
+
+        Returns:
+            List of dicts with keys:
+                - chroma_id: str
+                - text: str
+                - metadata: Dict
+                - distance: float
+        """
+        return self.query_batch(np.asarray(embedding, dtype=np.float32)[np.newaxis, :], top_k, where)[0]
+
+    @abstractmethod
+    def query_batch(self,
+                    embeddings: np.ndarray,
+                    top_k: int = 5,
+                    where: Optional[Dict[str, Any]] = None,
+                    as_arrays: bool = False
+                    ) -> Union[List[List[Dict[str, Any]]], Dict[str, np.ndarray]]:
+        """
+        Query the vector store with many embeddings in a single call.
+
+        Args:
+            embeddings: (N, D) array of query vectors
+            top_k: Number of results to return per query
+            where: Optional filter conditions applied to every query
+            as_arrays: Return column arrays instead of per-result dicts
+
+        Returns:
+            If as_arrays is False, a list of N result lists shaped like query().
+            Otherwise a dict of (N, top_k) arrays:
+                - ids: object array, None where fewer than top_k matched
+                - distances: float32 array, inf where fewer than top_k matched
+                - texts: object array
+                - metadatas: object array
+        """
+
+    @abstractmethod
+    def get_embeddings(self, chunk_ids: List[str]) -> Dict[str, np.ndarray]:
+        """Stored vectors by id; ids that are not in the store are omitted."""
+
+    @abstractmethod
+    def update_metadata(self, chunk_ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Update chunk metadata in place without touching embeddings."""
+
+    @abstractmethod
+    def delete_chunks(self, chunk_ids: List[str]) -> None:
+        """Delete chunks from the vector store."""
+
+    @abstractmethod
+    def delete_where(self, where: Dict[str, Any]) -> None:
+        """Delete every chunk whose metadata matches the filter."""
+
+    @abstractmethod
+    def get_collection_stats(self) -> Dict[str, Any]:
+        """Get statistics about the collection."""
+
+DEFAULT_COLLECTION = "document_chunks"
+
+def create_vector_store(backend: str = 'chroma',
+                        persist_directory: str = './chroma_db',
+                        collection_name: str = DEFAULT_COLLECTION,
+                        **options) -> VectorStore:
+    """Build the configured vector backend ('chroma' or 'mmap').
+
+    Chroma keeps collections side by side in one database; the mmap index
+    keeps every collection other than the default in a subdirectory.
+    """
+    if backend == 'chroma':
+        from .chroma_client import ChromaClient
+        return ChromaClient(persist_directory=persist_directory, collection_name=collection_name, **options)
+    if backend == 'mmap':
+        from .mmap_vector_store import MmapVectorStore
+        if collection_name != DEFAULT_COLLECTION:
+            persist_directory = os.path.join(persist_directory, collection_name)
+        return MmapVectorStore(persist_directory=persist_directory, **options)
+    raise ValueError(f"Unknown vector store backend: {backend}")
+
+def vector_store_from_config(config, collection_name: str = DEFAULT_COLLECTION) -> VectorStore:
+    """Build a collection of the backend selected in app config."""
+    if config['VECTOR_STORE'] == 'mmap':
+        return create_vector_store(
+            'mmap', config['VECTOR_INDEX_DIR'], collection_name,
+            dtype=config['VECTOR_INDEX_DTYPE'],
+            nprobe=config['VECTOR_INDEX_NPROBE']
+        )
+    return create_vector_store(
+        'chroma', config['CHROMA_PERSIST_DIR'], collection_name,
+        mode=config['CHROMA_MODE'],
+        host=config['CHROMA_HOST'],
+        port=config['CHROMA_PORT'],
+        upsert_batch_size=config['CHROMA_UPSERT_BATCH'],
+        upsert_concurrency=config['CHROMA_UPSERT_CONCURRENCY']
+    )
@@ -72,7 +72,8 @@ class WebSocketService:
         
         self._broadcast_message(message)
 
-    def broadcast_gpu_status(self, is_indexing: bool, gpu_utilization: float) -> None:
+    def broadcast_gpu_status(self, is_indexing: bool, gpu_utilization: float,
+                             metrics: Optional[dict] = None) -> None:
         """Broadcast GPU status update to all connected clients"""
         if not self.ws_connections:
             logger.debug("No WebSocket connections available for GPU status broadcast")
@@ -82,12 +83,41 @@ class WebSocketService:
             'type': 'gpu_status_update',
             'payload': {
                 'is_indexing': is_indexing,
-                'gpu_utilization': gpu_utilization
+                'gpu_utilization': gpu_utilization,
+                # Per-device GPU values, or CPU and memory values on hosts without a GPU
+                **({'metrics': metrics} if metrics else {})
             }
         })
         
         self._broadcast_message(message)
 
+    def broadcast_indexing_progress(self, progress: dict) -> None:
+        """Broadcast indexing job progress to all connected clients"""
+        if not self.ws_connections:
+            logger.debug("No WebSocket connections available for indexing progress broadcast")
+            return
+
+        message = json.dumps({
+            'type': 'indexing_progress',
+            'payload': progress
+        })
+
+        self._broadcast_message(message)
+
+    def broadcast_config_update(self, session_id: str, config: dict) -> None:
+        """Broadcast a session config change to all connected clients"""
+        if not self.ws_connections:
+            logger.debug("No WebSocket connections available for config update broadcast")
+            return
+            
+        message = json.dumps({
+            'type': 'session_config_update',
+            'session_id': session_id,
+            'payload': config
+        })
+        
+        self._broadcast_message(message)
+
     def _broadcast_message(self, message: str) -> None:
         """Helper method to broadcast a message to all connected clients"""
         if not message:
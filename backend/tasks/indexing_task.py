@@ -1,132 +1,356 @@
+import hashlib
 import logging
+import time
 from datetime import datetime
-from typing import List, Dict, Any, Optional
-import uuid
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+import numpy as np
 from ..models.document import Document
 from ..models.chunk import DocumentChunk
-from ..services.model_manager import ModelManager
-from ..services.chroma_client import ChromaClient
+from ..services.model_manager import EMBEDDER, ModelManager
+from ..services.vector_store import VectorStore
+from ..services.document_store import DocumentStore
+from ..utils.document_reader import hash_file, iter_paragraphs
+from ..utils.text_chunker import TextChunker
 
 logger = logging.getLogger(__name__)
 
 class IndexingTask:
     def __init__(self,
                  model_manager: ModelManager,
-                 chroma_client: ChromaClient,
-                 chunk_size: int = 500):
+                 chroma_client: VectorStore,
+                 chunk_size: int = 500,
+                 batch_size: int = 32,
+                 document_store: Optional[DocumentStore] = None,
+                 window_size: int = 256,
+                 chunk_overlap: int = 50,
+                 deep_store: Optional[VectorStore] = None):
         self._model_manager = model_manager
         self._chroma_client = chroma_client
+        # Deep-embedder vectors for re-ranking, keyed by the same chroma_id
+        self._deep_store = deep_store
+        self._document_store = document_store
         self._chunk_size = chunk_size
+        self._chunk_overlap = chunk_overlap
+        self._chunkers: Dict[str, TextChunker] = {}
+        self._batch_size = batch_size
+        # Chunks held in memory at once per document
+        self._window_size = window_size
 
-    def _chunk_text(self, text: str) -> List[str]:
-        """Split text into chunks of approximately chunk_size tokens."""
-        # Simple splitting by newlines and approximate token count
-        # TODO: Use proper tokenizer for more accurate splits
-        paragraphs = text.split('\n\n')
-        chunks = []
-        current_chunk = []
-        current_size = 0
-        
-        for para in paragraphs:
-            # Rough estimate: 4 chars ≈ 1 token
-            para_size = len(para) // 4
-            
-            if current_size + para_size > self._chunk_size:
-                # Current chunk is full, start new one
-                if current_chunk:
-                    chunks.append('\n\n'.join(current_chunk))
-                current_chunk = [para]
-                current_size = para_size
-            else:
-                # Add to current chunk
-                current_chunk.append(para)
-                current_size += para_size
-        
-        # Add final chunk
-        if current_chunk:
-            chunks.append('\n\n'.join(current_chunk))
-            
-        return chunks
-
-    def _process_document(self,
-                         doc: Document,
-                         embedder_name: str,
-                         cancel_check = None
-                         ) -> List[DocumentChunk]:
-        """Process a single document into chunks with embeddings."""
-        logger.info(f"Processing document: {doc.doc_id}")
-        
-        # Read document content
-        # TODO: Implement different readers based on source_type
-        with open(doc.source_path, 'r') as f:
-            content = f.read()
-            
-        # Split into chunks
-        text_chunks = self._chunk_text(content)
-        
-        # Generate embeddings
-        embedder = self._model_manager.load_embedder(embedder_name)
-        chunks = []
-        
-        for i, text in enumerate(text_chunks):
-            # Check for cancellation
+    def _get_chunker(self, embedder_name: str, embedder) -> TextChunker:
+        """Chunker sized with the embedder's tokenizer and maximum sequence length."""
+        chunker = self._chunkers.get(embedder_name)
+        if chunker is None:
+            max_seq_length = getattr(embedder, 'max_seq_length', None)
+            chunker = TextChunker(
+                tokenizer=getattr(embedder, 'tokenizer', None),
+                chunk_size=self._chunk_size,
+                overlap=self._chunk_overlap,
+                # Leave room for the special tokens the model adds around each input
+                max_tokens=max_seq_length - 2 if max_seq_length else None
+            )
+            self._chunkers[embedder_name] = chunker
+        return chunker
+
+    def _embed_texts(self,
+                     embedder,
+                     texts: List[str],
+                     cancel_check=None
+                     ) -> Optional[np.ndarray]:
+        """Embed texts in length-bucketed batches.
+
+        Texts are sorted by length so each batch pads to a similar size, then
+        the vectors are written back in input order. Returns an (N, D) float32
+        array, or None if cancelled between batches.
+        """
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        embeddings: Optional[np.ndarray] = None
+
+        for start in range(0, len(order), self._batch_size):
             if cancel_check and cancel_check():
-                logger.info(f"Cancelling processing of document {doc.doc_id}")
-                return chunks
-                
-            # Generate chunk ID and embedding
-            chunk_id = f"chunk-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
-            embedding = embedder.encode(text).tolist()
-            
-            # Create chunk object
-            chunk = DocumentChunk(
+                return None
+
+            batch = order[start:start + self._batch_size]
+            vectors = embedder.encode(
+                [texts[i] for i in batch],
+                batch_size=len(batch),
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+            if embeddings is None:
+                embeddings = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            embeddings[batch] = vectors
+
+        return embeddings
+
+    @staticmethod
+    def _iter_document_chunks(doc_id: str, texts: Iterable[str]) -> Iterator[DocumentChunk]:
+        """Wrap chunk texts with content-addressed ids so unchanged text keeps its id."""
+        occurrences: Dict[str, int] = {}
+        for i, text in enumerate(texts):
+            content_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+            # Repeated identical chunks within a document get a numbered suffix
+            seen = occurrences.get(content_hash, 0)
+            occurrences[content_hash] = seen + 1
+            chunk_id = f"{doc_id}:{content_hash[:16]}" + (f"-{seen}" if seen else "")
+            yield DocumentChunk(
                 chunk_id=chunk_id,
-                doc_id=doc.doc_id,
+                doc_id=doc_id,
                 chunk_index=i,
                 text=text,
-                chroma_id=f"{doc.doc_id}:{i}",
+                chroma_id=chunk_id,
+                content_hash=content_hash,
                 created_at=datetime.now()
             )
-            
-            # Prepare for Chroma
-            chunks.append({
-                'chunk': chunk,
-                'embedding': embedding
-            })
-            
-        return chunks
+
+    @staticmethod
+    def _chunk_metadata(doc: Document, chunk: DocumentChunk) -> Dict[str, Any]:
+        return {
+            'doc_id': doc.doc_id,
+            'chunk_index': chunk.chunk_index,
+            'source_type': doc.source_type
+        }
+
+    def _index_window(self,
+                      doc: Document,
+                      window: List[DocumentChunk],
+                      existing: Dict[str, str],
+                      embedder_name: str,
+                      cancel_check = None
+                      ) -> Optional[Dict[str, int]]:
+        """Embed and store one bounded window of a document's chunks."""
+        new_chunks = [c for c in window if existing.get(c.chroma_id) != c.content_hash]
+        kept_chunks = [c for c in window if existing.get(c.chroma_id) == c.content_hash]
+
+        if new_chunks:
+            with self._model_manager.use(EMBEDDER, embedder_name) as embedder:
+                embeddings = self._embed_texts(embedder, [c.text for c in new_chunks], cancel_check)
+            if embeddings is None:
+                return None
+
+            # Vectors stay NumPy rows until the store boundary
+            self._chroma_client.upsert_chunks([{
+                'chroma_id': chunk.chroma_id,
+                'text': chunk.text,
+                'embedding': embeddings[i],
+                'metadata': self._chunk_metadata(doc, chunk)
+            } for i, chunk in enumerate(new_chunks)])
+
+        if kept_chunks:
+            # Unchanged chunks may have moved; refresh their position without re-embedding
+            self._chroma_client.update_metadata(
+                [c.chroma_id for c in kept_chunks],
+                [self._chunk_metadata(doc, c) for c in kept_chunks]
+            )
+
+        if self._document_store:
+            self._document_store.upsert_chunks(window)
+
+        return {'embedded': len(new_chunks), 'reused': len(kept_chunks)}
+
+    def _index_document(self,
+                        doc: Document,
+                        embedder_name: str,
+                        cancel_check = None,
+                        on_window: Optional[Callable[[Document, int, int], None]] = None,
+                        resume_from: int = 0
+                        ) -> Optional[Dict[str, int]]:
+        """Index one document, embedding only chunks that are new or changed.
+
+        The file is streamed and chunks are embedded and stored in windows of
+        window_size, so peak memory does not grow with document size. Returns
+        per-document counts, or None if cancelled. The document's content hash
+        is only recorded once all of its chunks are stored, so an interrupted
+        document is picked up again on the next run. on_window(doc, chunks_done,
+        embedded) is called after each stored window; passing that chunks_done
+        back as resume_from reuses the windows an interrupted run finished.
+        Without it, stored vectors are only reused when the document was fully
+        indexed before with this embedder, so an interrupted first-time
+        document is embedded again from the start.
+        """
+        counts = {'skipped': 0, 'embedded': 0, 'reused': 0, 'deleted': 0}
+
+        # TODO: Implement different readers based on source_type
+        content_hash = hash_file(doc.source_path)
+
+        stored = self._document_store.get_document(doc.doc_id) if self._document_store else None
+        if stored and stored.content_hash == content_hash and stored.embed_model == embedder_name:
+            logger.info(f"Skipping unchanged document: {doc.doc_id}")
+            counts['skipped'] = 1
+            return counts
+
+        logger.info(f"Processing document: {doc.doc_id}")
+
+        # Every stored chunk is an orphan candidate, whichever embedder produced it
+        stored_chunks: Dict[str, str] = {}
+        if self._document_store and stored:
+            stored_chunks = self._document_store.get_chunk_hashes(doc.doc_id)
+        # Vectors from a different embedder cannot be reused
+        existing = stored_chunks if stored and stored.embed_model == embedder_name else {}
+        # Chunks before the checkpoint were stored by the interrupted run, with this embedder
+        resumed: Dict[str, str] = {}
+        if self._document_store and resume_from:
+            resumed = stored_chunks or self._document_store.get_chunk_hashes(doc.doc_id)
+
+        embedder = self._model_manager.load_embedder(embedder_name)
+        chunker = self._get_chunker(embedder_name, embedder)
+        chunks = self._iter_document_chunks(
+            doc.doc_id, chunker.iter_chunks(
+                iter_paragraphs(doc.source_path, max_paragraph_chars=chunker.max_paragraph_chars)
+            )
+        )
+        current_ids = set()
+        while True:
+            window = list(islice(chunks, self._window_size))
+            if not window:
+                break
+            reusable = existing
+            if window[0].chunk_index < resume_from:
+                reusable = {**existing, **{
+                    c.chroma_id: resumed[c.chroma_id] for c in window
+                    if c.chunk_index < resume_from and c.chroma_id in resumed
+                }}
+            window_counts = self._index_window(doc, window, reusable, embedder_name, cancel_check)
+            if window_counts is None:
+                logger.info(f"Cancelling processing of document {doc.doc_id}")
+                return None
+            current_ids.update(c.chroma_id for c in window)
+            counts['embedded'] += window_counts['embedded']
+            counts['reused'] += window_counts['reused']
+            if on_window:
+                on_window(doc, window[-1].chunk_index + 1, window_counts['embedded'])
+
+        orphans = [chroma_id for chroma_id in {**stored_chunks, **resumed} if chroma_id not in current_ids]
+        if orphans:
+            self._chroma_client.delete_chunks(orphans)
+            if self._deep_store:
+                self._deep_store.delete_chunks(orphans)
+
+        if self._document_store:
+            self._document_store.delete_chunks(orphans)
+            self._document_store.save_document(
+                doc.model_copy(update={'content_hash': content_hash, 'embed_model': embedder_name})
+            )
+
+        counts['deleted'] = len(orphans)
+        return counts
+
+    def embed_deep(self,
+                   embedder_name: str,
+                   cancel_check = None,
+                   on_window: Optional[Callable[[int], None]] = None
+                   ) -> Dict[str, Any]:
+        """Precompute deep-embedder vectors for chunks that lack them.
+
+        Meant for idle time, after process_documents has stored the chunks.
+        Works through document_chunks in windows and records progress per
+        window, so a cancelled run resumes where it stopped. on_window is
+        called with the number of chunks in each stored window.
+
+        Returns:
+            Dict with chunks embedded, whether the run was cancelled, elapsed
+            seconds and throughput in chunks per second.
+        """
+        started = time.monotonic()
+        stats = {'chunks_embedded': 0, 'cancelled': False}
+        if not (self._deep_store and self._document_store):
+            logger.warning("Deep embedding needs both a deep store and a document store")
+        else:
+            while True:
+                window = self._document_store.get_chunks_missing_deep(embedder_name, self._window_size)
+                if not window:
+                    break
+                with self._model_manager.use(EMBEDDER, embedder_name) as embedder:
+                    embeddings = self._embed_texts(embedder, [c.text for c in window], cancel_check)
+                if embeddings is None:
+                    stats['cancelled'] = True
+                    break
+
+                self._deep_store.upsert_chunks([{
+                    'chroma_id': chunk.chroma_id,
+                    'text': chunk.text,
+                    'embedding': embeddings[i],
+                    'metadata': {'doc_id': chunk.doc_id, 'chunk_index': chunk.chunk_index}
+                } for i, chunk in enumerate(window)])
+                self._document_store.mark_deep_embedded([c.chroma_id for c in window], embedder_name)
+                stats['chunks_embedded'] += len(window)
+                if on_window:
+                    on_window(len(window))
+
+        elapsed = time.monotonic() - started
+        stats['elapsed_s'] = round(elapsed, 3)
+        stats['chunks_per_s'] = round(stats['chunks_embedded'] / elapsed, 2) if elapsed > 0 else 0.0
+        logger.info(
+            f"Deep-embedded {stats['chunks_embedded']} chunks with {embedder_name} "
+            f"in {stats['elapsed_s']}s ({stats['chunks_per_s']} chunks/s)"
+        )
+        return stats
 
     def process_documents(self,
                          docs: List[Document],
                          embedder_name: str,
-                         cancel_check = None
-                         ) -> None:
-        """Process multiple documents and update vector store."""
+                         cancel_check = None,
+                         on_window: Optional[Callable[[Document, int, int], None]] = None,
+                         resume: Optional[Dict[str, int]] = None
+                         ) -> Dict[str, Any]:
+        """Process multiple documents and update vector store.
+
+        Args:
+            docs: Documents to index
+            embedder_name: Embedder to index with
+            cancel_check: Returns True to stop at the next batch boundary
+            on_window: Checkpoint callback, see _index_document
+            resume: Chunks already stored per doc_id by an interrupted run
+
+        Returns:
+            Dict with the number of documents indexed, skipped as unchanged and
+            failed, chunks embedded, reused and deleted, elapsed seconds and
+            embedding throughput in chunks per second.
+        """
+        started = time.monotonic()
+        stats = {
+            'documents': 0,
+            'skipped_documents': 0,
+            'failed_documents': 0,
+            'chunks_embedded': 0,
+            'chunks_reused': 0,
+            'chunks_deleted': 0,
+            'cancelled': False
+        }
+
         for doc in docs:
+            if cancel_check and cancel_check():
+                stats['cancelled'] = True
+                break
             try:
-                # Process document
-                chunk_data = self._process_document(doc, embedder_name, cancel_check)
-                
-                if not chunk_data or (cancel_check and cancel_check()):
+                counts = self._index_document(
+                    doc, embedder_name, cancel_check, on_window,
+                    resume_from=(resume or {}).get(doc.doc_id, 0)
+                )
+                if counts is None:
+                    stats['cancelled'] = True
                     break
-                
-                # Prepare chunks for Chroma
-                chroma_chunks = [{
-                    'chroma_id': data['chunk'].chroma_id,
-                    'text': data['chunk'].text,
-                    'embedding': data['embedding'],
-                    'metadata': {
-                        'doc_id': doc.doc_id,
-                        'chunk_index': data['chunk'].chunk_index,
-                        'source_type': doc.source_type
-                    }
-                } for data in chunk_data]
-                
-                # Update vector store
-                self._chroma_client.upsert_chunks(chroma_chunks)
-                
-                # TODO: Save chunks to database
-                
+
+                if counts['skipped']:
+                    stats['skipped_documents'] += 1
+                    continue
+                stats['documents'] += 1
+                stats['chunks_embedded'] += counts['embedded']
+                stats['chunks_reused'] += counts['reused']
+                stats['chunks_deleted'] += counts['deleted']
+
             except Exception as e:
                 logger.error(f"Error processing document {doc.doc_id}: {str(e)}")
-                continue 
\ No newline at end of file
+                stats['failed_documents'] += 1
+                continue
+
+        elapsed = time.monotonic() - started
+        stats['elapsed_s'] = round(elapsed, 3)
+        stats['chunks_per_s'] = round(stats['chunks_embedded'] / elapsed, 2) if elapsed > 0 else 0.0
+        logger.info(
+            f"Indexed {stats['documents']} documents ({stats['skipped_documents']} unchanged): "
+            f"{stats['chunks_embedded']} chunks embedded, {stats['chunks_reused']} reused, "
+            f"{stats['chunks_deleted']} deleted in {stats['elapsed_s']}s "
+            f"({stats['chunks_per_s']} chunks/s)"
+        )
+        return stats
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from unittest.mock import Mock, patch
+from backend.services.chroma_client import ChromaClient
+
+@pytest.fixture
+def collection():
+    collection = Mock()
+    collection.query.return_value = {
+        'ids': [['a', 'b'], ['c']],
+        'documents': [['text a', 'text b'], ['text c']],
+        'metadatas': [[{'doc_id': 'd1'}, {'doc_id': 'd1'}], [{'doc_id': 'd2'}]],
+        'distances': [[0.1, 0.2], [0.3]]
+    }
+    return collection
+
+@pytest.fixture
+def chroma_client(collection, tmp_path):
+    with patch('backend.services.chroma_client.chromadb') as chromadb:
+        chromadb.Client.return_value.get_or_create_collection.return_value = collection
+        yield ChromaClient(persist_directory=str(tmp_path))
+
+def test_query_batch_sends_one_request(chroma_client, collection):
+    queries = np.random.rand(2, 4).astype(np.float32)
+
+    results = chroma_client.query_batch(queries, top_k=2)
+
+    assert collection.query.call_count == 1
+    assert collection.query.call_args.kwargs['query_embeddings'].shape == (2, 4)
+    assert [[r['chroma_id'] for r in row] for row in results] == [['a', 'b'], ['c']]
+
+def test_query_batch_as_arrays_pads_ragged_rows(chroma_client):
+    results = chroma_client.query_batch(np.zeros((2, 4)), top_k=2, as_arrays=True)
+
+    assert results['ids'].shape == (2, 2)
+    assert results['ids'][1].tolist() == ['c', None]
+    assert results['distances'].dtype == np.float32
+    assert np.isinf(results['distances'][1, 1])
+    assert results['metadatas'][0, 0] == {'doc_id': 'd1'}
+
+def test_single_query_delegates_to_batch(chroma_client, collection):
+    results = chroma_client.query([0.0, 0.0, 0.0, 0.0], top_k=2)
+    assert collection.query.call_args.kwargs['query_embeddings'].shape == (1, 4)
+    assert results[0] == {'chroma_id': 'a', 'text': 'text a', 'metadata': {'doc_id': 'd1'}, 'distance': 0.1}
+
+def _chunks(n):
+    return [{'chroma_id': f'c{i}', 'text': f't{i}', 'embedding': [float(i), 1.0]} for i in range(n)]
+
+def test_upserts_are_split_into_server_sized_batches(collection, tmp_path):
+    with patch('backend.services.chroma_client.chromadb') as chromadb:
+        chromadb.Client.return_value.get_or_create_collection.return_value = collection
+        chromadb.Client.return_value.max_batch_size = 4
+        client = ChromaClient(persist_directory=str(tmp_path), upsert_batch_size=10)
+
+        client.upsert_chunks(_chunks(10))
+
+    sizes = [len(call.kwargs['ids']) for call in collection.upsert.call_args_list]
+    assert sizes == [4, 4, 2]
+    assert collection.upsert.call_args_list[2].kwargs['embeddings'][:, 0].tolist() == [8.0, 9.0]
+
+def test_http_mode_shares_one_client_and_retries_transient_errors(collection):
+    collection.upsert.side_effect = [ConnectionError('reset'), None, None, None]
+    with patch('backend.services.chroma_client.chromadb') as chromadb, \
+         patch('backend.services.chroma_client._http_clients', {}), \
+         patch('backend.utils.retries.time.sleep'):
+        chromadb.HttpClient.return_value.get_or_create_collection.return_value = collection
+        first = ChromaClient(mode='http', host='chroma', port=8000,
+                             upsert_batch_size=2, upsert_concurrency=2)
+        ChromaClient(mode='http', host='chroma', port=8000, collection_name='memory')
+
+        first.upsert_chunks(_chunks(6))
+
+    assert chromadb.HttpClient.call_count == 1
+    assert collection.upsert.call_count == 4
+    sent = sorted(i for call in collection.upsert.call_args_list[1:] for i in call.kwargs['ids'])
+    assert sent == sorted(f'c{i}' for i in range(6))
+
+def test_permanent_errors_are_not_retried(chroma_client, collection):
+    collection.delete.side_effect = ValueError('invalid id')
+    with pytest.raises(ValueError):
+        chroma_client.delete_chunks(['x'])
+    assert collection.delete.call_count == 1
+
+def test_retries_are_decided_by_status_not_message(chroma_client, collection):
+    class HTTPError(Exception):
+        def __init__(self, message, status_code):
+            super().__init__(message)
+            self.response = Mock(status_code=status_code)
+
+    collection.delete.side_effect = ValueError('expected 500 dimensions, got 384')
+    with pytest.raises(ValueError):
+        chroma_client.delete_chunks(['x'])
+    assert collection.delete.call_count == 1
+
+    collection.delete.reset_mock()
+    collection.delete.side_effect = [HTTPError('Service Unavailable', 503), None]
+    with patch('backend.utils.retries.time.sleep'):
+        chroma_client.delete_chunks(['x'])
+    assert collection.delete.call_count == 2
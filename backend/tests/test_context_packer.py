@@ -0,0 +1,54 @@
+import numpy as np
+from unittest.mock import Mock
+from backend.services.context_packer import ContextPacker, estimate_tokens
+from backend.services.rag_service import RAGService
+from backend.services.session_config_store import default_session_config
+
+def _chunk(chroma_id, text):
+    return {'chroma_id': chroma_id, 'text': text}
+
+def test_near_duplicates_are_dropped_by_embedding_similarity():
+    chunks = [_chunk('a', 'The meeting is on Monday.'),
+              _chunk('b', 'The meeting is on Monday, as agreed.'),
+              _chunk('c', 'Budget approval is pending.')]
+    vectors = {'a': np.array([1.0, 0.0]), 'b': np.array([0.99, 0.05]), 'c': np.array([0.0, 1.0])}
+
+    packed = ContextPacker().pack(chunks, budget_tokens=500, vectors=vectors)
+
+    assert [c['chroma_id'] for c in packed] == ['a', 'c']
+
+def test_contained_text_is_dropped_without_vectors():
+    chunks = [_chunk('a', 'Alpha beta gamma. Delta epsilon.'), _chunk('b', 'delta   EPSILON.')]
+    assert [c['chroma_id'] for c in ContextPacker().pack(chunks, 500)] == ['a']
+
+def test_mmr_prefers_a_different_chunk_over_a_similar_one():
+    chunks = [_chunk('a', 'one'), _chunk('b', 'two'), _chunk('c', 'three')]
+    vectors = {'a': np.array([1.0, 0.0]), 'b': np.array([0.8, 0.6]), 'c': np.array([0.0, 1.0])}
+
+    packed = ContextPacker(dedup_threshold=0.99, mmr_lambda=0.5).pack(
+        chunks, 500, vectors, max_chunks=2
+    )
+
+    assert [c['chroma_id'] for c in packed] == ['a', 'c']
+
+def test_chunks_are_trimmed_to_whole_sentences_within_budget():
+    long_text = ' '.join(f'Sentence number {i} is here.' for i in range(40))
+    packed = ContextPacker(min_chunk_tokens=1).pack(
+        [_chunk('a', 'Short first chunk.'), _chunk('b', long_text)], budget_tokens=40
+    )
+
+    assert packed[0]['text'] == 'Short first chunk.'
+    assert packed[1]['text'].endswith('is here.')
+    assert sum(estimate_tokens(c['text']) for c in packed) <= 40
+
+def test_rag_prompt_fits_the_context_window():
+    chroma = Mock()
+    chroma.get_embeddings.return_value = {}
+    rag = RAGService(Mock(), chroma, num_ctx=400, answer_tokens=100)
+    chunks = [_chunk(f'c{i}', f'Distinct fact number {i}. ' * 20) for i in range(10)]
+
+    prompt = rag._build_rag_prompt('question?', chunks,
+                                   budget_tokens=rag._context_budget('question?', 'rag'))
+
+    assert estimate_tokens(prompt) <= 300
+    assert 'Distinct fact number 0' in prompt
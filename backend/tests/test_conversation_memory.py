@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+from contextlib import nullcontext
+from unittest.mock import Mock, patch
+from backend.services.ai_service import AIService
+from backend.services.memory_index import ConversationMemory, format_turn
+from backend.services.mmap_vector_store import MmapVectorStore
+
+VOCAB = ['dog', 'cat', 'paris', 'london', 'pizza', 'weather']
+
+class KeywordEmbedder:
+    """Embeds text as counts of a few keywords, so similar topics get similar vectors."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, texts, **kwargs):
+        self.calls += 1
+        single = isinstance(texts, str)
+        rows = [[t.lower().count(w) for w in VOCAB] + [0.1] for t in ([texts] if single else texts)]
+        vectors = np.array(rows, dtype=np.float32)
+        return vectors[0] if single else vectors
+
+@pytest.fixture
+def embedder():
+    return KeywordEmbedder()
+
+@pytest.fixture
+def memory(tmp_path, embedder):
+    manager = Mock()
+    manager.load_embedder.return_value = embedder
+    manager.use.side_effect = lambda kind, name: nullcontext(manager.load_embedder(name))
+    return ConversationMemory(manager, MmapVectorStore(str(tmp_path)), 'light', batch_size=8)
+
+def test_turns_are_embedded_in_batches(memory, embedder):
+    for i in range(10):
+        memory.record_turn('chat', f'question {i} about the dog', f'answer {i}')
+    assert memory.flush() == 10
+    assert embedder.calls == 2
+
+def test_recall_returns_relevant_turns_from_the_same_chat(memory):
+    memory.record_turn('chat', 'My dog is called Rex', 'Nice dog name!')
+    memory.record_turn('chat', 'I live in Paris', 'Paris is lovely.')
+    memory.record_turn('chat', 'I like pizza', 'Pizza is great.')
+    memory.record_turn('other', 'My dog is called Max', 'Hello Max!')
+    memory.flush()
+
+    recalled = memory.recall('chat', 'what is my dog called?', k=1)
+    assert recalled == [format_turn('My dog is called Rex', 'Nice dog name!')]
+
+    excluded = memory.recall('chat', 'what is my dog called?', k=1, exclude=recalled)
+    assert excluded and excluded != recalled
+
+def test_background_thread_indexes_queued_turns(memory):
+    memory._flush_interval = 0.01
+    memory.start()
+    memory.record_turn('chat', 'The weather in London', 'Rainy.')
+    memory.stop()
+    assert memory.recall('chat', 'london weather', k=1)[0].startswith('User: The weather')
+
+def test_prompt_uses_recent_tail_plus_recalled_turns(memory):
+    memory.record_turn('chat', 'My dog is called Rex', 'Nice dog name!')
+    memory.flush()
+    history = []
+    for i in range(20):
+        history += [{'type': 'user', 'text': f'filler question {i}'},
+                    {'type': 'ai', 'text': f'filler answer {i}'}]
+    store = Mock()
+    store.get_history.return_value = history
+    service = AIService(store, memory=memory, recent_turns=2, recall_k=1)
+
+    with patch('backend.services.ai_service.requests.post') as post:
+        post.return_value.status_code = 200
+        post.return_value.json.return_value = {'response': 'Rex!'}
+        service.service = 'ollama'
+        assert service.get_response('what is my dog called?', 'chat') == 'Rex!'
+
+    prompt = post.call_args.kwargs['json']['prompt']
+    assert 'My dog is called Rex' in prompt
+    assert 'filler question 19' in prompt and 'filler question 17' not in prompt
+
+def test_forget_deletes_a_sessions_turns(memory):
+    memory.record_turn('chat', 'My dog is called Rex', 'Nice dog name!')
+    memory.record_turn('other', 'My dog is called Max', 'Hello Max!')
+    memory.flush()
+    memory.record_turn('chat', 'I live in Paris', 'Paris is lovely.')
+
+    memory.forget('chat')
+    memory.record_turn('chat', 'I like pizza', 'Pizza is great.')
+    memory.flush()
+
+    assert memory.recall('chat', 'dog paris pizza', k=3) == []
+    assert memory.recall('other', 'dog', k=1) == [format_turn('My dog is called Max', 'Hello Max!')]
@@ -0,0 +1,73 @@
+import threading
+import time
+import pytest
+from backend import conversation_store as store_module
+from backend.conversation_store import ConversationStore
+from backend.database import Database
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(store_module, 'db', Database(str(tmp_path / 'test.db')))
+    return ConversationStore(num_stripes=4)
+
+def test_concurrent_turns_on_one_chat_do_not_interleave(store):
+    store.create_chat('chat-a')
+
+    def run_turn(i):
+        with store.turn('chat-a'):
+            store.add_message('chat-a', {'type': 'user', 'text': f'q{i}'})
+            time.sleep(0.005)
+            store.add_message('chat-a', {'type': 'ai', 'text': f'a{i}'})
+
+    threads = [threading.Thread(target=run_turn, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    history = store.get_history('chat-a')
+    assert len(history) == 16
+    for user_msg, ai_msg in zip(history[::2], history[1::2]):
+        assert user_msg['text'][1:] == ai_msg['text'][1:]
+    assert store._turn_queues == {}
+
+def test_turns_on_different_chats_run_in_parallel(store):
+    inside = threading.Barrier(2, timeout=2)
+
+    def run_turn(chat_id):
+        with store.turn(chat_id):
+            inside.wait()  # Both turns must be inside at once
+
+    threads = [threading.Thread(target=run_turn, args=(c,)) for c in ('chat-a', 'chat-b')]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not inside.broken
+
+def test_cache_load_race_does_not_duplicate(store):
+    store.create_chat('chat-a')
+    store.invalidate()
+
+    def writer():
+        for i in range(20):
+            store.add_message('chat-a', {'type': 'user', 'text': f'm{i}'})
+
+    def reader():
+        for _ in range(20):
+            store.invalidate('chat-a')
+            store.get_history('chat-a')
+
+    threads = [threading.Thread(target=writer), threading.Thread(target=reader)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert [m['text'] for m in store.get_history('chat-a')] == [f'm{i}' for i in range(20)]
+
+def test_history_is_trimmed_to_token_budget(store):
+    store.create_chat('chat-a')
+    for text in ('a' * 40, 'b' * 40, 'c' * 40):
+        store.add_message('chat-a', {'type': 'user', 'text': text})
+    assert [m['text'][0] for m in store.get_history('chat-a', max_tokens=20)] == ['b', 'c']
@@ -0,0 +1,25 @@
+import hashlib
+from backend.utils.document_reader import hash_file, iter_paragraphs
+
+def test_paragraphs_span_block_boundaries(tmp_path):
+    path = tmp_path / 'doc.txt'
+    paragraphs = [f'paragraph {i} ' + 'word ' * i for i in range(50)]
+    path.write_text('\n\n'.join(paragraphs))
+
+    assert list(iter_paragraphs(str(path), block_size=16)) == paragraphs
+
+def test_long_paragraph_is_split_at_line_breaks(tmp_path):
+    path = tmp_path / 'log.txt'
+    lines = [f'2024-01-01 INFO line {i}' for i in range(200)]
+    path.write_text('\n'.join(lines))
+
+    pieces = list(iter_paragraphs(str(path), block_size=64, max_paragraph_chars=500))
+
+    assert all(len(piece) <= 500 for piece in pieces)
+    assert '\n'.join(pieces).split('\n') == lines
+
+def test_hash_file_matches_sha256(tmp_path):
+    path = tmp_path / 'doc.bin'
+    data = bytes(range(256)) * 1000
+    path.write_bytes(data)
+    assert hash_file(str(path), block_size=1000) == hashlib.sha256(data).hexdigest()
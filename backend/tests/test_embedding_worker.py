@@ -0,0 +1,113 @@
+import threading
+import numpy as np
+import pytest
+from backend.services.embedding_worker import EmbeddingWorker, RemoteEmbedder, parse_address
+
+AUTHKEY = b'test-key'
+
+class FakeModel:
+    """Embeds text as [len(text), index in batch] and records batch sizes."""
+    max_seq_length = 128
+
+    def __init__(self):
+        self.batches = []
+
+    def get_sentence_embedding_dimension(self):
+        return 2
+
+    def encode(self, texts, **kwargs):
+        self.batches.append(len(texts))
+        if any(t == 'boom' for t in texts):
+            raise ValueError('cannot embed boom')
+        return np.array([[len(t), i] for i, t in enumerate(texts)], dtype=np.float32)
+
+@pytest.fixture
+def models():
+    return {}
+
+@pytest.fixture
+def worker(models):
+    def factory(name):
+        models[name] = FakeModel()
+        return models[name]
+    worker = EmbeddingWorker(('localhost', 0), authkey=AUTHKEY, model_factory=factory, max_wait_s=0.1)
+    worker.start()
+    yield worker
+    worker.stop()
+
+def test_encode_round_trips_through_shared_memory(worker, models):
+    embedder = RemoteEmbedder(worker.address, 'mini', authkey=AUTHKEY)
+
+    vectors = embedder.encode(['a', 'bbb'])
+    single = embedder.encode('cc')
+    larger = embedder.encode(['x' * n for n in range(50)])
+
+    assert vectors.dtype == np.float32 and vectors[:, 0].tolist() == [1, 3]
+    assert single.shape == (2,) and single[0] == 2
+    assert larger[:, 0].tolist() == list(range(50))
+    assert embedder.max_seq_length == 128
+    assert list(models) == ['mini']
+
+def test_concurrent_callers_share_encode_calls(worker, models):
+    embedder = RemoteEmbedder(worker.address, 'mini', authkey=AUTHKEY)
+    results = {}
+    barrier = threading.Barrier(6)
+
+    def call(i):
+        barrier.wait()
+        results[i] = embedder.encode(['t' * i] * 2)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # One model load serves every caller, and requests were coalesced
+    assert len(models['mini'].batches) < 6
+    assert sum(models['mini'].batches) == 12
+    assert all(results[i][:, 0].tolist() == [i, i] for i in range(6))
+
+def test_errors_are_raised_in_the_caller(worker):
+    embedder = RemoteEmbedder(worker.address, 'mini', authkey=AUTHKEY)
+    with pytest.raises(RuntimeError, match='boom'):
+        embedder.encode(['boom'])
+    assert embedder.encode(['ok'])[0, 0] == 2
+
+def test_parse_address():
+    assert parse_address('localhost:6010') == ('localhost', 6010)
+    assert parse_address('/tmp/embed.sock') == '/tmp/embed.sock'
+
+def test_worker_requires_a_key_and_a_loopback_address():
+    with pytest.raises(ValueError, match='authkey'):
+        EmbeddingWorker(('localhost', 0))
+    with pytest.raises(ValueError, match='non-loopback'):
+        EmbeddingWorker(('0.0.0.0', 0), authkey=AUTHKEY)
+    assert EmbeddingWorker(('0.0.0.0', 0), authkey=AUTHKEY, allow_remote=True)
+    assert EmbeddingWorker('/tmp/embed.sock', authkey=AUTHKEY)
+
+def test_wrong_key_is_rejected(worker):
+    with pytest.raises(Exception):
+        RemoteEmbedder(worker.address, 'mini', authkey=b'wrong-key')
+
+def test_slow_load_does_not_block_other_models():
+    release = threading.Event()
+    loads = []
+
+    def factory(name):
+        loads.append(name)
+        if name == 'slow':
+            release.wait(5)
+        return FakeModel()
+
+    worker = EmbeddingWorker(('localhost', 0), authkey=AUTHKEY, model_factory=factory)
+    waiters = [threading.Thread(target=worker._load_model, args=('slow',)) for _ in range(3)]
+    for thread in waiters:
+        thread.start()
+
+    # Served while 'slow' is still loading
+    assert worker._load_model('mini') is worker._load_model('mini')
+    release.set()
+    for thread in waiters:
+        thread.join()
+    assert sorted(loads) == ['mini', 'slow']
@@ -0,0 +1,49 @@
+from unittest.mock import Mock, patch
+from backend.services.gpu_monitor import GPUMonitor
+
+def test_threshold_listeners_fire_on_crossings_only():
+    monitor = GPUMonitor(hysteresis=5.0)
+    crossings = []
+    monitor.add_threshold_listener(50.0, crossings.append)
+
+    # 47 is inside the hysteresis band, so load hovering near 50 does not flap
+    for utilization in (10.0, 70.0, 47.0, 90.0, 40.0, 30.0):
+        monitor._utilization = utilization
+        monitor._notify_threshold_listeners()
+
+    assert crossings == [True, False]
+
+def test_broadcasts_only_on_change_and_at_most_once_per_interval():
+    websocket = Mock()
+    monitor = GPUMonitor(websocket_service=websocket, hysteresis=5.0,
+                         min_broadcast_interval=0.0, heartbeat_interval=3600.0)
+
+    for utilization in (20.0, 22.0, 24.0, 30.0, 31.0):
+        monitor._utilization = utilization
+        monitor._broadcast_status()
+
+    sent = [c.kwargs['gpu_utilization'] for c in websocket.broadcast_gpu_status.call_args_list]
+    assert sent == [20.0, 30.0]
+
+    monitor._min_broadcast_interval = 3600.0
+    monitor._utilization = 90.0
+    monitor._broadcast_status()
+    assert websocket.broadcast_gpu_status.call_count == 2
+    # Indexing status changes are always sent
+    monitor.set_indexing_status(True)
+    assert websocket.broadcast_gpu_status.call_count == 3
+
+def test_cpu_fallback_without_nvml():
+    monitor = GPUMonitor()
+    monitor._device_count = 0
+    cpu = {'cpu_percent': 37.5, 'process_rss': 64 * 2**20,
+           'memory_used': 4 * 2**30, 'memory_total': 16 * 2**30}
+
+    with patch('backend.services.gpu_monitor._cpu_metrics', return_value=cpu):
+        monitor._update_metrics()
+
+    metrics = monitor.get_metrics()
+    assert metrics['source'] == 'cpu'
+    assert monitor.get_utilization() == 37.5
+    assert metrics['memory_used_pct'] == 25.0
+    assert metrics['process_rss_mb'] == 64
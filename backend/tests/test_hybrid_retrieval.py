@@ -0,0 +1,117 @@
+import sqlite3
+import numpy as np
+import pytest
+from datetime import datetime
+from contextlib import nullcontext
+from unittest.mock import Mock
+from backend.db.init_db import create_tables
+from backend.models.chunk import DocumentChunk
+from backend.models.document import Document
+from backend.services.document_store import DocumentStore
+from backend.services.rag_service import RAGService
+from backend.services.session_config_store import default_session_config
+
+TEXTS = [
+    'Error E4012 is raised when the embedding cache is full.',
+    'The scheduler indexes documents while the user is idle.',
+    'Retrieval combines keyword and vector search results.',
+    'Error E4012 can be cleared by restarting the worker.',
+]
+
+@pytest.fixture
+def document_store(tmp_path):
+    db_path = str(tmp_path / 'test.db')
+    create_tables(db_path)
+    store = DocumentStore(db_path)
+    store.save_document(Document(doc_id='doc', source_type='text', source_path='doc.txt'))
+    store.upsert_chunks([
+        DocumentChunk(chunk_id=f'doc:{i}', doc_id='doc', chunk_index=i, text=text,
+                      chroma_id=f'doc:{i}', created_at=datetime.now())
+        for i, text in enumerate(TEXTS)
+    ])
+    return store
+
+@pytest.fixture
+def embedder():
+    embedder = Mock()
+    embedder.encode.return_value = np.array([0.1, 0.2, 0.3], dtype=np.float32)
+    return embedder
+
+@pytest.fixture
+def mock_chroma():
+    chroma = Mock()
+    chroma.generation = 0
+    chroma.query.return_value = [
+        {'chroma_id': 'doc:2', 'text': TEXTS[2], 'distance': 0.1},
+        {'chroma_id': 'doc:1', 'text': TEXTS[1], 'distance': 0.2},
+    ]
+    return chroma
+
+@pytest.fixture
+def rag_service(embedder, mock_chroma, document_store):
+    manager = Mock()
+    manager.load_embedder.return_value = embedder
+    manager.use.side_effect = lambda kind, name: nullcontext(manager.load_embedder(name))
+    return RAGService(manager, mock_chroma, document_store=document_store)
+
+def test_search_chunks_ranks_by_bm25(document_store):
+    hits = document_store.search_chunks('what does E4012 mean?')
+    assert {hit['chroma_id'] for hit in hits} == {'doc:0', 'doc:3'}
+    assert hits[0]['bm25'] >= hits[1]['bm25']
+    assert hits[0]['metadata']['source_type'] == 'text'
+    assert document_store.search_chunks('E4012', where={'doc_id': 'other'}) == []
+    assert [h['chroma_id'] for h in document_store.search_chunks('E4012', where={'chunk_index': 3})] == ['doc:3']
+    with pytest.raises(ValueError):
+        document_store.search_chunks('E4012', where={'author': 'someone'})
+
+def test_index_survives_vacuum_and_schema_upgrade(tmp_path):
+    db_path = str(tmp_path / 'old.db')
+    with sqlite3.connect(db_path) as conn:
+        # document_chunks as created before chunk_rowid existed
+        conn.execute('''
+            CREATE TABLE document_chunks (
+                chunk_id TEXT PRIMARY KEY, doc_id TEXT NOT NULL, chunk_index INTEGER NOT NULL,
+                text TEXT NOT NULL, chroma_id TEXT UNIQUE NOT NULL,
+                created_at DATETIME NOT NULL DEFAULT (CURRENT_TIMESTAMP)
+            )
+        ''')
+        conn.executemany(
+            'INSERT INTO document_chunks (chunk_id, doc_id, chunk_index, text, chroma_id) VALUES (?, ?, ?, ?, ?)',
+            [(f'doc:{i}', 'doc', i, text, f'doc:{i}') for i, text in enumerate(TEXTS)]
+        )
+    create_tables(db_path)
+    store = DocumentStore(db_path)
+    store.delete_chunks(['doc:1'])
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('VACUUM')
+
+    assert {h['chroma_id'] for h in store.search_chunks('E4012')} == {'doc:0', 'doc:3'}
+    assert [h['text'] for h in store.search_chunks('keyword')] == [TEXTS[2]]
+
+def test_index_follows_chunk_updates_and_deletes(document_store):
+    document_store.upsert_chunks([
+        DocumentChunk(chunk_id='doc:1', doc_id='doc', chunk_index=1, text='Completely new wording.',
+                      chroma_id='doc:1', created_at=datetime.now())
+    ])
+    document_store.delete_chunks(['doc:0'])
+    assert [h['chroma_id'] for h in document_store.search_chunks('E4012')] == ['doc:3']
+    assert document_store.search_chunks('scheduler') == []
+    assert [h['chroma_id'] for h in document_store.search_chunks('wording')] == ['doc:1']
+
+def test_keyword_query_skips_embedding(rag_service, embedder, mock_chroma):
+    config = default_session_config('s').model_copy(update={'top_k': 2})
+    chunks = rag_service._retrieve_relevant_chunks('E4012', config)
+
+    assert {c['chroma_id'] for c in chunks} == {'doc:0', 'doc:3'}
+    embedder.encode.assert_not_called()
+    mock_chroma.query.assert_not_called()
+
+def test_natural_language_query_fuses_rankings(rag_service, mock_chroma):
+    config = default_session_config('s').model_copy(update={'top_k': 3})
+    chunks = rag_service._retrieve_relevant_chunks('how does keyword retrieval work', config)
+
+    # doc:2 is first in both rankings, so it wins the fusion
+    assert chunks[0]['chroma_id'] == 'doc:2'
+    assert 'rrf_score' in chunks[0]
+    assert [c['chroma_id'] for c in chunks] == ['doc:2', 'doc:1']
+    assert mock_chroma.query.call_args.kwargs['top_k'] == 12
@@ -0,0 +1,211 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from contextlib import nullcontext
+from unittest.mock import Mock
+from backend.db.init_db import create_tables
+from backend.services.ai_service import AIService
+from backend.models.document import Document
+from backend.services.document_store import DocumentStore
+from backend.services.job_queue import IndexingJobQueue
+from backend.services.scheduler import Scheduler
+from backend.tasks.indexing_task import IndexingTask
+
+class FakeEmbedder:
+    """Embeds text as [len(text), 1.0] and records every text it is given."""
+
+    def __init__(self):
+        self.texts = []
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, show_progress_bar=False):
+        self.texts.extend(texts)
+        return np.array([[len(t), 1.0] for t in texts], dtype=np.float32)
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'test.db')
+    create_tables(path)
+    return path
+
+@pytest.fixture
+def document_store(db_path, tmp_path):
+    store = DocumentStore(db_path)
+    for name in ('a', 'b'):
+        path = tmp_path / f'{name}.md'
+        path.write_text('\n\n'.join(f'{name} paragraph {i} ' + 'x' * 200 for i in range(6)))
+        store.save_document(Document(doc_id=f'doc-{name}', source_type='markdown', source_path=str(path)))
+    return store
+
+@pytest.fixture
+def embedder():
+    return FakeEmbedder()
+
+@pytest.fixture
+def scheduler(db_path, document_store, embedder):
+    model_manager = Mock()
+    model_manager.load_embedder.return_value = embedder
+    model_manager.use.side_effect = lambda kind, name: nullcontext(model_manager.load_embedder(name))
+    model_manager.get_model_info.return_value = {'chat_model': {'loaded': False}}
+    gpu_monitor = Mock()
+    gpu_monitor.get_utilization.return_value = 0.0
+    task = IndexingTask(model_manager, Mock(), chunk_size=60, chunk_overlap=0, batch_size=2,
+                        document_store=document_store, window_size=2, deep_store=Mock())
+    return Scheduler(gpu_monitor, model_manager, job_queue=IndexingJobQueue(db_path),
+                     indexing_task=task, document_store=document_store,
+                     websocket_service=Mock(), progress_interval=0.0)
+
+def test_queue_checkpoints_and_recovers(db_path):
+    queue = IndexingJobQueue(db_path)
+    job_id = queue.enqueue(['doc-a', 'doc-b'], 'light', 'deep')
+
+    queue.set_status(job_id, 'running')
+    queue.checkpoint(job_id, 'doc-a', chunks_done=4, chunks_embedded=4)
+    queue.finish_item(job_id, 'doc-b', 'failed', error='boom')
+
+    assert queue.recover_interrupted() == 1
+    job = queue.next_job()
+    assert (job['job_id'], job['status'], job['chunks_embedded']) == (job_id, 'paused', 4)
+    assert job['items_failed'] == 1
+    assert queue.pending_items(job_id) == [{'doc_id': 'doc-a', 'chunks_done': 4}]
+
+def test_cancelled_job_resumes_without_redoing_work(scheduler, embedder, document_store):
+    job_id = scheduler.request_indexing()
+    broadcast = scheduler._websocket_service.broadcast_indexing_progress
+    # Cancel as soon as the first window has been checkpointed
+    broadcast.side_effect = lambda progress: scheduler.cancel_indexing()
+    scheduler._check_conditions()
+
+    queue = scheduler._job_queue
+    assert queue.get_job(job_id)['status'] == 'paused'
+    first_run = list(embedder.texts)
+    assert 0 < queue.pending_items(job_id)[0]['chunks_done'] == len(first_run)
+
+    broadcast.side_effect = None
+    scheduler._last_activity = datetime.now() - timedelta(hours=1)
+    scheduler._check_conditions()
+
+    job = queue.get_job(job_id)
+    assert job['status'] == 'done'
+    assert job['items_done'] == 2
+    # Each chunk was embedded once by the light pass and once by the deep pass, never redone
+    total_chunks = sum(len(document_store.get_chunk_hashes(d)) for d in ('doc-a', 'doc-b'))
+    assert len(embedder.texts) == job['chunks_embedded'] == 2 * total_chunks
+    assert document_store.count_chunks_missing_deep(scheduler._config.embed_deep) == 0
+    progress = broadcast.call_args[0][0]
+    assert progress['status'] == 'done' and progress['phase'] == 'deep'
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def test_gpu_going_idle_wakes_the_scheduler(scheduler):
+    scheduler._gpu_busy = True
+    scheduler.start()
+    try:
+        job_id = scheduler.request_indexing()
+        time.sleep(0.1)
+        assert scheduler._job_queue.get_job(job_id)['status'] == 'pending'
+
+        on_threshold = scheduler._gpu_monitor.add_threshold_listener.call_args[0][1]
+        on_threshold(False)
+
+        assert wait_for(lambda: scheduler._job_queue.get_job(job_id)['status'] == 'done')
+    finally:
+        scheduler.stop()
+
+def test_indexing_parks_for_interactive_requests(scheduler):
+    scheduler._resume_delay_s = 0.05
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        with scheduler.interactive():
+            assert not scheduler._should_index()
+            # A requested run must not turn the wait into a zero-timeout spin
+            scheduler.request_indexing()
+            assert scheduler._sleep_timeout() is None
+            parked = executor.submit(scheduler._yield_to_interactive)
+            time.sleep(0.1)
+            assert not parked.done()
+        # Resumes in place once interactive work has been quiet for resume_delay_s
+        assert parked.result(timeout=1.0) is False
+
+    scheduler._max_pause_s = 0.05
+    with scheduler.interactive():
+        assert scheduler._yield_to_interactive() is True
+
+def test_chat_model_is_warmed_when_the_user_returns(scheduler):
+    on_resume = Mock()
+    scheduler._on_resume = on_resume
+
+    with scheduler.interactive():
+        pass
+    assert not on_resume.called
+
+    scheduler._last_activity = datetime.now() - timedelta(hours=1)
+    with scheduler.interactive():
+        assert on_resume.call_count == 1
+
+    # A run shorter than warm_after_s has not displaced the chat model
+    scheduler._warm_after_s = 60.0
+    scheduler.request_indexing()
+    scheduler._check_conditions()
+    scheduler.record_activity()
+    assert on_resume.call_count == 1
+
+    # A run that embedded for long enough warms it at the end and on the next activity
+    scheduler._warm_after_s = 0.0
+    with open(scheduler._document_store.get_document('doc-a').source_path, 'a') as f:
+        f.write('\n\nnew paragraph ' + 'y' * 200)
+    scheduler.request_indexing(['doc-a'])
+    scheduler._check_conditions()
+    assert on_resume.call_count == 2
+    scheduler.record_activity()
+    assert on_resume.call_count == 3
+
+    # Runs that embed nothing never warm it
+    scheduler.request_indexing()
+    scheduler._check_conditions()
+    scheduler.record_activity()
+    assert on_resume.call_count == 3
+
+def test_background_warm_ups_are_rate_limited():
+    service = AIService(Mock())
+    service.warm_up = Mock()
+    service.warm_up_interval_s = 60.0
+    for _ in range(5):
+        service.warm_up_async()
+    assert wait_for(lambda: service.warm_up.call_count == 1)
+    time.sleep(0.05)
+    assert service.warm_up.call_count == 1
+
+def test_failed_document_is_not_requeued_until_its_source_changes(scheduler, document_store, tmp_path):
+    path = tmp_path / 'gone.md'
+    document_store.save_document(Document(doc_id='doc-gone', source_type='markdown', source_path=str(path)))
+    scheduler._last_activity = datetime.now() - timedelta(hours=1)
+    scheduler._check_conditions()
+
+    job = scheduler._job_queue.get_job(1)
+    assert (job['status'], job['items_done'], job['items_failed']) == ('done', 2, 1)
+    assert scheduler._enqueue_unindexed() is None
+
+    path.write_text('now it exists')
+    assert [doc.doc_id for doc in document_store.list_unindexed_documents('all-MiniLM-L6-v2')] == ['doc-gone']
+
+def test_run_without_progress_backs_off(scheduler, document_store, tmp_path):
+    scheduler._last_activity = datetime.now() - timedelta(hours=1)
+    scheduler._check_conditions()
+    document_store.save_document(Document(doc_id='doc-gone', source_type='markdown',
+                                          source_path=str(tmp_path / 'gone.md')))
+
+    job_id = scheduler.request_indexing(['doc-gone'])
+    scheduler._check_conditions()
+
+    assert scheduler._job_queue.get_job(job_id)['items_failed'] == 1
+    assert not scheduler._work_pending
+    # New documents still wait out the back-off instead of starting a run at once
+    scheduler.notify_documents_changed()
+    with scheduler._lock:
+        assert not scheduler._should_index()
+        assert 0 < scheduler._sleep_timeout() <= scheduler._retry_interval
@@ -0,0 +1,172 @@
+import numpy as np
+import pytest
+from contextlib import nullcontext
+from unittest.mock import Mock
+from backend.db.init_db import create_tables
+from backend.models.document import Document
+from backend.services.document_store import DocumentStore
+from backend.tasks.indexing_task import IndexingTask
+
+class FakeEmbedder:
+    """Embeds text as [len(text), 1.0] and records every batch it is given."""
+
+    def __init__(self):
+        self.batches = []
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, show_progress_bar=False):
+        self.batches.append(list(texts))
+        return np.array([[len(t), 1.0] for t in texts], dtype=np.float32)
+
+@pytest.fixture
+def embedder():
+    return FakeEmbedder()
+
+@pytest.fixture
+def mock_model_manager(embedder):
+    manager = Mock()
+    manager.load_embedder.return_value = embedder
+    manager.use.side_effect = lambda kind, name: nullcontext(manager.load_embedder(name))
+    return manager
+
+@pytest.fixture
+def mock_chroma():
+    return Mock()
+
+@pytest.fixture
+def document(tmp_path):
+    path = tmp_path / 'doc.md'
+    paragraphs = ['x' * (40 * (i % 5 + 1)) for i in range(10)]
+    path.write_text('\n\n'.join(paragraphs))
+    return Document(doc_id='doc-1', source_type='markdown', source_path=str(path))
+
+def test_embeddings_are_batched_by_length(mock_model_manager, mock_chroma, embedder):
+    task = IndexingTask(mock_model_manager, mock_chroma, batch_size=4)
+    texts = ['a' * n for n in (50, 10, 40, 20, 30, 60)]
+
+    embeddings = task._embed_texts(embedder, texts)
+
+    assert [len(b) for b in embedder.batches] == [4, 2]
+    # Each batch holds neighbouring lengths, results come back in input order
+    assert [len(t) for t in embedder.batches[0]] == [10, 20, 30, 40]
+    assert isinstance(embeddings, np.ndarray)
+    assert embeddings[:, 0].tolist() == [50, 10, 40, 20, 30, 60]
+
+def test_cancellation_is_checked_between_batches(mock_model_manager, mock_chroma, embedder):
+    task = IndexingTask(mock_model_manager, mock_chroma, batch_size=2)
+    calls = iter([False, True])
+
+    assert task._embed_texts(embedder, ['a', 'b', 'c', 'd'], lambda: next(calls)) is None
+    assert len(embedder.batches) == 1
+
+def test_process_documents_reports_throughput(mock_model_manager, mock_chroma, document):
+    task = IndexingTask(mock_model_manager, mock_chroma, chunk_size=100, batch_size=8)
+
+    stats = task.process_documents([document], 'all-MiniLM-L6-v2')
+
+    assert stats['documents'] == 1
+    assert stats['chunks_embedded'] > 0
+    assert 'chunks_per_s' in stats
+    upserted = mock_chroma.upsert_chunks.call_args[0][0]
+    assert len(upserted) == stats['chunks_embedded']
+    assert isinstance(upserted[0]['embedding'], np.ndarray)
+
+@pytest.fixture
+def document_store(tmp_path):
+    db_path = str(tmp_path / 'test.db')
+    create_tables(db_path)
+    return DocumentStore(db_path)
+
+def test_reindex_skips_unchanged_documents(mock_model_manager, mock_chroma, embedder,
+                                           document, document_store):
+    task = IndexingTask(mock_model_manager, mock_chroma, chunk_size=100,
+                        document_store=document_store)
+    task.process_documents([document], 'all-MiniLM-L6-v2')
+    embedded = sum(len(b) for b in embedder.batches)
+
+    stats = task.process_documents([document], 'all-MiniLM-L6-v2')
+
+    assert stats['skipped_documents'] == 1
+    assert sum(len(b) for b in embedder.batches) == embedded
+
+def test_reindex_embeds_only_changed_chunks(mock_model_manager, mock_chroma, embedder,
+                                            tmp_path, document_store):
+    path = tmp_path / 'notes.md'
+    path.write_text('alpha ' * 60 + '\n\n' + 'beta ' * 60 + '\n\n' + 'gamma ' * 60)
+    doc = Document(doc_id='doc-2', source_type='markdown', source_path=str(path))
+    task = IndexingTask(mock_model_manager, mock_chroma, chunk_size=100,
+                        document_store=document_store)
+    task.process_documents([doc], 'all-MiniLM-L6-v2')
+    first_ids = set(document_store.get_chunk_hashes('doc-2'))
+
+    # Change the middle paragraph and drop the last one
+    path.write_text('alpha ' * 60 + '\n\n' + 'delta ' * 60)
+    embedder.batches.clear()
+    stats = task.process_documents([doc], 'all-MiniLM-L6-v2')
+
+    assert stats['chunks_embedded'] == 1
+    assert stats['chunks_reused'] == 1
+    assert stats['chunks_deleted'] == 2
+    assert embedder.batches == [['delta ' * 60]]
+    deleted = set(mock_chroma.delete_chunks.call_args[0][0])
+    assert deleted <= first_ids
+    assert len(document_store.get_chunk_hashes('doc-2')) == 2
+
+def test_changing_embedder_reembeds_everything(mock_model_manager, mock_chroma, embedder,
+                                               document, document_store):
+    task = IndexingTask(mock_model_manager, mock_chroma, chunk_size=100,
+                        document_store=document_store)
+    first = task.process_documents([document], 'all-MiniLM-L6-v2')
+    second = task.process_documents([document], 'all-mpnet-base-v2')
+
+    assert second['skipped_documents'] == 0
+    assert second['chunks_embedded'] == first['chunks_embedded']
+    assert second['chunks_reused'] == 0
+
+def test_changing_embedder_removes_chunks_it_no_longer_produces(mock_model_manager, mock_chroma,
+                                                                 document, document_store):
+    IndexingTask(mock_model_manager, mock_chroma, chunk_size=100,
+                 document_store=document_store).process_documents([document], 'all-MiniLM-L6-v2')
+    old_ids = set(document_store.get_chunk_hashes('doc-1'))
+
+    # The new embedder's tokenizer cuts the text at different boundaries
+    stats = IndexingTask(mock_model_manager, mock_chroma, chunk_size=60,
+                         document_store=document_store).process_documents([document], 'all-mpnet-base-v2')
+
+    new_ids = set(document_store.get_chunk_hashes('doc-1'))
+    assert stats['chunks_reused'] == 0
+    assert stats['chunks_deleted'] == len(old_ids - new_ids) > 0
+    assert set(mock_chroma.delete_chunks.call_args[0][0]) == old_ids - new_ids
+
+def test_large_document_is_indexed_in_windows(mock_model_manager, mock_chroma, tmp_path,
+                                              document_store):
+    path = tmp_path / 'transcript.txt'
+    path.write_text('\n\n'.join(f'speaker {i}: ' + 'talk ' * 50 for i in range(25)))
+    doc = Document(doc_id='doc-3', source_type='transcript', source_path=str(path))
+    task = IndexingTask(mock_model_manager, mock_chroma, chunk_size=100, batch_size=4,
+                        document_store=document_store, window_size=10)
+
+    stats = task.process_documents([doc], 'all-MiniLM-L6-v2')
+
+    assert stats['chunks_embedded'] == 25
+    assert [len(call[0][0]) for call in mock_chroma.upsert_chunks.call_args_list] == [10, 10, 5]
+    assert len(document_store.get_chunk_hashes('doc-3')) == 25
+
+def test_interrupted_first_index_resumes_from_checkpoint(mock_model_manager, mock_chroma, embedder,
+                                                         tmp_path, document_store):
+    path = tmp_path / 'transcript.txt'
+    path.write_text('\n\n'.join(f'speaker {i}: ' + 'talk ' * 50 for i in range(25)))
+    doc = Document(doc_id='doc-4', source_type='transcript', source_path=str(path))
+    task = IndexingTask(mock_model_manager, mock_chroma, chunk_size=100,
+                        document_store=document_store, window_size=10)
+    checkpoints = []
+
+    def on_window(doc, chunks_done, embedded):
+        checkpoints.append(chunks_done)
+
+    # Cancel after the first window has been stored
+    first = task.process_documents([doc], 'all-MiniLM-L6-v2', cancel_check=lambda: bool(checkpoints),
+                                   on_window=on_window)
+    assert first['cancelled'] and checkpoints == [10]
+
+    resumed = task.process_documents([doc], 'all-MiniLM-L6-v2', resume={'doc-4': checkpoints[0]})
+    assert (resumed['chunks_reused'], resumed['chunks_embedded']) == (10, 15)
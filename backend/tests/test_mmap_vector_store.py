@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from backend.services.mmap_vector_store import MmapVectorStore
+from backend.services.vector_store import VectorStore, create_vector_store
+
+def _unit(matrix):
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+@pytest.fixture
+def vectors():
+    return _unit(np.random.default_rng(0).standard_normal((300, 16)).astype(np.float32))
+
+def _fill(store, vectors):
+    store.upsert_chunks([{
+        'chroma_id': f'c{i}',
+        'text': f'chunk {i}',
+        'embedding': vector,
+        'metadata': {'doc_id': f'd{i % 3}', 'chunk_index': i}
+    } for i, vector in enumerate(vectors)])
+
+@pytest.mark.parametrize('dtype', ['float16', 'int8'])
+def test_exact_search_matches_brute_force(tmp_path, vectors, dtype):
+    store = MmapVectorStore(str(tmp_path), dtype=dtype)
+    _fill(store, vectors)
+    queries = vectors[:5] + 0.01
+
+    results = store.query_batch(queries, top_k=3)
+    expected = np.argsort(-(_unit(queries) @ vectors.T), axis=1)[:, :3]
+
+    for row, hits in zip(expected, results):
+        assert hits[0]['chroma_id'] == f'c{row[0]}'
+        assert {h['chroma_id'] for h in hits} == {f'c{i}' for i in row}
+    assert results[0][0]['text'] == 'chunk 0'
+    assert results[0][0]['distance'] == pytest.approx(0.0, abs=0.01)
+
+def test_where_filter_and_padding(tmp_path, vectors):
+    store = MmapVectorStore(str(tmp_path))
+    _fill(store, vectors[:4])
+
+    hits = store.query(vectors[0], top_k=5, where={'doc_id': 'd1'})
+    assert [h['chroma_id'] for h in hits] == ['c1']
+
+    arrays = store.query_batch(vectors[:1], top_k=5, where={'doc_id': 'd1'}, as_arrays=True)
+    assert arrays['ids'][0].tolist() == ['c1', None, None, None, None]
+    assert np.isinf(arrays['distances'][0, 1:]).all()
+
+def test_upsert_delete_and_reopen(tmp_path, vectors):
+    store = MmapVectorStore(str(tmp_path))
+    assert isinstance(store, VectorStore)
+    _fill(store, vectors[:10])
+    generation = store.generation
+
+    store.delete_chunks(['c3'])
+    store.upsert_chunks([{'chroma_id': 'c0', 'text': 'moved', 'embedding': vectors[5]}])
+    store.update_metadata(['c1'], [{'doc_id': 'other'}])
+    assert store.generation > generation
+    store.close()
+
+    reopened = MmapVectorStore(str(tmp_path))
+    assert reopened.get_collection_stats()['total_chunks'] == 9
+    assert 'c3' not in [h['chroma_id'] for h in reopened.query(vectors[3], top_k=9)]
+    assert {h['chroma_id'] for h in reopened.query(vectors[5], top_k=2)} == {'c0', 'c5'}
+    assert reopened.query(vectors[1], top_k=1, where={'doc_id': 'other'})[0]['chroma_id'] == 'c1'
+
+    # Freed row is reused rather than growing the index
+    reopened.upsert_chunks([{'chroma_id': 'new', 'text': 'new', 'embedding': vectors[3]}])
+    assert reopened.query(vectors[3], top_k=1)[0]['chroma_id'] == 'new'
+
+def test_ivf_probes_nearest_partitions(tmp_path, vectors):
+    store = MmapVectorStore(str(tmp_path), nprobe=2)
+    _fill(store, vectors)
+    assert store.build_ivf(n_lists=8) == 8
+
+    hits = store.query_batch(vectors[:20], top_k=1)
+    assert [h[0]['chroma_id'] for h in hits] == [f'c{i}' for i in range(20)]
+
+    # Vectors added after the build are assigned to a partition
+    extra = _unit(np.ones((1, 16), dtype=np.float32))
+    store.upsert_chunks([{'chroma_id': 'extra', 'text': 'extra', 'embedding': extra[0]}])
+    assert store.query(extra[0], top_k=1)[0]['chroma_id'] == 'extra'
+    assert MmapVectorStore(str(tmp_path)).get_collection_stats()['ivf_lists'] == 8
+
+def test_factory_rejects_unknown_backend(tmp_path):
+    assert isinstance(create_vector_store('mmap', str(tmp_path)), MmapVectorStore)
+    with pytest.raises(ValueError):
+        create_vector_store('faiss', str(tmp_path))
+
+def test_generation_is_shared_by_instances_of_a_collection(tmp_path):
+    first = MmapVectorStore(str(tmp_path / 'index'))
+    second = MmapVectorStore(str(tmp_path / 'index'))
+    other = MmapVectorStore(str(tmp_path / 'other'))
+
+    before = first.generation
+    second.upsert_chunks([{'chroma_id': 'a', 'text': 'a', 'embedding': [1.0, 0.0]}])
+
+    assert first.generation == second.generation != before
+    assert other.generation == 0
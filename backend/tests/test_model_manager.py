@@ -0,0 +1,72 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+import pytest
+from backend.services.model_manager import EMBEDDER, ModelManager
+
+MB = 2**20
+
+class FakeTensor:
+    def __init__(self, nbytes):
+        self._nbytes = nbytes
+
+    def numel(self):
+        return self._nbytes
+
+    def element_size(self):
+        return 1
+
+class FakeEmbedder:
+    """Stands in for SentenceTransformer; each model's weights are 100 MB."""
+    loads = []
+
+    def __init__(self, name):
+        time.sleep(0.05)
+        FakeEmbedder.loads.append(name)
+        self.name = name
+
+    def parameters(self):
+        return [FakeTensor(100 * MB)]
+
+    def buffers(self):
+        return []
+
+@pytest.fixture(autouse=True)
+def fake_models():
+    FakeEmbedder.loads = []
+    with patch('backend.services.model_manager.SentenceTransformer', FakeEmbedder), \
+         patch('backend.services.model_manager.Ollama', lambda model: object()):
+        yield
+
+def test_concurrent_loads_are_coalesced():
+    manager = ModelManager()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        models = list(executor.map(lambda _: manager.load_embedder('light'), range(8)))
+
+    assert FakeEmbedder.loads == ['light']
+    assert all(model is models[0] for model in models)
+
+def test_switching_models_within_budget_does_not_reload():
+    manager = ModelManager(memory_budget_bytes=250 * MB)
+
+    for name in ('light', 'deep', 'light', 'deep'):
+        manager.load_embedder(name)
+    manager.load_chat_model('llama2')
+
+    assert FakeEmbedder.loads == ['light', 'deep']
+    assert manager.get_model_info()['memory_used_mb'] == 200
+
+def test_eviction_skips_pinned_and_in_use_models():
+    manager = ModelManager(memory_budget_bytes=250 * MB)
+    manager.pin(EMBEDDER, 'light')
+    manager.load_embedder('old')
+
+    with manager.use(EMBEDDER, 'old'):
+        manager.load_embedder('new')
+        # Nothing evictable: the budget is overrun rather than pulling a model from under its user
+        assert {m['name'] for m in manager.get_model_info()['resident']} == {'light', 'old', 'new'}
+
+    manager.load_embedder('newer')
+    resident = {m['name'] for m in manager.get_model_info()['resident']}
+    assert resident == {'light', 'newer'}
@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+from contextlib import nullcontext
+from unittest.mock import Mock
+from datetime import datetime
+from backend.db.init_db import create_tables
+from backend.models.chunk import DocumentChunk
+from backend.models.document import Document
+from backend.services.document_store import DocumentStore
+from backend.services.mmap_vector_store import MmapVectorStore
+from backend.services.rag_service import RAGService
+from backend.services.session_config_store import default_session_config
+from backend.tasks.indexing_task import IndexingTask
+
+@pytest.fixture
+def config():
+    return default_session_config('s').model_copy(update={'top_k': 2, 'embed_deep': 'deep'})
+
+@pytest.fixture
+def embedders():
+    light, deep = Mock(), Mock()
+    light.encode.return_value = np.array([1.0, 0.0], dtype=np.float32)
+    deep.encode.return_value = np.array([0.0, 1.0], dtype=np.float32)
+    return {'all-MiniLM-L6-v2': light, 'deep': deep}
+
+@pytest.fixture
+def model_manager(embedders):
+    manager = Mock()
+    manager.load_embedder.side_effect = lambda name: embedders[name]
+    manager.use.side_effect = lambda kind, name: nullcontext(manager.load_embedder(name))
+    return manager
+
+@pytest.fixture
+def light_store():
+    store = Mock()
+    store.generation = 0
+    store.query.return_value = [
+        {'chroma_id': f'c{i}', 'text': f'chunk {i}', 'distance': 0.1 * i} for i in range(4)
+    ]
+    return store
+
+@pytest.fixture
+def deep_store(tmp_path):
+    store = MmapVectorStore(str(tmp_path / 'deep'))
+    # c2 is closest to the deep query vector, then c1; c3 has no deep vector yet
+    store.upsert_chunks([
+        {'chroma_id': 'c0', 'text': '', 'embedding': [1.0, 0.0]},
+        {'chroma_id': 'c1', 'text': '', 'embedding': [1.0, 1.0]},
+        {'chroma_id': 'c2', 'text': '', 'embedding': [0.1, 1.0]},
+    ])
+    return store
+
+@pytest.fixture
+def document_store(tmp_path):
+    db_path = str(tmp_path / 'test.db')
+    create_tables(db_path)
+    store = DocumentStore(db_path)
+    store.save_document(Document(doc_id='doc', source_type='text', source_path='doc.txt'))
+    store.upsert_chunks([
+        DocumentChunk(chunk_id=f'c{i}', doc_id='doc', chunk_index=i, text=f'chunk {i}',
+                      chroma_id=f'c{i}', created_at=datetime.now())
+        for i in range(4)
+    ])
+    store.mark_deep_embedded(['c0', 'c1', 'c2'], 'deep')
+    return store
+
+def test_candidates_are_reranked_with_deep_vectors(model_manager, embedders, light_store,
+                                                   deep_store, document_store, config):
+    rag = RAGService(model_manager, light_store, document_store=document_store,
+                     deep_store=deep_store)
+
+    chunks = rag._retrieve_relevant_chunks('question', config)
+    rag._retrieve_relevant_chunks('question', config)
+
+    assert [c['chroma_id'] for c in chunks] == ['c2', 'c1']
+    assert chunks[0]['deep_distance'] < chunks[1]['deep_distance']
+    # The first stage fetches a wide candidate set
+    assert light_store.query.call_args.kwargs['top_k'] == 8
+    # One deep encode, reused for the repeated query
+    assert embedders['deep'].encode.call_count == 1
+
+def test_chunks_without_deep_vectors_keep_stage_one_order(model_manager, light_store,
+                                                          deep_store, document_store, config):
+    rag = RAGService(model_manager, light_store, document_store=document_store,
+                     deep_store=deep_store)
+    chunks = rag._rerank('question', config, light_store.query.return_value)
+    assert [c['chroma_id'] for c in chunks] == ['c2', 'c1', 'c0', 'c3']
+
+def test_vectors_from_another_deep_model_are_not_compared(model_manager, embedders, light_store,
+                                                          deep_store, document_store, config):
+    # The session asks for a deep model with a different dimension than the stored vectors
+    embedders['other'] = Mock()
+    embedders['other'].encode.return_value = np.array([0.0, 1.0, 0.0], dtype=np.float32)
+    rag = RAGService(model_manager, light_store, document_store=document_store,
+                     deep_store=deep_store)
+
+    candidates = light_store.query.return_value
+    chunks = rag._rerank('question', config.model_copy(update={'embed_deep': 'other'}), candidates)
+
+    assert chunks == candidates
+
+def test_embed_deep_fills_missing_vectors_and_resumes(tmp_path, deep_store):
+    db_path = str(tmp_path / 'test.db')
+    create_tables(db_path)
+    document_store = DocumentStore(db_path)
+    path = tmp_path / 'doc.md'
+    path.write_text('\n\n'.join(f'Paragraph number {i}. ' * 20 for i in range(6)))
+
+    embedder = Mock(spec=['encode'])
+    embedder.encode.side_effect = lambda texts, **kwargs: np.ones((len(texts), 2), dtype=np.float32)
+    manager = Mock()
+    manager.load_embedder.return_value = embedder
+    manager.use.side_effect = lambda kind, name: nullcontext(manager.load_embedder(name))
+    task = IndexingTask(manager, Mock(), chunk_size=100, document_store=document_store,
+                        window_size=2, deep_store=deep_store)
+    task.process_documents([Document(doc_id='doc', source_type='markdown', source_path=str(path))],
+                           'light')
+    chunk_ids = list(document_store.get_chunk_hashes('doc'))
+
+    calls = iter([False, True])
+    cancelled = task.embed_deep('deep', cancel_check=lambda: next(calls, True))
+    assert cancelled['cancelled'] and cancelled['chunks_embedded'] == 2
+
+    finished = task.embed_deep('deep')
+    assert finished['chunks_embedded'] == len(chunk_ids) - 2
+    assert set(deep_store.get_embeddings(chunk_ids)) == set(chunk_ids)
+    assert task.embed_deep('deep')['chunks_embedded'] == 0
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from contextlib import nullcontext
+from unittest.mock import Mock
+from backend.services.rag_service import RAGService
+from backend.services.session_config_store import default_session_config
+from backend.utils.lru_cache import LRUCache
+
+@pytest.fixture
+def embedder():
+    embedder = Mock()
+    embedder.encode.return_value = np.array([0.1, 0.2, 0.3], dtype=np.float32)
+    return embedder
+
+@pytest.fixture
+def mock_model_manager(embedder):
+    manager = Mock()
+    manager.load_embedder.return_value = embedder
+    manager.use.side_effect = lambda kind, name: nullcontext(manager.load_embedder(name))
+    return manager
+
+@pytest.fixture
+def mock_chroma():
+    chroma = Mock()
+    chroma.generation = 0
+    chroma.shared = False
+    chroma.query.return_value = [{'chroma_id': 'doc:1', 'text': 'relevant context', 'distance': 0.1}]
+    return chroma
+
+@pytest.fixture
+def rag_service(mock_model_manager, mock_chroma):
+    return RAGService(mock_model_manager, mock_chroma)
+
+@pytest.fixture
+def config():
+    return default_session_config('test-session')
+
+def test_repeat_query_hits_both_caches(rag_service, embedder, mock_chroma, config):
+    first = rag_service._retrieve_relevant_chunks('What is RAG?', config)
+    second = rag_service._retrieve_relevant_chunks('  What is   RAG? ', config)
+
+    assert first == second
+    assert embedder.encode.call_count == 1
+    assert mock_chroma.query.call_count == 1
+
+def test_query_case_is_part_of_the_key(rag_service, embedder, config):
+    rag_service._retrieve_relevant_chunks('What is RAG?', config)
+    rag_service._retrieve_relevant_chunks('what is rag?', config)
+    assert embedder.encode.call_count == 2
+
+def test_shared_store_results_are_not_cached(rag_service, mock_chroma, config):
+    # Writes from other processes never bump this process's generation
+    mock_chroma.shared = True
+    rag_service._retrieve_relevant_chunks('What is RAG?', config)
+    rag_service._retrieve_relevant_chunks('What is RAG?', config)
+    assert mock_chroma.query.call_count == 2
+
+def test_collection_change_invalidates_results(rag_service, embedder, mock_chroma, config):
+    rag_service._retrieve_relevant_chunks('What is RAG?', config)
+    mock_chroma.generation += 1
+    rag_service._retrieve_relevant_chunks('What is RAG?', config)
+
+    assert embedder.encode.call_count == 1
+    assert mock_chroma.query.call_count == 2
+
+def test_top_k_and_filter_are_part_of_the_key(rag_service, mock_chroma, config):
+    rag_service._retrieve_relevant_chunks('q', config)
+    rag_service._retrieve_relevant_chunks('q', config.model_copy(update={'top_k': 10}))
+    rag_service._retrieve_relevant_chunks('q', config, where={'doc_id': 'a'})
+    assert mock_chroma.query.call_count == 3
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
@@ -0,0 +1,39 @@
+import pytest
+from backend.database import Database
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / 'test.db'))
+    database.create_session('chat-a', 'Deploy notes')
+    database.create_session('chat-b', 'Recipes')
+    database.add_message('chat-a', 'user', 'The deployment failed with error E1234 on staging')
+    database.add_message('chat-a', 'ai', 'Check the staging logs for E1234 first')
+    database.add_message('chat-b', 'user', 'How long should I bake sourdough bread?')
+    return database
+
+def test_search_returns_ranked_hits_with_snippets(db):
+    results = db.search_messages('E1234')
+    assert results['total'] == 2
+    assert {hit['session_id'] for hit in results['hits']} == {'chat-a'}
+    assert all('<mark>' in hit['snippet'] for hit in results['hits'])
+    assert results['hits'][0]['session_title'] == 'Deploy notes'
+
+def test_search_prefix_matches_last_term(db):
+    results = db.search_messages('sourd')
+    assert results['total'] == 1
+    assert results['hits'][0]['session_id'] == 'chat-b'
+
+def test_search_pagination(db):
+    first = db.search_messages('staging', limit=1, offset=0)
+    second = db.search_messages('staging', limit=1, offset=1)
+    assert first['total'] == 2
+    assert len(first['hits']) == 1 and len(second['hits']) == 1
+    assert first['hits'][0]['message_id'] != second['hits'][0]['message_id']
+
+def test_search_index_follows_deletes(db):
+    db.delete_session('chat-a')
+    assert db.search_messages('E1234')['total'] == 0
+
+def test_search_ignores_fts_syntax(db):
+    assert db.search_messages('"unbalanced AND (')['total'] == 0
+    assert db.search_messages('***') == {'total': 0, 'hits': []}
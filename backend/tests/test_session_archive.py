@@ -0,0 +1,105 @@
+import sqlite3
+import pytest
+from backend.database import Database
+from backend.services.session_archiver import SessionArchiver
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / 'test.db'))
+    database.create_session('chat-old', 'Old')
+    for i in range(3):
+        database.add_message('chat-old', 'user', f'old question {i}')
+        database.add_message('chat-old', 'ai', f'old answer {i}')
+    database.create_session('chat-new', 'New')
+    database.add_message('chat-new', 'user', 'fresh question')
+    return database
+
+def hot_message_count(db, session_id):
+    with sqlite3.connect(db.db_path) as conn:
+        return conn.execute(
+            'SELECT COUNT(*) FROM messages WHERE session_id = ?', (session_id,)
+        ).fetchone()[0]
+
+def test_idle_sessions_are_archived(db):
+    expected = db.get_messages('chat-old')
+    # Backdate so only the old session is past the threshold
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("UPDATE sessions SET updated_at = '2000-01-01 00:00:00' WHERE id = 'chat-old'")
+
+    assert db.archive_idle_sessions(idle_seconds=3600) == ['chat-old']
+    assert hot_message_count(db, 'chat-old') == 0
+    assert hot_message_count(db, 'chat-new') == 1
+    # Listing is unaffected and reads fault the session back in
+    assert {s['id'] for s in db.get_sessions()} == {'chat-old', 'chat-new'}
+    assert db.get_messages('chat-old') == expected
+    assert hot_message_count(db, 'chat-old') == 6
+
+def test_add_message_to_archived_session_keeps_order(db):
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("UPDATE sessions SET updated_at = '2000-01-01 00:00:00' WHERE id = 'chat-old'")
+    db.archive_idle_sessions(idle_seconds=3600)
+
+    db.add_message('chat-old', 'user', 'back again')
+    texts = [m['text'] for m in db.get_messages('chat-old')]
+    assert texts[0] == 'old question 0'
+    assert texts[-1] == 'back again'
+    assert len(texts) == 7
+
+def test_export_includes_archived_sessions(db):
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("UPDATE sessions SET updated_at = '2000-01-01 00:00:00' WHERE id = 'chat-old'")
+    db.archive_idle_sessions(idle_seconds=3600)
+
+    records = list(db.iter_export(['chat-old']))
+    assert len([r for r in records if r['record'] == 'message']) == 6
+    assert hot_message_count(db, 'chat-old') == 0
+
+def test_delete_removes_archive(db):
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("UPDATE sessions SET updated_at = '2000-01-01 00:00:00' WHERE id = 'chat-old'")
+    db.archive_idle_sessions(idle_seconds=3600)
+    db.delete_session('chat-old')
+    assert db.get_messages('chat-old') == []
+    assert db.search_messages('old question')['total'] == 0
+
+def test_reading_an_archived_session_keeps_it_hot(db):
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("UPDATE sessions SET updated_at = '2000-01-01 00:00:00' WHERE id = 'chat-old'")
+    db.archive_idle_sessions(idle_seconds=3600)
+
+    db.get_messages('chat-old')
+    assert db.archive_idle_sessions(idle_seconds=3600) == []
+    assert hot_message_count(db, 'chat-old') == 6
+
+def test_archived_messages_stay_searchable(db):
+    hot_hits = db.search_messages('answer')['hits']
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("UPDATE sessions SET updated_at = '2000-01-01 00:00:00' WHERE id = 'chat-old'")
+    db.archive_idle_sessions(idle_seconds=3600)
+
+    results = db.search_messages('answer')
+    assert results['total'] == 3
+    assert [(h['message_id'], h['session_id'], h['type']) for h in results['hits']] == \
+        [(h['message_id'], h['session_id'], h['type']) for h in hot_hits]
+    assert all('<mark>answer</mark>' in hit['snippet'] for hit in results['hits'])
+    assert hot_message_count(db, 'chat-old') == 0
+
+    # Restoring keeps message ids, so the index holds each message exactly once
+    db.get_messages('chat-old')
+    assert db.search_messages('answer')['total'] == 3
+    assert db.search_messages('old')['total'] == 6
+
+def test_archiver_evicts_cached_history(db):
+    class FakeStore:
+        def __init__(self):
+            self.invalidated = []
+
+        def invalidate(self, chat_id=None):
+            self.invalidated.append(chat_id)
+
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("UPDATE sessions SET updated_at = '2000-01-01 00:00:00'")
+    store = FakeStore()
+    archiver = SessionArchiver(db, conversation_store=store, idle_threshold_s=3600, batch_size=1)
+    assert sorted(archiver.run_once()) == ['chat-new', 'chat-old']
+    assert sorted(store.invalidated) == ['chat-new', 'chat-old']
@@ -0,0 +1,59 @@
+import sqlite3
+import pytest
+from unittest.mock import Mock
+from backend.db.init_db import create_tables
+from backend.services.session_config_store import SessionConfigStore
+
+@pytest.fixture
+def websocket_service():
+    return Mock()
+
+@pytest.fixture
+def store(tmp_path, websocket_service):
+    db_path = str(tmp_path / 'test.db')
+    create_tables(db_path)
+    return SessionConfigStore(db_path, websocket_service=websocket_service)
+
+def test_get_unknown_session_returns_defaults(store):
+    config = store.get('chat-a')
+    assert config.session_id == 'chat-a'
+    assert config.thinking_mode == store.default_config.thinking_mode
+
+def test_get_is_served_from_cache(store):
+    first = store.get('chat-a')
+    assert store.get('chat-a') is first
+
+def test_update_persists_and_broadcasts(store, websocket_service):
+    store.update('chat-a', {'top_k': 10, 'thinking_mode': 'rag'})
+
+    websocket_service.broadcast_config_update.assert_called_once()
+    session_id, payload = websocket_service.broadcast_config_update.call_args[0]
+    assert session_id == 'chat-a'
+    assert payload['top_k'] == 10
+
+    # A fresh store reads the persisted row
+    reloaded = SessionConfigStore(store._db_path)
+    assert reloaded.get('chat-a').top_k == 10
+    assert reloaded.get('chat-a').thinking_mode == 'rag'
+
+def test_update_replaces_cached_config(store):
+    before = store.get('chat-a')
+    store.update('chat-a', {'top_k': 7})
+    assert store.get('chat-a') is not before
+    assert store.get('chat-a').top_k == 7
+
+def test_invalid_update_is_rejected_and_not_saved(store, websocket_service):
+    with pytest.raises(ValueError):
+        store.update('chat-a', {'thinking_mode': 'invalid'})
+    websocket_service.broadcast_config_update.assert_not_called()
+    with sqlite3.connect(store._db_path) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM session_config').fetchone()[0] == 0
+
+def test_invalidate_rereads_database(store):
+    store.create('chat-a', model_name='mistral')
+    with sqlite3.connect(store._db_path) as conn:
+        conn.execute("UPDATE session_config SET top_k = 3 WHERE session_id = 'chat-a'")
+    assert store.get('chat-a').top_k != 3
+    store.invalidate('chat-a')
+    assert store.get('chat-a').top_k == 3
+    assert store.get('chat-a').model_name == 'mistral'
@@ -0,0 +1,74 @@
+import re
+import pytest
+from backend.utils.text_chunker import TextChunker
+
+class WhitespaceTokenizer:
+    """Minimal stand-in for a fast tokenizer: one token per whitespace-separated word."""
+
+    def __call__(self, texts, add_special_tokens=False, return_offsets_mapping=False):
+        if isinstance(texts, str):
+            spans = [m.span() for m in re.finditer(r'\S+', texts)]
+            result = {'input_ids': list(range(len(spans)))}
+            if return_offsets_mapping:
+                result['offset_mapping'] = spans
+            return result
+        return {'input_ids': [list(range(len(t.split()))) for t in texts]}
+
+@pytest.fixture
+def tokenizer():
+    return WhitespaceTokenizer()
+
+def words(n, word='word'):
+    return ' '.join(f'{word}{i}' for i in range(n))
+
+def test_small_paragraphs_are_packed_together(tokenizer):
+    chunker = TextChunker(tokenizer, chunk_size=20, overlap=0)
+    chunks = list(chunker.iter_chunks([words(5, 'a'), words(5, 'b'), words(15, 'c')]))
+    assert chunks == [words(5, 'a') + '\n\n' + words(5, 'b'), words(15, 'c')]
+
+def test_long_paragraph_splits_at_sentences(tokenizer):
+    chunker = TextChunker(tokenizer, chunk_size=10, overlap=0)
+    paragraph = ' '.join(f'Sentence {i} has five words.' for i in range(4))
+    chunks = list(chunker.iter_chunks([paragraph]))
+    assert chunks == [
+        'Sentence 0 has five words. Sentence 1 has five words.',
+        'Sentence 2 has five words. Sentence 3 has five words.'
+    ]
+
+def test_long_sentence_is_cut_into_token_windows(tokenizer):
+    chunker = TextChunker(tokenizer, chunk_size=10, overlap=0)
+    chunks = list(chunker.iter_chunks([words(25)]))
+    assert [len(c.split()) for c in chunks] == [10, 10, 5]
+    assert ' '.join(chunks) == words(25)
+
+def test_overlap_repeats_trailing_sentences(tokenizer):
+    chunker = TextChunker(tokenizer, chunk_size=12, overlap=4)
+    paragraph = ' '.join(f'S{i} one two three.' for i in range(4))
+    chunks = list(chunker.iter_chunks([paragraph]))
+    assert chunks[0].endswith('S2 one two three.')
+    assert chunks[1].startswith('S2 one two three.')
+
+def test_chunks_never_exceed_model_max_length(tokenizer):
+    chunker = TextChunker(tokenizer, chunk_size=500, overlap=10, max_tokens=30)
+    text = [words(100), ' '.join(f'Short sentence {i}.' for i in range(40))]
+    chunks = list(chunker.iter_chunks(text))
+    assert chunker.limit == 30
+    assert all(len(c.split()) <= 30 for c in chunks)
+
+def test_falls_back_to_character_estimate_without_tokenizer():
+    chunker = TextChunker(None, chunk_size=10, overlap=0)
+    chunks = list(chunker.iter_chunks(['x' * 100]))
+    assert all(len(c) <= 40 for c in chunks)
+    assert ''.join(chunks) == 'x' * 100
+
+def test_tokenizer_calls_are_bounded_by_characters(monkeypatch, tokenizer):
+    monkeypatch.setattr('backend.utils.text_chunker.TOKENIZE_CHARS', 100)
+    calls = []
+    chunker = TextChunker(tokenizer, chunk_size=50, overlap=0)
+    original = chunker.count_tokens
+    monkeypatch.setattr(chunker, 'count_tokens', lambda texts: calls.append(texts) or original(texts))
+
+    list(chunker.iter_chunks([words(6)] * 10))
+
+    assert all(sum(len(text) for text in batch) <= 100 for batch in calls)
+    assert sum(len(batch) for batch in calls) == 10
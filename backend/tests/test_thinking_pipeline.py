@@ -0,0 +1,125 @@
+import time
+import numpy as np
+import pytest
+from contextlib import nullcontext
+from unittest.mock import Mock
+from backend.services.model_manager import CHAT
+from backend.services.rag_service import RAGService
+from backend.services.session_config_store import default_session_config
+
+class FakeChatModel:
+    """Streams scripted thoughts piece by piece, then the answer, and records what was consumed."""
+
+    def __init__(self, thoughts, answer='final answer', delay=0.0):
+        self.thoughts = list(thoughts)
+        self.answer = answer
+        self.delay = delay
+        self.prompts = []
+        self.pieces_streamed = 0
+
+    def stream(self, prompt):
+        self.prompts.append(prompt)
+        for piece in self.thoughts.pop(0) if self.thoughts else [self.answer]:
+            time.sleep(self.delay)
+            self.pieces_streamed += 1
+            yield piece
+
+    def __call__(self, prompt):
+        self.prompts.append(prompt)
+        return self.answer
+
+@pytest.fixture
+def mock_model_manager():
+    embedder = Mock()
+    embedder.encode.return_value = np.array([0.1, 0.2], dtype=np.float32)
+    manager = Mock()
+    manager.load_embedder.return_value = embedder
+    manager.use.side_effect = lambda kind, name: nullcontext(
+        manager.load_chat_model(name) if kind == CHAT else manager.load_embedder(name)
+    )
+    return manager
+
+@pytest.fixture
+def mock_chroma():
+    chroma = Mock()
+    chroma.generation = 0
+    chroma.query.return_value = [{'chroma_id': 'c1', 'text': 'relevant context', 'distance': 0.1}]
+    chroma.get_embeddings.return_value = {}
+    return chroma
+
+def test_thought_stops_at_conclusion_marker_mid_stream(mock_model_manager, mock_chroma):
+    model = FakeChatModel([['First ', 'we add. ', 'There', 'fore it is 4. ', 'More ', 'text ', 'never read']])
+    mock_model_manager.load_chat_model.return_value = model
+    rag = RAGService(mock_model_manager, mock_chroma)
+
+    answer = rag.generate_response('s', 'what is 2+2?', default_session_config('s'))
+
+    assert answer == 'final answer'
+    # Marker split across pieces is still found, and streaming stops right there
+    assert model.pieces_streamed == 4
+    assert 'Therefore it is 4.' in model.prompts[-1] and 'never read' not in model.prompts[-1]
+    assert 'relevant context' in model.prompts[0]
+
+def test_thought_ends_with_the_sentence_holding_the_marker(mock_model_manager, mock_chroma):
+    model = FakeChatModel([['We add. Therefore', ' the sum', ' is 4.', ' More', ' never read']])
+    rag = RAGService(mock_model_manager, mock_chroma)
+
+    thought, concluded = rag._stream_thought(model, 'what is 2+2?', 256, time.monotonic() + 5)
+
+    assert concluded
+    assert thought == 'We add. Therefore the sum is 4.'
+    assert model.pieces_streamed == 4
+
+def test_scratchpad_keeps_recent_thoughts_within_budget(mock_model_manager, mock_chroma):
+    thoughts = [['a' * 400], ['b' * 400], ['c' * 400]]
+    model = FakeChatModel(thoughts)
+    mock_model_manager.load_chat_model.return_value = model
+    rag = RAGService(mock_model_manager, mock_chroma, scratchpad_tokens=150)
+
+    rag.generate_response('s', 'question', default_session_config('s').model_copy(update={'thinking_mode': 'cot'}))
+
+    final_prompt = model.prompts[-1]
+    assert 'c' * 400 in final_prompt
+    assert 'a' * 400 not in final_prompt
+
+def test_deadline_degrades_to_direct_answer(mock_model_manager, mock_chroma):
+    model = FakeChatModel([['slow '] * 100], delay=0.01)
+    mock_model_manager.load_chat_model.return_value = model
+    rag = RAGService(mock_model_manager, mock_chroma, deadline_s=0.05)
+
+    started = time.monotonic()
+    answer = rag.generate_response('s', 'question', default_session_config('s'))
+
+    assert answer == 'final answer'
+    assert time.monotonic() - started < 0.5
+    assert model.pieces_streamed < 100
+
+def test_thought_length_has_its_own_cap(mock_model_manager, mock_chroma):
+    model = FakeChatModel([['word ' * 10] * 50])
+    mock_model_manager.load_chat_model.return_value = model
+    rag = RAGService(mock_model_manager, mock_chroma, scratchpad_tokens=1000, thought_tokens=20)
+
+    rag.generate_response('s', 'question', default_session_config('s').model_copy(update={'thinking_mode': 'cot'}))
+
+    assert model.pieces_streamed < 50
+
+def test_slow_model_load_is_bounded_by_the_deadline(mock_model_manager, mock_chroma):
+    def slow_load(name):
+        time.sleep(0.3)
+        return FakeChatModel([])
+    mock_model_manager.load_chat_model.side_effect = slow_load
+    rag = RAGService(mock_model_manager, mock_chroma, deadline_s=0.05)
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        rag.generate_response('s', 'question', default_session_config('s'))
+    assert time.monotonic() - started < 0.25
+
+def test_answer_after_the_deadline_is_bounded(mock_model_manager, mock_chroma):
+    model = FakeChatModel([['slow '] * 100, ['word '] * 1000], delay=0.001)
+    mock_model_manager.load_chat_model.return_value = model
+    rag = RAGService(mock_model_manager, mock_chroma, deadline_s=0.05, answer_tokens=50)
+
+    answer = rag.generate_response('s', 'question', default_session_config('s'))
+
+    assert answer.startswith('word ') and len(answer) < len('word ' * 1000)
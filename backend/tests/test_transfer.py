@@ -0,0 +1,65 @@
+import io
+import pytest
+from backend.database import Database
+from backend.db.transfer import export_conversations, import_conversations
+
+@pytest.fixture
+def source_db(tmp_path):
+    database = Database(str(tmp_path / 'source.db'))
+    database.create_session('chat-a', 'First')
+    database.create_session('chat-b', 'Second')
+    for i in range(5):
+        database.add_message('chat-a', 'user', f'question {i}')
+        database.add_message('chat-a', 'ai', f'answer {i}')
+    database.add_message('chat-b', 'user', 'hello')
+    return database
+
+def test_export_import_round_trip(source_db, tmp_path):
+    buffer = io.StringIO()
+    export_conversations(source_db, buffer)
+
+    target = Database(str(tmp_path / 'target.db'))
+    buffer.seek(0)
+    counts = import_conversations(target, buffer, batch_size=3)
+
+    assert counts == {'sessions': 2, 'messages': 11, 'skipped_sessions': 0, 'skipped_messages': 0}
+    assert target.get_messages('chat-a') == source_db.get_messages('chat-a')
+    assert {s['id'] for s in target.get_sessions()} == {'chat-a', 'chat-b'}
+    # Imported messages are searchable straight away
+    assert target.search_messages('hello')['total'] == 1
+
+def test_export_selected_sessions(source_db):
+    records = list(source_db.iter_export(['chat-b']))
+    assert [r['record'] for r in records] == ['session', 'message']
+    assert records[1]['text'] == 'hello'
+
+def test_import_rolls_back_on_bad_line(source_db, tmp_path):
+    target = Database(str(tmp_path / 'target.db'))
+    source = io.StringIO(
+        '{"record": "session", "id": "chat-x", "title": "X"}\n'
+        '{"record": "message", "session_id": "chat-x", "type": "user", "text": "hi"}\n'
+        'not json\n'
+    )
+    with pytest.raises(ValueError):
+        import_conversations(target, source, batch_size=1)
+    assert target.get_sessions() == []
+
+def test_reimport_skips_existing_sessions_and_their_messages(source_db):
+    buffer = io.StringIO()
+    export_conversations(source_db, buffer)
+    buffer.seek(0)
+
+    counts = import_conversations(source_db, buffer)
+
+    assert counts == {'sessions': 0, 'messages': 0, 'skipped_sessions': 2, 'skipped_messages': 11}
+    assert len(source_db.get_messages('chat-a')) == 10
+    assert len(source_db.get_messages('chat-b')) == 1
+
+def test_import_rejects_messages_for_unknown_sessions(source_db):
+    source = io.StringIO(
+        '{"record": "message", "session_id": "chat-b", "type": "ai", "text": "appended"}\n'
+        '{"record": "message", "session_id": "chat-nowhere", "type": "user", "text": "orphan"}\n'
+    )
+    with pytest.raises(ValueError, match='unknown session'):
+        import_conversations(source_db, source)
+    assert len(source_db.get_messages('chat-b')) == 1
@@ -0,0 +1,50 @@
+import hashlib
+import os
+from typing import Iterator
+
+DEFAULT_BLOCK_SIZE = 1 << 20  # 1 MiB
+
+def hash_file(path: str, block_size: int = DEFAULT_BLOCK_SIZE) -> str:
+    """SHA-256 of a file, read in fixed-size blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def source_fingerprint(path: str) -> str:
+    """Size and modification time of a file, or 'missing'; changes whenever the file does."""
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return 'missing'
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+def iter_paragraphs(path: str,
+                    block_size: int = DEFAULT_BLOCK_SIZE,
+                    max_paragraph_chars: int = 4 * DEFAULT_BLOCK_SIZE
+                    ) -> Iterator[str]:
+    """Yield blank-line separated paragraphs from a text file without loading it whole.
+
+    The file is read incrementally, so memory is bounded by the block size plus
+    the longest paragraph. Paragraphs longer than max_paragraph_chars (e.g. a
+    log with no blank lines) are emitted in pieces, split at a line break
+    where possible.
+    """
+    buffer = ''
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for block in iter(lambda: f.read(block_size), ''):
+            buffer += block
+            parts = buffer.split('\n\n')
+            buffer = parts.pop()
+            yield from parts
+
+            while len(buffer) > max_paragraph_chars:
+                cut = buffer.rfind('\n', 0, max_paragraph_chars)
+                if cut <= 0:
+                    cut = max_paragraph_chars
+                yield buffer[:cut]
+                buffer = buffer[cut:].lstrip('\n')
+
+    if buffer:
+        yield buffer
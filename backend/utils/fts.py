@@ -0,0 +1,87 @@
+import re
+import unicodedata
+from typing import List
+
+# Words that carry no lexical signal; dropped from OR queries so they do not
+# match (and force scoring of) nearly every row.
+STOPWORDS = frozenset("""
+a about an and are as at be but by can could did do does for from had has have how i if in
+into is it its me my no not of on or our please should so than that the their them then there
+these they this those to was we were what when where which who why will with would you your
+""".split())
+
+_TERM = re.compile(r'\w+', flags=re.UNICODE)
+# Whole whitespace-delimited tokens that look like ids, codes or symbols
+_IDENTIFIER = re.compile(r'^(?=.*\d)[\w.:/-]+$|^[A-Z][A-Z0-9]+$|^\w+[_.:/-][\w.:/-]+$')
+
+def terms(text: str) -> List[str]:
+    """Split text into the word terms the unicode61 tokenizer would index."""
+    return _TERM.findall(text)
+
+def match_all_terms(text: str, prefix_last: bool = True) -> str:
+    """FTS5 query matching rows that contain every term; the last may be a prefix."""
+    words = terms(text)
+    if not words:
+        return ''
+    quoted = [f'"{word}"' for word in words]
+    if prefix_last:
+        quoted[-1] += '*'
+    return ' '.join(quoted)
+
+def match_any_term(text: str) -> str:
+    """FTS5 query matching rows that contain any non-stopword term, for BM25 ranking."""
+    words = [w for w in terms(text) if w.lower() not in STOPWORDS] or terms(text)
+    return ' OR '.join(f'"{word}"' for word in dict.fromkeys(words))
+
+def identifier_tokens(text: str) -> List[str]:
+    """Tokens that look like identifiers or error codes (E1234, user_id, v2.1, HTTP)."""
+    return [token for token in (t.strip('"\'()[],;?!') for t in text.split())
+            if token and _IDENTIFIER.match(token)]
+
+def is_keyword_query(text: str) -> bool:
+    """True when exact terms dominate the query, so lexical matching alone can answer it."""
+    if '"' in text:
+        return True
+    content = [w for w in terms(text) if w.lower() not in STOPWORDS]
+    identifiers = identifier_tokens(text)
+    return bool(identifiers) and len(identifiers) * 3 >= len(content)
+
+def _fold(word: str) -> str:
+    """Case- and diacritic-fold a term the way unicode61 remove_diacritics 2 does."""
+    decomposed = unicodedata.normalize('NFKD', word.casefold())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+def highlight_snippet(text: str, query: str, start: str = '<mark>', end: str = '</mark>',
+            ellipsis: str = '…', max_tokens: int = 16) -> str:
+    """Highlight query terms in text like FTS5 snippet(), for rows the index cannot read back.
+
+    Follows match_all_terms: every term matches whole words except the last,
+    which also matches as a prefix. The window starts a few tokens before the
+    first match.
+    """
+    words = [_fold(word) for word in terms(query)]
+    tokens = list(_TERM.finditer(text))
+    if not tokens:
+        return text
+
+    def matches(token: str) -> bool:
+        folded = _fold(token)
+        return folded in words[:-1] or bool(words) and folded.startswith(words[-1])
+
+    hits = [i for i, token in enumerate(tokens) if matches(token.group())]
+    first = max(0, min(hits[0] - max_tokens // 4, len(tokens) - max_tokens)) if hits else 0
+    window = tokens[first:first + max_tokens]
+    parts = [ellipsis] if first > 0 else []
+    position = window[0].start()
+    for token in window:
+        parts.append(text[position:token.start()])
+        if matches(token.group()):
+            parts.append(f'{start}{token.group()}{end}')
+        else:
+            parts.append(token.group())
+        position = token.end()
+    if first + max_tokens < len(tokens):
+        parts.append(ellipsis)
+    else:
+        parts.append(text[position:])
+    return ''.join(parts)
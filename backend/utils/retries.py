@@ -0,0 +1,57 @@
+import logging
+import random
+import time
+from typing import Callable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+_TRANSIENT_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+_TRANSIENT_NAMES = ('timeout', 'connect', 'remoteprotocol', 'readerror', 'writeerror')
+
+def _status_code(error: BaseException) -> Optional[int]:
+    """HTTP status carried by an error or its response (httpx, requests, aiohttp), if any."""
+    for holder in (error, getattr(error, 'response', None)):
+        for attr in ('status_code', 'status'):
+            value = getattr(holder, attr, None)
+            if isinstance(value, int):
+                return value
+    return None
+
+def is_transient(error: Exception) -> bool:
+    """Errors worth retrying: dropped connections, timeouts, overload and gateway statuses.
+
+    Decided from the exception type and status attribute, following the
+    explicit cause chain, never from the message text.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, (ConnectionError, TimeoutError)):
+            return True
+        name = type(error).__name__.lower()
+        if any(part in name for part in _TRANSIENT_NAMES):
+            return True
+        status = _status_code(error)
+        if status is not None:
+            return status in _TRANSIENT_STATUSES
+        error = error.__cause__
+    return False
+
+def call_with_retries(fn: Callable[[], T],
+                      attempts: int = 3,
+                      base_delay: float = 0.2,
+                      max_delay: float = 5.0,
+                      retry_if: Callable[[Exception], bool] = is_transient,
+                      description: str = "request") -> T:
+    """Call fn, retrying transient failures with jittered exponential backoff."""
+    for attempt in range(1, attempts + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == attempts or not retry_if(e):
+                raise
+            delay = min(max_delay, base_delay * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+            logger.warning(f"{description} failed ({str(e)}); retry {attempt}/{attempts - 1} in {delay:.2f}s")
+            time.sleep(delay)
@@ -0,0 +1,158 @@
+import re
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+# Paragraphs are tokenized this many at a time to amortize tokenizer call
+# overhead, with at most TOKENIZE_CHARS characters per call to bound its memory
+TOKENIZE_BATCH = 64
+TOKENIZE_CHARS = 1 << 20
+
+# Longest paragraph worth handling in one piece, in chunks
+PARAGRAPH_CHUNKS = 4
+
+class _Unit(NamedTuple):
+    text: str
+    tokens: int
+    starts_paragraph: bool
+
+class TextChunker:
+    """Split text into chunks measured in the embedder's own tokens.
+
+    Paragraphs are kept whole when they fit, otherwise split at sentence
+    boundaries, and sentences that are still too long are cut into token
+    windows. No chunk exceeds the smaller of chunk_size and the model's
+    maximum sequence length, so the embedder never truncates a chunk.
+    Consecutive chunks share up to `overlap` tokens of whole sentences or
+    paragraphs. Without a tokenizer, sizes fall back to ~4 characters per token.
+    """
+
+    def __init__(self,
+                 tokenizer=None,
+                 chunk_size: int = 500,
+                 overlap: int = 50,
+                 max_tokens: Optional[int] = None):
+        self._tokenizer = tokenizer
+        self._limit = min(chunk_size, max_tokens) if max_tokens else chunk_size
+        if self._limit < 1:
+            raise ValueError("chunk size must be at least one token")
+        self._overlap = max(0, min(overlap, self._limit // 2))
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def max_paragraph_chars(self) -> int:
+        """Paragraph length worth reading whole, at ~4 characters per token.
+
+        Longer paragraphs would be split at sentences anyway, so readers can
+        cut them here instead of holding them in memory.
+        """
+        return PARAGRAPH_CHUNKS * self._limit * 4
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """Count tokens for a batch of texts, excluding special tokens."""
+        if not texts:
+            return []
+        if self._tokenizer is None:
+            return [len(text) // 4 for text in texts]
+        encoded = self._tokenizer(texts, add_special_tokens=False)['input_ids']
+        return [len(ids) for ids in encoded]
+
+    def _split_tokens(self, text: str) -> List[_Unit]:
+        """Cut text into overlapping windows of at most `limit` tokens."""
+        stride = self._limit - self._overlap
+        if self._tokenizer is not None:
+            try:
+                offsets = self._tokenizer(
+                    text, add_special_tokens=False, return_offsets_mapping=True
+                )['offset_mapping']
+            except (NotImplementedError, KeyError):
+                offsets = None
+            if offsets:
+                pieces = []
+                for start in range(0, len(offsets), stride):
+                    window = offsets[start:start + self._limit]
+                    pieces.append(_Unit(
+                        text[window[0][0]:window[-1][1]], len(window), False
+                    ))
+                    if start + self._limit >= len(offsets):
+                        break
+                return pieces
+
+        # Character windows sized from the 4-chars-per-token estimate
+        size, step = self._limit * 4, stride * 4
+        return [
+            _Unit(text[start:start + size], len(text[start:start + size]) // 4, False)
+            for start in range(0, max(len(text) - self._overlap * 4, 1), step)
+        ]
+
+    @staticmethod
+    def _tokenize_batches(paragraphs: Iterable[str]) -> Iterator[List[str]]:
+        """Group non-blank paragraphs by count and by total characters."""
+        batch: List[str] = []
+        chars = 0
+        for paragraph in paragraphs:
+            if not paragraph.strip():
+                continue
+            if batch and (len(batch) == TOKENIZE_BATCH or chars + len(paragraph) > TOKENIZE_CHARS):
+                yield batch
+                batch, chars = [], 0
+            batch.append(paragraph)
+            chars += len(paragraph)
+        if batch:
+            yield batch
+
+    def _units(self, paragraphs: Iterable[str]) -> Iterator[_Unit]:
+        """Break paragraphs into units that each fit within the limit."""
+        for batch in self._tokenize_batches(paragraphs):
+            for paragraph, tokens in zip(batch, self.count_tokens(batch)):
+                if tokens <= self._limit:
+                    yield _Unit(paragraph, tokens, True)
+                    continue
+
+                sentences = [s for s in SENTENCE_BOUNDARY.split(paragraph) if s.strip()]
+                first = True
+                for sentence, sentence_tokens in zip(sentences, self.count_tokens(sentences)):
+                    if sentence_tokens <= self._limit:
+                        yield _Unit(sentence, sentence_tokens, first)
+                    else:
+                        for piece in self._split_tokens(sentence):
+                            yield piece._replace(starts_paragraph=first)
+                            first = False
+                    first = False
+
+    @staticmethod
+    def _join(units: List[_Unit]) -> str:
+        parts = [units[0].text]
+        for unit in units[1:]:
+            parts.append(('\n\n' if unit.starts_paragraph else ' ') + unit.text)
+        return ''.join(parts)
+
+    def iter_chunks(self, paragraphs: Iterable[str]) -> Iterator[str]:
+        """Pack units into chunks of at most `limit` tokens, yielding each as it fills."""
+        current: List[_Unit] = []
+        current_tokens = 0
+
+        for unit in self._units(paragraphs):
+            if current and current_tokens + unit.tokens > self._limit:
+                yield self._join(current)
+
+                # Carry trailing whole units forward as overlap, if they fit
+                carried: List[_Unit] = []
+                carried_tokens = 0
+                for previous in reversed(current):
+                    if carried_tokens + previous.tokens > self._overlap:
+                        break
+                    carried.insert(0, previous)
+                    carried_tokens += previous.tokens
+                if carried_tokens + unit.tokens > self._limit:
+                    carried, carried_tokens = [], 0
+                current, current_tokens = carried, carried_tokens
+
+            current.append(unit)
+            current_tokens += unit.tokens
+
+        if current:
+            yield self._join(current)